@@ -21,6 +21,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'
 from tensorflow_chessbot import ChessboardPredictor
 import helper_image_loading
 import chessboard_finder
+import pipeline_timing
 import chess
 
 # Configurar estilo de gráficos
@@ -75,7 +76,7 @@ class ChessBotBenchmark:
         for idx, img_path in enumerate(image_paths, 1):
             print(f"[{idx}/{len(image_paths)}] Procesando: {Path(img_path).name}")
             
-            start_time = time.time()
+            start_time = time.perf_counter()
             
             try:
                 # Cargar y procesar imagen
@@ -94,13 +95,13 @@ class ChessBotBenchmark:
                     self.results['images'].append({
                         'path': str(img_path),
                         'status': 'no_board_detected',
-                        'processing_time': time.time() - start_time
+                        'processing_time': time.perf_counter() - start_time
                     })
                     continue
                 
                 # Hacer predicción
                 fen, tile_certainties = self.predictor.getPrediction(tiles)
-                processing_time = time.time() - start_time
+                processing_time = time.perf_counter() - start_time
                 total_time += processing_time
                 
                 if fen is None:
@@ -146,11 +147,14 @@ class ChessBotBenchmark:
                     'path': str(img_path),
                     'status': 'error',
                     'error': str(e),
-                    'processing_time': time.time() - start_time
+                    'processing_time': time.perf_counter() - start_time
                 })
             
             print()
         
+        # Latencia real por etapa del pipeline
+        self.results['timing'] = pipeline_timing.TIMER.toDict()
+        
         # Calcular métricas globales
         successful = [r for r in self.results['images'] if r['status'] == 'success']
         
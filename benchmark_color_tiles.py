@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark de extracción de casillas en color (chessboard_finder)
+
+Compara el coste por tablero de cortar las 64 casillas en escala de grises
+y en color RGB con la implementación anterior, que recorría las casillas en
+un bucle de Python, frente a la vectorizada (una sola vista con reshape y
+transpose), incluida la escritura directa en un lote preasignado
+(allocateColorTileBatch). Mide también la cascada completa de detección y
+extracción en capturas sintéticas. Con los modelos disponibles compara la
+inferencia del modelo en escala de grises con la del modelo en color.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import chessboard_finder
+from synthetic_boards import generate_screenshot
+
+
+def loop_tiles_gray(board):
+    """Referencia: casillas 32x32x64 de un tablero 256x256 en un bucle"""
+    tiles = np.zeros([32, 32, 64], dtype=np.float32)
+    for rank in range(8):
+        for file in range(8):
+            tiles[:, :, (rank * 8 + file)] = \
+                board[(7 - rank) * 32:((7 - rank) + 1) * 32, file * 32:(file + 1) * 32]
+    return tiles
+
+
+def loop_tiles_color(board):
+    """Referencia: casillas 32x32x192 de un tablero 256x256x3 en un bucle"""
+    tiles = np.zeros([32, 32, 3 * 64], dtype=np.float32)
+    for rank in range(8):
+        for file in range(8):
+            tiles[:, :, 3 * (rank * 8 + file):3 * (rank * 8 + file + 1)] = \
+                board[(7 - rank) * 32:((7 - rank) + 1) * 32, file * 32:(file + 1) * 32] / 255.0
+    return tiles
+
+
+def time_per_call(fn, repeats):
+    """Microsegundos por llamada (mediana de 5 rondas)"""
+    rounds = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for i in range(repeats):
+            fn(i)
+        rounds.append((time.perf_counter() - start) / repeats * 1e6)
+    return float(np.median(rounds))
+
+
+def benchmark_extraction(boards_gray, boards_color, repeats):
+    """us por tablero de cada método de extracción de casillas"""
+    n = len(boards_gray)
+    batch = chessboard_finder.allocateColorTileBatch(n)
+    return {
+        'Gris, bucle': time_per_call(
+            lambda i: loop_tiles_gray(boards_gray[i % n]), repeats),
+        'Gris, vectorizado': time_per_call(
+            lambda i: chessboard_finder.getTiles(boards_gray[i % n]), repeats),
+        'Color, bucle': time_per_call(
+            lambda i: loop_tiles_color(boards_color[i % n]), repeats),
+        'Color, vectorizado': time_per_call(
+            lambda i: chessboard_finder.getColorTiles(boards_color[i % n]), repeats),
+        'Color, en lote': time_per_call(
+            lambda i: chessboard_finder.getColorTiles(boards_color[i % n], out=batch[i % n]),
+            repeats),
+    }
+
+
+def benchmark_cascade(images):
+    """ms por imagen de detección + extracción en gris y en color, y si las
+    esquinas coinciden"""
+    results = {}
+    for name, finder in (('Gris', chessboard_finder.findGrayscaleTilesInImage),
+                         ('Color', chessboard_finder.findColorTilesInImage)):
+        times, corners = [], []
+        for img in images:
+            start = time.perf_counter()
+            _, c = finder(img)
+            times.append((time.perf_counter() - start) * 1000)
+            corners.append(c)
+        results[name] = (float(np.median(times)), corners)
+    same = np.mean([(a is None and b is None) or
+                    (a is not None and b is not None and np.array_equal(a, b))
+                    for a, b in zip(results['Gris'][1], results['Color'][1])])
+    return {name: ms for name, (ms, _) in results.items()}, float(same)
+
+
+def compare_models(gray_model, color_model, images):
+    """Tableros/s y acuerdo de FEN entre el modelo en gris y el de color"""
+    from tensorflow_chessbot import ChessboardPredictor
+    rates, fens = {}, {}
+    for name, path in (('Gris', gray_model), ('Color', color_model)):
+        predictor = ChessboardPredictor(path, color=name == 'Color')
+        boards = [predictor.findTilesInImage(img) + (img,) for img in images]
+        boards = [b for b in boards if b[0] is not None]
+        start = time.perf_counter()
+        fens[name] = [predictor.getPrediction(tiles, img, corners)[0]
+                      for tiles, corners, img in boards]
+        rates[name] = len(boards) / (time.perf_counter() - start)
+        predictor.close()
+    agreement = np.mean([a == b for a, b in zip(fens['Gris'], fens['Color'])])
+    return rates, float(agreement)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark de extracción de casillas en gris y en color'
+    )
+    parser.add_argument('--boards', type=int, default=16, help='Tableros distintos')
+    parser.add_argument('--repeats', type=int, default=500,
+                       help='Extracciones por ronda de medida')
+    parser.add_argument('--images', type=int, default=30,
+                       help='Capturas para la cascada completa')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', '-m',
+                       default='tensorflow_chessbot/saved_models/frozen_graph.pb')
+    parser.add_argument('--color-model', default=None,
+                       help='Modelo entrenado con casillas en color')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    images = [generate_screenshot(1280, 960, rng=rng)[0] for _ in range(args.images)]
+
+    boards_gray, boards_color = [], []
+    for img in images[:args.boards]:
+        img_rgb = np.asarray(img.convert('RGB'), dtype=np.uint8)
+        corners = chessboard_finder.findChessboardCorners(
+            np.asarray(img.convert('L'), dtype=np.uint8))
+        if corners is None:
+            continue
+        boards_color.append(chessboard_finder.getChessBoardColor(img_rgb, corners))
+        boards_gray.append(chessboard_finder.getChessBoardGray(
+            np.asarray(img.convert('L'), dtype=np.uint8), corners))
+
+    # Comprobar que la versión vectorizada es idéntica a la referencia
+    for gray, color in zip(boards_gray, boards_color):
+        assert np.array_equal(loop_tiles_gray(gray), chessboard_finder.getTiles(gray))
+        reference = loop_tiles_color(color).reshape([32, 32, 64, 3]).transpose(2, 0, 1, 3)
+        assert np.allclose(reference, chessboard_finder.getColorTiles(color))
+
+    print(f"\n📊 Extracción de casillas, {len(boards_gray)} tableros")
+    print(f"\n{'Método':<20} {'us/tablero':>11} {'Tableros/s':>11}")
+    for name, us in benchmark_extraction(boards_gray, boards_color, args.repeats).items():
+        print(f"{name:<20} {us:>11.1f} {1e6 / us:>11,.0f}")
+    print(f"   (lote: {len(boards_color)}x64x32x32x3 float32, "
+          f"{chessboard_finder.allocateColorTileBatch(len(boards_color)).nbytes / 2**20:.1f} MB)")
+
+    cascade_ms, same = benchmark_cascade(images)
+    print(f"\n🔎 Detección + extracción en {len(images)} capturas de 1280x960")
+    for name, ms in cascade_ms.items():
+        print(f"   {name:<6} {ms:>7.2f} ms/imagen")
+    print(f"   Esquinas idénticas entre gris y color: {same:.0%}")
+
+    if not args.color_model or not os.path.exists(args.color_model) \
+            or not os.path.exists(args.model):
+        print(f"\n⚠️  Modelos no encontrados ({args.model}, {args.color_model}), "
+              f"se omite la comparación de inferencia")
+        return
+
+    rates, agreement = compare_models(args.model, args.color_model, images)
+    print(f"\n🤖 Inferencia (red + decodificación)")
+    for name, rate in rates.items():
+        print(f"   Tableros/s modelo {name.lower():<6} {rate:,.1f}")
+    print(f"   FEN idénticos entre modelos: {agreement:.1%}")
+
+
+if __name__ == '__main__':
+    main()
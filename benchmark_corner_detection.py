@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark de detección de esquinas: resolución completa vs coarse-to-fine
+Compara concordancia de esquinas, tiempo y memoria pico por tamaño de imagen
+"""
+
+import os
+import sys
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+import numpy as np
+import PIL.Image
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import chessboard_finder
+from synthetic_boards import generate_corpus
+
+
+def measure(finder, img_arr, repeats):
+    """Ejecutar detector y devolver (esquinas, tiempo mínimo ms, memoria pico MB)"""
+    times = []
+    corners = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        corners = finder(img_arr)
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    finder(img_arr)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return corners, min(times), peak / 1e6
+
+
+def load_corpus(args):
+    """Cargar imágenes indicadas o generar corpus sintético"""
+    if args.images:
+        return [(Path(p).name, PIL.Image.open(p), None) for p in args.images]
+    sizes = [(s, int(s * 0.75)) for s in args.sizes]
+    return generate_corpus(sizes, per_size=args.per_size, seed=args.seed)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark de detección de esquinas coarse-to-fine'
+    )
+    parser.add_argument('images', nargs='*',
+                       help='Capturas a evaluar (por defecto corpus sintético)')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                       default=[400, 800, 1200, 1600, 2000],
+                       help='Anchos de las imágenes sintéticas')
+    parser.add_argument('--per-size', type=int, default=5,
+                       help='Imágenes sintéticas por tamaño')
+    parser.add_argument('--repeats', type=int, default=3,
+                       help='Repeticiones por imagen (se usa el mínimo)')
+    parser.add_argument('--tolerance', type=int, default=2,
+                       help='Diferencia máxima en px para considerar concordancia')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o', help='Guardar resultados en JSON')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args)
+    print(f"📊 Evaluando {len(corpus)} imágenes...\n")
+
+    results = []
+    by_size = defaultdict(list)
+    for name, img, true_corners in corpus:
+        img_arr = np.asarray(img.convert('L'), dtype=np.float32)
+
+        full, full_ms, full_mb = measure(
+            chessboard_finder.findChessboardCorners, img_arr, args.repeats)
+        coarse, coarse_ms, coarse_mb = measure(
+            chessboard_finder.findChessboardCornersCoarseToFine, img_arr, args.repeats)
+
+        if full is None or coarse is None:
+            agree = full is None and coarse is None
+            max_diff = None
+        else:
+            max_diff = int(np.abs(np.asarray(full) - np.asarray(coarse)).max())
+            agree = max_diff <= args.tolerance
+
+        result = {
+            'image': name,
+            'size': list(img.size),
+            'full_corners': None if full is None else [int(v) for v in full],
+            'coarse_corners': None if coarse is None else [int(v) for v in coarse],
+            'true_corners': None if true_corners is None else [int(v) for v in true_corners],
+            'agree': bool(agree),
+            'max_diff_px': max_diff,
+            'full_ms': full_ms,
+            'coarse_ms': coarse_ms,
+            'full_peak_mb': full_mb,
+            'coarse_peak_mb': coarse_mb,
+        }
+        results.append(result)
+        by_size[max(img.size)].append(result)
+
+    print(f"{'Tamaño':>8} {'N':>3} {'Concuerda':>10} {'Completo ms':>12} "
+          f"{'Coarse ms':>10} {'Completo MB':>12} {'Coarse MB':>10}")
+    for size in sorted(by_size):
+        rows = by_size[size]
+        print(f"{size:>8} {len(rows):>3} "
+              f"{sum(r['agree'] for r in rows):>6}/{len(rows):<3} "
+              f"{np.median([r['full_ms'] for r in rows]):>12.1f} "
+              f"{np.median([r['coarse_ms'] for r in rows]):>10.1f} "
+              f"{np.median([r['full_peak_mb'] for r in rows]):>12.1f} "
+              f"{np.median([r['coarse_peak_mb'] for r in rows]):>10.1f}")
+
+    agreement = sum(r['agree'] for r in results) / len(results) if results else 0
+    print(f"\n✅ Concordancia total: {agreement:.1%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'agreement': agreement, 'results': results}, f, indent=2)
+        print(f"💾 Resultados guardados en: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
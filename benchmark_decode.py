@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark de decodificación de imágenes subidas al API
+
+Compara el camino anterior de /analyze (decodificar a RGB, np.array, volver
+a PIL, redimensionar y convertir a gris) con la decodificación directa a
+escala de grises de helper_image_loading.loadImageBytesGrayscale, que en
+JPEG usa draft() para reducir la imagen durante la decodificación.
+Mide el tiempo y comprueba en ambos caminos que las esquinas detectadas
+coinciden con las verdaderas.
+"""
+
+import io
+import os
+import sys
+import time
+import numpy as np
+import PIL.Image
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import helper_image_loading
+import chessboard_finder
+from synthetic_boards import generate_screenshot
+
+MAX_SIZE = (2000, 2000)
+
+
+def decode_legacy(data, max_size=MAX_SIZE):
+    """Camino anterior: RGB -> ndarray -> PIL -> resize -> gris"""
+    img = PIL.Image.open(io.BytesIO(data))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img = PIL.Image.fromarray(np.array(img))
+    # resizeAsNeeded rechazaba imágenes grandes, aquí se redimensionan para comparar
+    img.thumbnail(max_size, PIL.Image.BILINEAR)
+    return img.convert('L')
+
+
+def decode_grayscale(data, max_size=MAX_SIZE):
+    """Camino nuevo: decodificación directa a 'L' (draft en JPEG)"""
+    return helper_image_loading.loadImageBytesGrayscale(data, max_size)[0]
+
+
+def measure(fn, data, repeats):
+    """Tiempo mediano (ms) de fn(data) y su último resultado"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(data)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times)), result
+
+
+def corners_ok(img, true_corners, original_width, tolerance):
+    """Detectar esquinas y compararlas con las verdaderas escaladas a img"""
+    corners = chessboard_finder.findChessboardCorners(np.asarray(img, dtype=np.uint8))
+    if corners is None:
+        return False
+    scale = img.size[0] / original_width
+    return bool(np.abs(corners - true_corners * scale).max() <= tolerance)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark de decodificación RGB vs escala de grises directa'
+    )
+    parser.add_argument('--sizes', nargs='+',
+                       default=['800x600', '1920x1080', '3000x2000', '4032x3024'],
+                       help='Tamaños de imagen (ANCHOxALTO)')
+    parser.add_argument('--per-size', type=int, default=5,
+                       help='Imágenes por tamaño')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--quality', type=int, default=90, help='Calidad JPEG')
+    parser.add_argument('--tolerance', type=float, default=4,
+                       help='Diferencia máxima de esquinas en px')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"\n{'Formato':<8} {'Tamaño':<10} {'Decod.':<10} "
+          f"{'Anterior ms':>12} {'Nuevo ms':>10} {'Acel.':>6} "
+          f"{'Esquinas ant.':>14} {'Esquinas nuevo':>15}")
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split('x'))
+        screenshots = [generate_screenshot(width, height, rng=rng)
+                       for _ in range(args.per_size)]
+        for fmt in ('JPEG', 'PNG'):
+            legacy_times, new_times = [], []
+            legacy_found = new_found = 0
+            for img, true_corners in screenshots:
+                buf = io.BytesIO()
+                if fmt == 'JPEG':
+                    img.save(buf, fmt, quality=args.quality)
+                else:
+                    img.save(buf, fmt)
+                data = buf.getvalue()
+
+                legacy_ms, legacy_img = measure(decode_legacy, data, args.repeats)
+                new_ms, new_img = measure(decode_grayscale, data, args.repeats)
+                legacy_times.append(legacy_ms)
+                new_times.append(new_ms)
+                legacy_found += corners_ok(legacy_img, true_corners, width, args.tolerance)
+                new_found += corners_ok(new_img, true_corners, width, args.tolerance)
+
+            legacy_ms = float(np.median(legacy_times))
+            new_ms = float(np.median(new_times))
+            print(f"{fmt:<8} {size:<10} {'x'.join(map(str, new_img.size)):<10} "
+                  f"{legacy_ms:>12.1f} {new_ms:>10.1f} {legacy_ms / new_ms:>5.1f}x "
+                  f"{f'{legacy_found}/{args.per_size}':>14} "
+                  f"{f'{new_found}/{args.per_size}':>15}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la cascada de casillas vacías de ChessboardPredictor
+
+Las casillas que helper_functions.getEmptyTileMask marca como vacías (planas
+y del color de su casilla, calibrado por tablero) no pasan por la red.
+Sobre tableros sintéticos con piezas conocidas mide los errores de la
+máscara (casillas con pieza marcadas vacías) y cuántas casillas vacías
+detecta. Con el modelo disponible compara además las etiquetas con y sin
+la cascada y las casillas por segundo de cada modo; --images añade
+capturas reales (solo comparación con el modelo completo). La cascada está
+desactivada por defecto (--skip-empty la activa) mientras este benchmark
+no muestre tableros idénticos con y sin ella.
+"""
+
+import io
+import os
+import sys
+import time
+import numpy as np
+import PIL.Image
+import PIL.ImageDraw
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import chessboard_finder
+from helper_functions import getEmptyTileMask
+from synthetic_boards import BOARD_THEMES, draw_board, random_pieces
+
+
+def generate_board_tiles(rng, quality):
+    """Tablero sintético -> (tiles 32x32x64, máscara verdadera de vacías)"""
+    board_size = int(rng.integers(24, 100)) * 8
+    margin = 40
+    size = board_size + 2 * margin
+    img = PIL.Image.new('RGB', (size, size), (40, 40, 40))
+    pieces = random_pieces(rng, piece_prob=float(rng.uniform(0.05, 0.6)))
+    theme = rng.choice(sorted(BOARD_THEMES))
+    draw_board(PIL.ImageDraw.Draw(img), margin, margin, board_size, theme, pieces)
+
+    # Compresión JPEG como en las capturas subidas
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=quality)
+    arr = np.asarray(PIL.Image.open(buf).convert('L'), dtype=np.uint8)
+    corners = np.array([margin, margin, margin + board_size, margin + board_size])
+    tiles = chessboard_finder.getChessTilesGray(arr, corners)
+
+    # draw_board usa (fila desde arriba, columna), las casillas van de A1 a H8
+    empty = np.ones(64, dtype=bool)
+    for rank, file in pieces:
+        empty[(7 - rank) * 8 + file] = False
+    return tiles, empty
+
+
+def load_image_tiles(path):
+    """Casillas de las capturas reales de un directorio donde se encuentre tablero"""
+    boards = []
+    for name in sorted(os.listdir(path)):
+        try:
+            img = PIL.Image.open(os.path.join(path, name))
+        except IOError:
+            continue
+        tiles, _ = chessboard_finder.findGrayscaleTilesInImage(img)
+        if tiles is not None:
+            boards.append(tiles)
+    return boards
+
+
+def evaluate_mask(boards):
+    """Errores y cobertura de la máscara frente a la verdad"""
+    wrong = caught = total_empty = 0
+    times = []
+    for tiles, truth in boards:
+        start = time.perf_counter()
+        mask = getEmptyTileMask(tiles)
+        times.append((time.perf_counter() - start) * 1000)
+        wrong += int((mask & ~truth).sum())
+        caught += int((mask & truth).sum())
+        total_empty += int(truth.sum())
+    return wrong, caught, total_empty, float(np.median(times))
+
+
+def compare_with_model(predictor, tiles_list, repeats):
+    """Concordancia de etiquetas con y sin cascada y casillas/s de cada modo"""
+    results = {}
+    for skip in (False, True):
+        predictor.skip_empty_tiles = skip
+        labels = [predictor.getTileProbabilities(tiles).argmax(axis=1) for tiles in tiles_list]
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for tiles in tiles_list:
+                predictor.getTileProbabilities(tiles)
+        elapsed = time.perf_counter() - start
+        results[skip] = (labels, 64 * len(tiles_list) * repeats / elapsed)
+
+    full_labels, full_rate = results[False]
+    fast_labels, fast_rate = results[True]
+    tile_agreement = np.mean([np.mean(a == b) for a, b in zip(full_labels, fast_labels)])
+    board_agreement = np.mean([np.array_equal(a, b) for a, b in zip(full_labels, fast_labels)])
+    return tile_agreement, board_agreement, full_rate, fast_rate
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark de la cascada de casillas vacías'
+    )
+    parser.add_argument('--boards', type=int, default=200,
+                       help='Tableros sintéticos')
+    parser.add_argument('--quality', type=int, default=85, help='Calidad JPEG')
+    parser.add_argument('--images', help='Directorio con capturas reales')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', '-m',
+                       default='tensorflow_chessbot/saved_models/frozen_graph.pb')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    boards = [generate_board_tiles(rng, args.quality) for _ in range(args.boards)]
+
+    wrong, caught, total_empty, mask_ms = evaluate_mask(boards)
+    total = 64 * len(boards)
+    print(f"\n📊 Máscara de vacías en {len(boards)} tableros sintéticos")
+    print(f"   Casillas con pieza marcadas vacías: {wrong}/{total - total_empty} "
+          f"({wrong / max(1, total - total_empty):.2%})")
+    print(f"   Casillas vacías detectadas:         {caught}/{total_empty} "
+          f"({caught / max(1, total_empty):.1%})")
+    print(f"   Casillas que evitan la red:         {(wrong + caught) / total:.1%}")
+    print(f"   Tiempo de la máscara:               {mask_ms:.3f} ms/tablero")
+
+    if not os.path.exists(args.model):
+        print(f"\n⚠️  Modelo no encontrado en {args.model}, "
+              f"se omite la comparación con el modelo completo")
+        return
+
+    from tensorflow_chessbot import ChessboardPredictor
+    predictor = ChessboardPredictor(args.model)
+    tiles_list = [tiles for tiles, _ in boards]
+    if args.images:
+        real = load_image_tiles(args.images)
+        print(f"\n🖼️  {len(real)} capturas reales con tablero en {args.images}")
+        tiles_list += real
+
+    tile_agreement, board_agreement, full_rate, fast_rate = compare_with_model(
+        predictor, tiles_list, args.repeats)
+    predictor.close()
+
+    print(f"\n🤖 Comparación con el modelo completo ({len(tiles_list)} tableros)")
+    print(f"   Concordancia por casilla: {tile_agreement:.3%}")
+    print(f"   Tableros idénticos:       {board_agreement:.1%}")
+    print(f"   Casillas/s sin cascada:   {full_rate:,.0f}")
+    print(f"   Casillas/s con cascada:   {fast_rate:,.0f} ({fast_rate / full_rate:.2f}x)")
+    if board_agreement < 1:
+        print(f"\n⚠️  La cascada cambia {1 - board_agreement:.1%} de los tableros, "
+              f"mantener skip_empty_tiles desactivado (sin --skip-empty)")
+    else:
+        print(f"\n✅ Tableros idénticos con y sin cascada, --skip-empty es seguro")
+
+
+if __name__ == '__main__':
+    main()
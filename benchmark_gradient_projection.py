@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria de las proyecciones de gradiente de chessboard_finder
+Compara la versión original (copias completas de gx/gy) con la proyección
+por bloques de filas, midiendo memoria pico con tracemalloc
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import chessboard_finder
+from synthetic_boards import generate_screenshot
+
+
+def legacy_projections(img_arr_gray):
+    """Proyecciones como las calculaba originalmente findChessboardCorners"""
+    gx, gy = np.gradient(img_arr_gray)
+    gx_pos = gx.copy()
+    gx_pos[gx_pos < 0] = 0
+    gx_neg = -gx.copy()
+    gx_neg[gx_neg < 0] = 0
+
+    gy_pos = gy.copy()
+    gy_pos[gy_pos < 0] = 0
+    gy_neg = -gy.copy()
+    gy_neg[gy_neg < 0] = 0
+    return (gx_pos.sum(axis=1), gx_neg.sum(axis=1),
+            gy_pos.sum(axis=0), gy_neg.sum(axis=0))
+
+
+def measure(func, img_arr, repeats):
+    """Devolver (resultado, tiempo mínimo ms, memoria pico MB)"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(img_arr)
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    func(img_arr)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(times), peak / 1e6
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark de memoria de proyecciones de gradiente'
+    )
+    parser.add_argument('--size', type=int, default=2000,
+                       help='Lado de la imagen cuadrada sintética')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    img, _ = generate_screenshot(args.size, args.size,
+                                 rng=np.random.default_rng(0))
+    img_u8 = np.asarray(img.convert('L'), dtype=np.uint8)
+    img_f32 = img_u8.astype(np.float32)
+    print(f"📊 Imagen {args.size}x{args.size} "
+          f"(uint8 {img_u8.nbytes / 1e6:.1f} MB, float32 {img_f32.nbytes / 1e6:.1f} MB)\n")
+
+    reference, _, _ = measure(legacy_projections, img_f32, 1)
+    cases = [
+        ('original float32', legacy_projections, img_f32),
+        ('por bloques float32', chessboard_finder.getGradientProjections, img_f32),
+        ('por bloques uint8', chessboard_finder.getGradientProjections, img_u8),
+    ]
+
+    print(f"{'Método':<22} {'Tiempo ms':>10} {'Pico MB':>9} {'Error máx':>10}")
+    for name, func, arr in cases:
+        result, ms, mb = measure(func, arr, args.repeats)
+        error = max(np.abs(np.asarray(r, dtype=np.float64) - g).max()
+                    for r, g in zip(reference, result))
+        print(f"{name:<22} {ms:>10.1f} {mb:>9.2f} {error:>10.3g}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark de detección de varios tableros por imagen
+(chessboard_finder.findAllChessboardCorners)
+
+Genera páginas sintéticas con cuadrículas de diagramas (libros escaneados,
+hojas de problemas) y compara el detector multi-tablero, que calcula los
+gradientes una sola vez para toda la página, con la referencia de recortar
+cada celda conocida de la cuadrícula y llamar a findChessboardCorners en
+cada recorte. Reporta recall, falsos positivos, error de esquinas y tiempo.
+Con el modelo disponible compara además la inferencia en un solo lote
+(ChessboardPredictor.getAllPredictions) con un tablero por llamada.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import chessboard_finder
+from synthetic_boards import generate_page
+
+LAYOUTS = [(2, 2), (3, 2), (4, 3), (3, 3), (2, 3)]
+
+
+def match_boards(found, corners, max_error_px):
+    """(encontrados, falsos positivos, errores máximos en px) de las esquinas
+    detectadas frente a las reales"""
+    matched, false_positives, errors = set(), 0, []
+    for board in found:
+        error = np.abs(corners - np.asarray(board)).max(axis=1)
+        best = int(error.argmin())
+        if error[best] <= max_error_px and best not in matched:
+            matched.add(best)
+            errors.append(float(error[best]))
+        else:
+            false_positives += 1
+    return len(matched), false_positives, errors
+
+
+def detect_multi(img_arr):
+    """Detector multi-tablero sobre la página completa"""
+    return chessboard_finder.findAllChessboardCorners(img_arr)
+
+
+def detect_per_cell(img_arr, cells, noise_threshold=8000):
+    """Referencia: recortar cada celda y buscar un tablero en el recorte"""
+    found = []
+    for x0, y0, x1, y1 in cells:
+        corners = chessboard_finder.findChessboardCorners(img_arr[y0:y1, x0:x1],
+                                                          noise_threshold)
+        if corners is not None:
+            found.append(corners + [x0, y0, x0, y0])
+    return found
+
+
+def evaluate(pages, detector, max_error_px):
+    """Métricas agregadas de un detector sobre todas las páginas"""
+    total = found = false_positives = 0
+    errors, times = [], []
+    for img_arr, corners, cells in pages:
+        start = time.perf_counter()
+        boards = detector(img_arr, cells)
+        times.append((time.perf_counter() - start) * 1000)
+        n, fp, e = match_boards(boards, corners, max_error_px)
+        total += len(corners)
+        found += n
+        false_positives += fp
+        errors += e
+    return {
+        'recall': found / total if total else 0.0,
+        'found': found,
+        'total': total,
+        'false_positives': false_positives,
+        'mean_error_px': float(np.mean(errors)) if errors else 0.0,
+        'median_ms': float(np.median(times)),
+        'total_s': sum(times) / 1000,
+    }
+
+
+def compare_inference(predictor, images, repeats):
+    """Tableros/s en un lote por página frente a un tablero por llamada, y
+    concordancia de los FEN de ambos modos"""
+    batched, single = [], []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        batched = [[predictions[0][0] for _, predictions in predictor.getAllPredictions(img)]
+                   for img in images]
+    batched_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        single = []
+        for img in images:
+            single.append([predictor.getPrediction(tiles, img, corners)[0] for tiles, corners in
+                           chessboard_finder.findAllGrayscaleTilesInImage(img)])
+    single_s = time.perf_counter() - start
+
+    boards = sum(len(fens) for fens in batched) * repeats
+    agreement = np.mean([a == b for page_a, page_b in zip(batched, single)
+                         for a, b in zip(page_a, page_b)]) if boards else 0.0
+    return boards / batched_s, boards / single_s, agreement
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark de detección de varios tableros por página'
+    )
+    parser.add_argument('--pages', type=int, default=20, help='Páginas sintéticas')
+    parser.add_argument('--width', type=int, nargs=2, default=[1000, 1800],
+                       help='Rango de ancho de página')
+    parser.add_argument('--height', type=int, nargs=2, default=[1300, 2200],
+                       help='Rango de alto de página')
+    parser.add_argument('--max-error', type=float, default=6,
+                       help='Error máximo de esquinas (px) para contar un acierto')
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', '-m',
+                       default='tensorflow_chessbot/saved_models/frozen_graph.pb')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    images, pages = [], []
+    for i in range(args.pages):
+        rows, cols = LAYOUTS[i % len(LAYOUTS)]
+        img, corners, cells = generate_page(int(rng.integers(*args.width)),
+                                            int(rng.integers(*args.height)),
+                                            rows, cols, rng)
+        images.append(img)
+        pages.append((np.asarray(img.convert('L'), dtype=np.uint8), corners, cells))
+    print(f"\n📊 {len(pages)} páginas, {sum(len(c) for _, c, _ in pages)} diagramas")
+
+    multi = evaluate(pages, lambda img_arr, cells: detect_multi(img_arr), args.max_error)
+    per_cell = evaluate(pages, detect_per_cell, args.max_error)
+    # El umbral de ruido de findChessboardCorners está normalizado por el
+    # tamaño de la imagen; el multi-tablero usa 2000 en sus regiones
+    per_cell_low = evaluate(pages, lambda img_arr, cells: detect_per_cell(img_arr, cells, 2000),
+                            args.max_error)
+
+    print(f"\n{'Método':<26} {'Recall':>14} {'Falsos +':>9} {'Error px':>9} "
+          f"{'ms/página':>10} {'Total s':>8}")
+    for name, r in (('Multi-tablero (1 pasada)', multi),
+                    ('Recorte por celda', per_cell),
+                    ('Recorte por celda (2000)', per_cell_low)):
+        recall = f"{r['found']}/{r['total']} ({r['recall']:.1%})"
+        print(f"{name:<26} {recall:>14} {r['false_positives']:>9} "
+              f"{r['mean_error_px']:>9.2f} {r['median_ms']:>10.1f} {r['total_s']:>8.2f}")
+    print("   (el recorte por celda conoce la disposición de la página, "
+          "el multi-tablero no)")
+
+    if not os.path.exists(args.model):
+        print(f"\n⚠️  Modelo no encontrado en {args.model}, "
+              f"se omite la comparación de inferencia en lote")
+        return
+
+    from tensorflow_chessbot import ChessboardPredictor
+    predictor = ChessboardPredictor(args.model)
+    batched_rate, single_rate, agreement = compare_inference(predictor, images, args.repeats)
+    predictor.close()
+
+    print(f"\n🤖 Inferencia (detección + red + decodificación)")
+    print(f"   Tableros/s en un lote por página: {batched_rate:,.1f}")
+    print(f"   Tableros/s uno a uno:             {single_rate:,.1f} "
+          f"({batched_rate / single_rate:.2f}x)")
+    print(f"   FEN idénticos entre modos:        {agreement:.1%}")
+
+
+if __name__ == '__main__':
+    main()
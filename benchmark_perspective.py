@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark del detector con perspectiva (perspective_finder) para fotos de
+tableros físicos
+
+Genera fotos sintéticas de tableros vistos en ángulo, con distintos niveles
+de giro e inclinación, y capturas de pantalla. Para cada imagen ejecuta la
+cascada de UnifiedBoardAnalyzer: detector ortogonal rápido y, solo si falla,
+el detector con perspectiva. Reporta la tasa de detección, el error de
+esquinas, la calidad del tablero rectificado y la latencia por etapa frente
+al presupuesto por imagen.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import chessboard_finder
+import perspective_finder
+import pipeline_timing
+from synthetic_boards import generate_photo, generate_screenshot
+
+# (nombre, giro máximo en grados, inclinación mínima)
+LEVELS = [('suave', 10, 0.9), ('media', 25, 0.75), ('fuerte', 40, 0.6)]
+
+
+def corner_error(quad, corners):
+    """Error máximo de esquinas en px, sin importar qué esquina es la primera
+    (la orientación del tablero en la foto es desconocida)"""
+    return min(np.abs(np.roll(quad, k, axis=0) - corners).max() for k in range(4))
+
+
+def warp_error(img_arr, quad, corners):
+    """Diferencia media (0-255) entre el tablero rectificado desde quad y
+    desde las esquinas verdaderas, en la mejor de sus 4 rotaciones"""
+    warped = perspective_finder.warpBoard(img_arr, quad).astype(np.float32)
+    reference = perspective_finder.warpBoard(img_arr, corners).astype(np.float32)
+    return min(float(np.abs(np.rot90(warped, k) - reference).mean()) for k in range(4))
+
+
+def run_cascade(img, budget_ms):
+    """Detector ortogonal y, si falla, con perspectiva. Devuelve
+    (método o None, esquinas 4x2, ms totales, ms por etapa)"""
+    start = time.perf_counter()
+    with pipeline_timing.collect() as stage_ms:
+        tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img)
+        method = 'orthogonal'
+        if tiles is None:
+            tiles, corners = perspective_finder.findPerspectiveTilesInImage(
+                img, budget_ms=budget_ms)
+            method = 'perspective'
+    total_ms = (time.perf_counter() - start) * 1000
+    if tiles is None:
+        return None, None, total_ms, stage_ms
+    if method == 'orthogonal':
+        x0, y0, x1, y1 = corners
+        corners = np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=float)
+    return method, corners, total_ms, stage_ms
+
+
+def summarize(rows, max_error_px, budget_ms):
+    """Métricas agregadas de un grupo de imágenes"""
+    found = [r for r in rows if r['method'] is not None and r['error'] <= max_error_px]
+    totals = [r['total_ms'] for r in rows]
+    return {
+        'n': len(rows),
+        'found': len(found),
+        'perspective': sum(r['method'] == 'perspective' for r in rows),
+        'mean_error_px': float(np.mean([r['error'] for r in found])) if found else 0.0,
+        'warp_error': (float(np.mean([r['warp_error'] for r in found
+                                      if r['warp_error'] is not None]))
+                       if any(r['warp_error'] is not None for r in found) else 0.0),
+        'p50_ms': float(np.percentile(totals, 50)),
+        'p95_ms': float(np.percentile(totals, 95)),
+        'within_budget': float(np.mean([t <= budget_ms for t in totals])),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark del detector con perspectiva en fotos sintéticas'
+    )
+    parser.add_argument('--per-level', type=int, default=30,
+                       help='Fotos por nivel de perspectiva')
+    parser.add_argument('--screenshots', type=int, default=30,
+                       help='Capturas de pantalla (deben usar el detector ortogonal)')
+    parser.add_argument('--size', default='1280x960', help='Tamaño de imagen (ANCHOxALTO)')
+    parser.add_argument('--budget-ms', type=float, default=500,
+                       help='Presupuesto de latencia por imagen')
+    parser.add_argument('--max-error', type=float, default=10,
+                       help='Error máximo de esquinas (px) para contar un acierto')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    rng = np.random.default_rng(args.seed)
+
+    groups = {}
+    for name, max_angle, min_tilt in LEVELS:
+        rows = []
+        for _ in range(args.per_level):
+            img, corners = generate_photo(width, height, rng, max_angle=max_angle,
+                                          min_tilt=min_tilt)
+            method, quad, total_ms, stage_ms = run_cascade(img, args.budget_ms)
+            error = corner_error(quad, corners) if quad is not None else np.inf
+            rows.append({'method': method, 'error': error, 'total_ms': total_ms,
+                         'stage_ms': stage_ms,
+                         'warp_error': (warp_error(np.asarray(img.convert('L')), quad, corners)
+                                        if quad is not None else None)})
+        groups[f"foto {name}"] = rows
+
+    rows = []
+    for _ in range(args.screenshots):
+        img, box = generate_screenshot(width, height, rng=rng)
+        corners = np.array([[box[0], box[1]], [box[2], box[1]],
+                            [box[2], box[3]], [box[0], box[3]]], dtype=float)
+        method, quad, total_ms, stage_ms = run_cascade(img, args.budget_ms)
+        error = corner_error(quad, corners) if quad is not None else np.inf
+        rows.append({'method': method, 'error': error, 'total_ms': total_ms,
+                     'stage_ms': stage_ms, 'warp_error': None})
+    groups['captura'] = rows
+
+    print(f"\n📊 {sum(len(r) for r in groups.values())} imágenes de {width}x{height}, "
+          f"presupuesto {args.budget_ms:.0f} ms")
+    print(f"\n{'Grupo':<14} {'Detectados':>14} {'Perspectiva':>12} {'Error px':>9} "
+          f"{'Error rect.':>12} {'p50 ms':>8} {'p95 ms':>8} {'En presupuesto':>15}")
+    for name, rows in groups.items():
+        s = summarize(rows, args.max_error, args.budget_ms)
+        found = f"{s['found']}/{s['n']} ({s['found'] / s['n']:.0%})"
+        print(f"{name:<14} {found:>14} {s['perspective']:>12} {s['mean_error_px']:>9.2f} "
+              f"{s['warp_error']:>12.1f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+              f"{s['within_budget']:>15.0%}")
+    print("   (error rect.: diferencia media 0-255 entre los tableros rectificados "
+          "con las esquinas detectadas y las verdaderas)")
+
+    # Desglose de latencia por etapa en las fotos
+    stages = {}
+    for name, rows in groups.items():
+        if name == 'captura':
+            continue
+        for r in rows:
+            for stage, ms in r['stage_ms'].items():
+                stages.setdefault(stage, []).append(ms)
+    print(f"\n⏱️  Etapas en fotos{'':<14} {'p50 ms':>8} {'p95 ms':>8}")
+    for stage, values in stages.items():
+        print(f"   {stage:<28} {np.percentile(values, 50):>8.2f} "
+              f"{np.percentile(values, 95):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
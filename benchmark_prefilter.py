@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark del pre-filtro de tableros (chessboard_finder.isPlausibleChessboard)
+
+Mezcla capturas sintéticas con tablero e imágenes sin tablero (fotos,
+interfaces, formas), y opcionalmente imágenes reales de directorios. Para
+cada imagen mide el pre-filtro y el detector completo, y reporta la tasa de
+falsos rechazos (tableros que el detector completo encuentra pero el
+pre-filtro descarta) y el tiempo ahorrado para varios umbrales.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import PIL.Image
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import chessboard_finder
+from synthetic_boards import generate_screenshot, generate_non_board, NON_BOARD_KINDS
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+
+
+def load_directory(path, max_size):
+    """Imágenes de un directorio en gris, reducidas a max_size como el bot"""
+    images = []
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            img = PIL.Image.open(os.path.join(path, name)).convert('L')
+            img.thumbnail(max_size, PIL.Image.BILINEAR)
+            images.append(img)
+    return images
+
+
+def measure(img, max_size):
+    """(score, ms del pre-filtro, encontrado por el detector completo, ms)"""
+    img_arr = np.asarray(img.convert('L'), dtype=np.uint8)
+    start = time.perf_counter()
+    score = chessboard_finder.getPrefilterScore(img_arr, max_size)
+    prefilter_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    found = chessboard_finder.findChessboardCorners(img_arr) is not None
+    full_ms = (time.perf_counter() - start) * 1000
+    return score, prefilter_ms, found, full_ms
+
+
+def evaluate(results, threshold):
+    """Tasas de rechazo y tiempos del detector en etapas para un umbral"""
+    boards = [r for r in results if r['board']]
+    others = [r for r in results if not r['board']]
+    found = [r for r in boards if r['found']]
+    false_rejects = sum(r['score'] < threshold for r in found)
+    full_s = sum(r['full_ms'] for r in results) / 1000
+    staged_s = sum(r['prefilter_ms'] + (r['full_ms'] if r['score'] >= threshold else 0)
+                   for r in results) / 1000
+    return {
+        'false_reject_rate': false_rejects / len(found) if found else 0.0,
+        'false_rejects': false_rejects,
+        'found': len(found),
+        'non_board_rejected': (sum(r['score'] < threshold for r in others) / len(others)
+                               if others else 0.0),
+        'full_s': full_s,
+        'staged_s': staged_s,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark del pre-filtro de tableros en un corpus mixto'
+    )
+    parser.add_argument('--sizes', nargs='+',
+                       default=['800x600', '1280x720', '1920x1080', '600x600'],
+                       help='Tamaños de imagen (ANCHOxALTO)')
+    parser.add_argument('--per-size', type=int, default=10,
+                       help='Tableros y de cada tipo sin tablero por tamaño')
+    parser.add_argument('--boards-dir', help='Directorio con imágenes reales de tableros')
+    parser.add_argument('--others-dir', help='Directorio con imágenes reales sin tablero')
+    parser.add_argument('--max-size', type=int, default=256,
+                       help='Lado máximo de la imagen reducida del pre-filtro')
+    parser.add_argument('--thresholds', type=float, nargs='+',
+                       default=[0.05, 0.1, 0.15, 0.2, 0.25])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    corpus = []
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split('x'))
+        for _ in range(args.per_size):
+            img, _ = generate_screenshot(width, height, rng=rng,
+                                         board_fraction=float(rng.uniform(0.3, 0.95)))
+            corpus.append(('tablero', True, img))
+            for kind in NON_BOARD_KINDS:
+                corpus.append((kind, False, generate_non_board(width, height, kind, rng)))
+    if args.boards_dir:
+        corpus += [('real tablero', True, img) for img in load_directory(args.boards_dir, (2000, 2000))]
+    if args.others_dir:
+        corpus += [('real otro', False, img) for img in load_directory(args.others_dir, (2000, 2000))]
+
+    print(f"\n📊 Corpus: {len(corpus)} imágenes")
+    results = []
+    for category, board, img in corpus:
+        score, prefilter_ms, found, full_ms = measure(img, args.max_size)
+        results.append({'category': category, 'board': board, 'score': score,
+                        'prefilter_ms': prefilter_ms, 'found': found, 'full_ms': full_ms})
+
+    default_threshold = 0.15
+    print(f"\n{'Categoría':<14} {'N':>4} {'Detectados':>11} {'Puntuación':>16} "
+          f"{'Pre-filtro ms':>14} {'Completo ms':>12}")
+    for category in dict.fromkeys(r['category'] for r in results):
+        rows = [r for r in results if r['category'] == category]
+        scores = [r['score'] for r in rows]
+        print(f"{category:<14} {len(rows):>4} {sum(r['found'] for r in rows):>11} "
+              f"{f'{min(scores):.2f}-{max(scores):.2f}':>16} "
+              f"{np.median([r['prefilter_ms'] for r in rows]):>14.2f} "
+              f"{np.median([r['full_ms'] for r in rows]):>12.2f}")
+
+    print(f"\n{'Umbral':>7} {'Falsos rechazos':>16} {'Sin tablero rechazadas':>23} "
+          f"{'Completo s':>11} {'En etapas s':>12} {'Ahorro':>7}")
+    for threshold in args.thresholds:
+        e = evaluate(results, threshold)
+        marker = ' ← por defecto' if threshold == default_threshold else ''
+        false_rejects = f"{e['false_rejects']}/{e['found']} ({e['false_reject_rate']:.1%})"
+        print(f"{threshold:>7.2f} {false_rejects:>16} "
+              f"{e['non_board_rejected']:>23.1%} {e['full_s']:>11.2f} {e['staged_s']:>12.2f} "
+              f"{1 - e['staged_s'] / e['full_s']:>7.1%}{marker}")
+
+
+if __name__ == '__main__':
+    main()
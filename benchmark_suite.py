@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmark reproducible del pipeline completo con tableros sintéticos
+
+Genera tableros a partir de FENs aleatorios (renderizados con chess.svg y
+cairosvg) en varios tamaños, temas y desplazamientos, los procesa con el
+pipeline completo (decodificación, detección, inferencia) y reporta precisión
+contra la verdad conocida, latencia p50/p95/p99 y tableros/s por etapa.
+Con --tta-threshold reporta además el cambio de precisión y la latencia
+añadida por repetir las casillas inciertas con aumentos (TTA).
+
+Los resultados se guardan en JSON con claves ordenadas e incluyen el commit,
+para poder compararlos entre versiones (ver compare_benchmarks.py).
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from datetime import datetime
+import numpy as np
+import PIL.Image
+import chess
+import chess.svg
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import helper_image_loading
+import chessboard_finder
+import pipeline_timing
+from helper_functions import getPredictionFromProbabilities
+from synthetic_boards import BOARD_THEMES
+
+# Índices de etiqueta del modelo
+LABELS = ' KQRBNPkqrbnp'
+LABEL_NAMES = ['empty', 'K', 'Q', 'R', 'B', 'N', 'P', 'k', 'q', 'r', 'b', 'n', 'p']
+
+# Máximo de piezas aleatorias por tipo (además de un rey por bando)
+MAX_PIECES = {chess.PAWN: 8, chess.KNIGHT: 2, chess.BISHOP: 2,
+              chess.ROOK: 2, chess.QUEEN: 1}
+
+
+def random_board(rng):
+    """Generar posición aleatoria con un rey por bando y sin peones en filas 1/8"""
+    board = chess.Board(None)
+    squares = list(rng.permutation(64))
+    for color in (chess.WHITE, chess.BLACK):
+        board.set_piece_at(int(squares.pop()), chess.Piece(chess.KING, color))
+
+    for color in (chess.WHITE, chess.BLACK):
+        for piece_type, max_count in MAX_PIECES.items():
+            for _ in range(int(rng.integers(0, max_count + 1))):
+                # Buscar casilla libre válida para la pieza
+                for i, square in enumerate(squares):
+                    rank = chess.square_rank(int(square))
+                    if piece_type == chess.PAWN and rank in (0, 7):
+                        continue
+                    board.set_piece_at(int(squares.pop(i)), chess.Piece(piece_type, color))
+                    break
+    return board
+
+
+def render_board(board, size, theme):
+    """Renderizar tablero con chess.svg + cairosvg como imagen PIL RGB"""
+    import cairosvg
+    light, dark = BOARD_THEMES[theme]
+    colors = {'square light': '#%02x%02x%02x' % light,
+              'square dark': '#%02x%02x%02x' % dark}
+    svg = chess.svg.board(board, size=size, coordinates=False, colors=colors)
+    png = cairosvg.svg2png(bytestring=svg.encode('utf-8'),
+                           output_width=size, output_height=size)
+    return PIL.Image.open(io.BytesIO(png)).convert('RGB')
+
+
+def generate_cases(n_boards, sizes, themes, seed):
+    """Generar casos: imagen PNG codificada, FEN y esquinas verdaderas"""
+    rng = np.random.default_rng(seed)
+    cases = []
+    for i in range(n_boards):
+        board = random_board(rng)
+        size = int(sizes[i % len(sizes)])
+        theme = themes[i % len(themes)]
+
+        # Tablero pegado en un lienzo con márgenes y desplazamiento aleatorios
+        margin_x, margin_y = (int(v) for v in rng.integers(0, size // 2 + 1, size=2))
+        offset_x = int(rng.integers(0, margin_x + 1))
+        offset_y = int(rng.integers(0, margin_y + 1))
+        background = tuple(int(v) for v in rng.integers(20, 90, size=3))
+        canvas = PIL.Image.new('RGB', (size + margin_x, size + margin_y), background)
+        canvas.paste(render_board(board, size, theme), (offset_x, offset_y))
+
+        buf = io.BytesIO()
+        canvas.save(buf, 'PNG')
+        labels = [LABELS.index(board.piece_at(sq).symbol()) if board.piece_at(sq) else 0
+                  for sq in chess.SQUARES] # A1-H8, mismo orden que las casillas del modelo
+        cases.append({
+            'id': i,
+            'fen': board.board_fen(),
+            'size': size,
+            'theme': theme,
+            'image_size': list(canvas.size),
+            'true_corners': [offset_x, offset_y, offset_x + size, offset_y + size],
+            'labels': labels,
+            'png': buf.getvalue(),
+        })
+    return cases
+
+
+def run_case(predictor, case, coarse_to_fine=False):
+    """Procesar un caso con el pipeline completo y devolver resultado por tablero"""
+    start = time.perf_counter_ns()
+    with pipeline_timing.collect() as stage_ms:
+        with pipeline_timing.stage('decode'):
+            img = PIL.Image.open(io.BytesIO(case['png']))
+            img.load()
+        img = helper_image_loading.resizeAsNeeded(img)
+        tiles, corners = chessboard_finder.findGrayscaleTilesInImage(
+            img, coarse_to_fine=coarse_to_fine)
+        probabilities = None
+        if tiles is not None:
+            probabilities = first_probabilities = predictor.getTileProbabilities(tiles)
+            if predictor.tta_threshold:
+                probabilities = predictor.refineUncertainTiles(probabilities, img, corners)
+            with pipeline_timing.stage('fen_encoding'):
+                getPredictionFromProbabilities(probabilities)
+    total_ms = (time.perf_counter_ns() - start) / 1e6
+
+    result = {
+        'id': case['id'],
+        'size': case['size'],
+        'theme': case['theme'],
+        'detected': tiles is not None,
+        'total_ms': total_ms,
+        'stage_ms': stage_ms,
+    }
+    if tiles is not None:
+        predicted = np.argmax(probabilities, axis=1)
+        labels = np.array(case['labels'])
+        result['corners'] = [int(c) for c in corners]
+        result['corner_error_px'] = int(np.abs(np.array(corners) - case['true_corners']).max())
+        result['tiles_correct'] = int((predicted == labels).sum())
+        result['predicted'] = [int(p) for p in predicted]
+        if predictor.tta_threshold:
+            # Resultado sin la segunda pasada con aumentos (TTA)
+            result['tiles_correct_no_tta'] = int(
+                (np.argmax(first_probabilities, axis=1) == labels).sum())
+            result['tiles_refined'] = int(
+                (first_probabilities.max(axis=1) < predictor.tta_threshold).sum())
+    return result
+
+
+def latency_stats(values_ms):
+    """Estadísticas de latencia (ms) y tableros/s para una lista de muestras"""
+    values = np.asarray(values_ms, dtype=np.float64)
+    mean = float(values.mean())
+    return {
+        'count': int(values.size),
+        'mean_ms': mean,
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'boards_per_sec': 1000.0 / mean if mean > 0 else None,
+        'samples_ms': [round(float(v), 4) for v in values],
+    }
+
+
+def summarize(cases, results, wall_time_s):
+    """Calcular precisión, matriz de confusión y latencias por etapa"""
+    detected = [r for r in results if r['detected']]
+    confusion = np.zeros((13, 13), dtype=int)
+    for r in detected:
+        for truth, pred in zip(cases[r['id']]['labels'], r['predicted']):
+            confusion[truth, pred] += 1
+
+    stage_names = sorted({name for r in results for name in r['stage_ms']})
+    stages = {}
+    for name in stage_names:
+        # Tableros que no llegaron a la etapa no se cuentan
+        stages[name] = latency_stats([r['stage_ms'][name] for r in results
+                                      if name in r['stage_ms']])
+    stages['total'] = latency_stats([r['total_ms'] for r in results])
+
+    tiles_total = 64 * len(detected)
+    tiles_correct = sum(r['tiles_correct'] for r in detected)
+    per_class = {}
+    for i, name in enumerate(LABEL_NAMES):
+        support = int(confusion[i].sum())
+        per_class[name] = {
+            'support': support,
+            'recall': float(confusion[i, i] / support) if support else None,
+        }
+
+    summary = {
+        'boards': len(results),
+        'detection_rate': len(detected) / len(results) if results else 0,
+        'tile_accuracy': tiles_correct / tiles_total if tiles_total else 0,
+        'board_accuracy': (sum(r['tiles_correct'] == 64 for r in detected) / len(results)
+                           if results else 0),
+        'mean_corner_error_px': (float(np.mean([r['corner_error_px'] for r in detected]))
+                                 if detected else None),
+        'throughput_boards_per_sec': len(results) / wall_time_s if wall_time_s else None,
+        'per_class': per_class,
+        'confusion_matrix': {'labels': LABEL_NAMES, 'matrix': confusion.tolist()},
+        'stages': stages,
+    }
+    if any('tiles_refined' in r for r in detected):
+        summary['tta'] = summarize_tta(results)
+    return summary
+
+
+def summarize_tta(results):
+    """Cambio de precisión y latencia añadida por la segunda pasada TTA"""
+    detected = [r for r in results if r['detected']]
+    refined = [r for r in detected if r['tiles_refined']]
+    return {
+        'boards_refined': len(refined),
+        'tiles_refined': sum(r['tiles_refined'] for r in detected),
+        'tile_accuracy_no_tta': (sum(r['tiles_correct_no_tta'] for r in detected)
+                                 / (64 * len(detected)) if detected else 0),
+        'board_accuracy_no_tta': (sum(r['tiles_correct_no_tta'] == 64 for r in detected)
+                                  / len(results) if results else 0),
+        'boards_fixed': sum(r['tiles_correct_no_tta'] < 64 and r['tiles_correct'] == 64
+                            for r in refined),
+        'boards_broken': sum(r['tiles_correct_no_tta'] == 64 and r['tiles_correct'] < 64
+                             for r in refined),
+        # Todos los tableros, 0 ms en los que no tenían casillas inciertas
+        'added_ms': latency_stats([r['stage_ms'].get('tta', 0.0) for r in results]),
+    }
+
+
+def get_commit():
+    """Commit actual de git (y si hay cambios sin guardar)"""
+    try:
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=cwd,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '-uno'],
+                                             cwd=cwd).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def print_summary(summary):
+    """Imprimir resumen en consola"""
+    print("\n" + "=" * 70)
+    print("  RESUMEN DE LA SUITE DE BENCHMARK")
+    print("=" * 70)
+    print(f"   Tableros:              {summary['boards']}")
+    print(f"   Tasa de detección:     {summary['detection_rate']:.1%}")
+    print(f"   Precisión por casilla: {summary['tile_accuracy']:.2%}")
+    print(f"   Tableros perfectos:    {summary['board_accuracy']:.1%}")
+    print(f"   Rendimiento:           {summary['throughput_boards_per_sec']:.1f} tableros/s")
+
+    print(f"\n⏱️  {'Etapa':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'tableros/s':>11}")
+    for name, stats in summary['stages'].items():
+        print(f"   {name:<18} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+              f"{stats['p99_ms']:>9.2f} {stats['boards_per_sec']:>11.1f}")
+
+    tta = summary.get('tta')
+    if tta:
+        added = tta['added_ms']
+        print(f"\n🔁 Segunda pasada TTA: {tta['tiles_refined']} casillas en "
+              f"{tta['boards_refined']} tableros")
+        print(f"   Precisión por casilla: {tta['tile_accuracy_no_tta']:.2%} -> "
+              f"{summary['tile_accuracy']:.2%}")
+        print(f"   Tableros perfectos:    {tta['board_accuracy_no_tta']:.1%} -> "
+              f"{summary['board_accuracy']:.1%} "
+              f"(+{tta['boards_fixed']} / -{tta['boards_broken']})")
+        print(f"   Latencia añadida:      media {added['mean_ms']:.2f} ms, "
+              f"p50 {added['p50_ms']:.2f}, p95 {added['p95_ms']:.2f}, "
+              f"p99 {added['p99_ms']:.2f} ms")
+    print("=" * 70)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Suite de benchmark reproducible con tableros sintéticos'
+    )
+    parser.add_argument('--boards', '-n', type=int, default=200,
+                       help='Número de tableros sintéticos')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 400, 640, 960],
+                       help='Tamaños del tablero en px')
+    parser.add_argument('--themes', nargs='+', default=sorted(BOARD_THEMES),
+                       choices=sorted(BOARD_THEMES), help='Temas de colores')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warmup', type=int, default=3,
+                       help='Tableros procesados antes de medir')
+    parser.add_argument('--coarse', action='store_true',
+                       help='Detección coarse-to-fine')
+    parser.add_argument('--tta-threshold', type=float, default=0.9,
+                       help='Certeza bajo la que se repiten casillas con aumentos (0 desactiva)')
+    parser.add_argument('--model', '-m',
+                       default='tensorflow_chessbot/saved_models/frozen_graph.pb',
+                       help='Ruta al modelo congelado (.pb)')
+    parser.add_argument('--output', '-o', default='benchmark_suite_results.json',
+                       help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    print(f"🎲 Generando {args.boards} tableros sintéticos (semilla {args.seed})...")
+    cases = generate_cases(args.boards, args.sizes, args.themes, args.seed)
+
+    from tensorflow_chessbot import ChessboardPredictor
+    predictor = ChessboardPredictor(args.model, tta_threshold=args.tta_threshold)
+
+    for case in cases[:args.warmup]:
+        run_case(predictor, case, args.coarse)
+    pipeline_timing.TIMER.reset()
+
+    print(f"📊 Procesando...")
+    results = []
+    start = time.perf_counter()
+    for case in cases:
+        results.append(run_case(predictor, case, args.coarse))
+    wall_time_s = time.perf_counter() - start
+    predictor.close()
+
+    summary = summarize(cases, results, wall_time_s)
+    commit, dirty = get_commit()
+    output = {
+        'metadata': {
+            'date': datetime.now().isoformat(),
+            'commit': commit,
+            'dirty': dirty,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'config': {
+                'boards': args.boards, 'sizes': args.sizes, 'themes': args.themes,
+                'seed': args.seed, 'coarse': args.coarse, 'model': args.model,
+                'tta_threshold': args.tta_threshold,
+            },
+        },
+        'summary': summary,
+        'boards': [dict((k, v) for k, v in r.items() if k != 'predicted') for r in results],
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+
+    print_summary(summary)
+    print(f"\n💾 Resultados guardados en: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark del transporte de casillas entre procesos de detección y el
+proceso de inferencia (tile_transport)
+
+Varios procesos trabajadores cortan las 64 casillas de un tablero y las
+envían al proceso principal, que las lee como float32 normalizado (el
+formato que recibe la red). Compara:
+
+  - Cola con pickle float32: la pila de 32x32x64 float32 (256 KB) se
+    serializa y copia por una tubería, como devuelve hoy detectBoard.
+  - Cola con pickle uint8: lo mismo con los píxeles uint8 (64 KB).
+  - Memoria compartida: los trabajadores escriben uint8 directamente en un
+    anillo de ranuras (TileRing) y solo viaja el índice de la ranura, por
+    una cola SimpleQueue.
+
+Con la misma capacidad de cola y de anillo (contrapresión equivalente).
+Además de tableros/s reporta el tiempo de CPU del proceso receptor por
+tablero, el coste que el transporte añade al proceso de inferencia (con
+pocos núcleos los trabajadores compiten por la CPU y los tableros/s
+reflejan también su coste).
+Por defecto mide solo el transporte (casillas de un tablero ya localizado);
+con --detect cada trabajador decodifica y detecta el tablero completo.
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+import numpy as np
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+import chessboard_finder
+import detection_worker
+from tile_transport import TileRing
+from synthetic_boards import generate_screenshot
+
+MODES = [('Cola pickle float32', 'pickle'), ('Cola pickle uint8', 'pickle_uint8'),
+         ('Memoria compartida', 'shared')]
+
+
+def produce(mode, image, boards, channel, start, detect):
+    """Proceso trabajador: envía boards tableros por el canal del modo, en
+    memoria compartida channel es (anillo, cola de índices de ranura)"""
+    import io
+    import PIL.Image
+    data = image
+    if not detect:
+        img = PIL.Image.open(io.BytesIO(image)).convert('L')
+        img_arr = np.asarray(img, dtype=np.uint8)
+        corners = chessboard_finder.findChessboardCorners(img_arr)
+    if mode == 'shared':
+        ring, channel = channel
+        detection_worker.attachTileRing(ring)
+    start.wait()
+
+    for _ in range(boards):
+        if mode == 'shared':
+            if detect:
+                error, slot, corners, stage_ms = detection_worker.detectBoardToRing(data)
+            else:
+                slot = ring.acquire()
+                chessboard_finder.getChessTilesGray(img_arr, corners, ring.view(slot))
+            channel.put((slot, corners))
+        else:
+            uint8 = mode == 'pickle_uint8'
+            if detect:
+                out = np.empty([32, 32, 64], np.uint8) if uint8 else None
+                error, tiles, corners, stage_ms = detection_worker.detectBoard(data, out=out)
+            else:
+                tiles = chessboard_finder.getChessTilesGray(
+                    img_arr, corners, np.empty([32, 32, 64], np.uint8) if uint8 else None)
+            channel.put((tiles, corners))
+
+
+def run(mode, workers, boards_per_worker, image, capacity, detect):
+    """Tableros/s recibidos por el proceso principal, us de CPU del proceso
+    principal por tablero y suma de control"""
+    context = multiprocessing.get_context('spawn')
+    if mode == 'shared':
+        ring = TileRing(capacity, context)
+        channel = (ring, context.SimpleQueue())
+    else:
+        channel = context.Queue(maxsize=capacity)
+    start = context.Event()
+    processes = [context.Process(target=produce, args=(
+        mode, image, boards_per_worker, channel, start, detect))
+        for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # Esperar a que los trabajadores arranquen antes de medir
+    time.sleep(1.0 + 0.1 * workers)
+
+    tiles = np.empty([32, 32, 64], dtype=np.float32)
+    checksum = 0.0
+    total = workers * boards_per_worker
+    began = time.perf_counter()
+    began_cpu = time.process_time()
+    start.set()
+    for _ in range(total):
+        if mode == 'shared':
+            slot, corners = channel[1].get()
+            if slot is not None:
+                ring.read(slot, out=tiles)
+                ring.release(slot)
+        else:
+            # Con timeout para no quedar bloqueado si un trabajador falla
+            received, corners = channel.get(timeout=60)
+            if received is None:
+                pass
+            elif received.dtype == np.uint8:
+                np.multiply(received, np.float32(1 / 255.0), out=tiles)
+            else:
+                tiles = received
+        checksum += float(tiles[0, 0, 0])
+    elapsed = time.perf_counter() - began
+    cpu_us = (time.process_time() - began_cpu) / total * 1e6
+
+    for process in processes:
+        process.join()
+    if mode == 'shared':
+        ring.close()
+    return total / elapsed, cpu_us, checksum / total
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark de transporte de casillas: pickle frente a memoria compartida'
+    )
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 16],
+                       help='Números de procesos trabajadores a medir')
+    parser.add_argument('--boards', type=int, default=2000,
+                       help='Tableros en total por medición')
+    parser.add_argument('--capacity', type=int, default=32,
+                       help='Tableros en vuelo (tamaño de cola y ranuras del anillo)')
+    parser.add_argument('--detect', action='store_true',
+                       help='Decodificar y detectar el tablero en cada trabajador')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    import io
+    # Primera captura en la que se detecta el tablero
+    rng = np.random.default_rng(args.seed)
+    while True:
+        img, _ = generate_screenshot(800, 600, rng=rng)
+        if chessboard_finder.findChessboardCorners(
+                np.asarray(img.convert('L'), dtype=np.uint8)) is not None:
+            break
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    image = buffer.getvalue()
+
+    print(f"\n📊 {args.boards} tableros por medición, capacidad {args.capacity}, "
+          f"{os.cpu_count()} CPU, {'con detección' if args.detect else 'solo transporte'}")
+    print(f"\n{'Método':<22} {'Trabajadores':>12} {'Tableros/s':>11} {'MB/s':>8} "
+          f"{'vs float32':>11} {'CPU receptor us':>16}")
+    for workers in args.workers:
+        baseline = None
+        checksums = []
+        for name, mode in MODES:
+            rate, cpu_us, checksum = run(mode, workers, max(1, args.boards // workers), image,
+                                 args.capacity, args.detect)
+            checksums.append(checksum)
+            baseline = baseline or rate
+            board_kb = 256 if mode == 'pickle' else 64
+            print(f"{name:<22} {workers:>12} {rate:>11,.0f} "
+                  f"{rate * board_kb / 1024:>8,.0f} {rate / baseline:>10.2f}x "
+                  f"{cpu_us:>16,.0f}")
+        if not np.allclose(checksums, checksums[0]):
+            print(f"⚠️  Las casillas recibidas difieren entre métodos: {checksums}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark de rendimiento de video_to_fen sobre un video sintético
+Genera una partida sintética (por defecto 1080p a 30 fps) y mide si la
+línea de tiempo se procesa en tiempo real
+"""
+
+import os
+import sys
+import time
+import tempfile
+import cv2
+import numpy as np
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+from chessboard_tracker import ChessboardTracker
+from synthetic_boards import generate_video_frames
+from video_to_fen import iter_video_frames, process_stream
+
+
+def write_synthetic_video(path, width, height, fps, seconds, frames_per_move):
+    """Escribir video sintético mp4 y devolver el número de fotogramas"""
+    n_frames = int(fps * seconds)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'),
+                             fps, (width, height))
+    for frame, _ in generate_video_frames(width, height, n_frames,
+                                          frames_per_move=frames_per_move):
+        writer.write(cv2.cvtColor(np.asarray(frame), cv2.COLOR_RGB2BGR))
+    writer.release()
+    return n_frames
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark de rendimiento de video_to_fen con video sintético'
+    )
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--frames-per-move', type=int, default=45,
+                       help='Fotogramas entre movimientos de la partida sintética')
+    parser.add_argument('--stride', type=int, default=1)
+    parser.add_argument('--coarse', action='store_true',
+                       help='Detección coarse-to-fine')
+    parser.add_argument('--detection-only', action='store_true',
+                       help='Medir solo decodificación y detección, sin modelo')
+    parser.add_argument('--model', '-m',
+                       default='tensorflow_chessbot/saved_models/frozen_graph.pb')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, 'synthetic.mp4')
+        print(f"🎬 Generando video sintético {args.width}x{args.height} "
+              f"a {args.fps:g} fps, {args.seconds:g}s...")
+        n_frames = write_synthetic_video(video_path, args.width, args.height,
+                                         args.fps, args.seconds, args.frames_per_move)
+
+        # Solo decodificación, como referencia
+        start = time.perf_counter()
+        decoded = sum(1 for _ in iter_video_frames(video_path, args.stride))
+        decode_fps = decoded / (time.perf_counter() - start)
+
+        predictor = None
+        if not args.detection_only:
+            from tensorflow_chessbot import ChessboardPredictor
+            predictor = ChessboardPredictor(args.model)
+        tracker = ChessboardTracker(predictor, coarse_to_fine=args.coarse)
+
+        start = time.perf_counter()
+        timeline = list(process_stream(iter_video_frames(video_path, args.stride),
+                                       tracker, detection_only=args.detection_only))
+        elapsed = time.perf_counter() - start
+        if predictor is not None:
+            predictor.close()
+
+    processed = tracker.stats['frames']
+    # Fotogramas del video cubiertos por segundo de proceso
+    video_fps = n_frames / elapsed
+    print(f"\n{'Fotogramas del video':<32} {n_frames}")
+    print(f"{'Fotogramas procesados':<32} {processed} (stride {args.stride})")
+    print(f"{'Solo decodificación':<32} {decode_fps:.1f} fps")
+    print(f"{'Pipeline completo':<32} {processed / elapsed:.1f} fps procesados, "
+          f"{video_fps:.1f} fps de video")
+    print(f"{'Posiciones en la línea de tiempo':<32} {len(timeline)}")
+    print(f"{'Detecciones completas':<32} {tracker.stats['detections']}")
+    print(f"{'Casillas inferidas / omitidas':<32} "
+          f"{tracker.stats['tiles_inferred']} / {tracker.stats['tiles_skipped']}")
+
+    realtime = video_fps >= args.fps
+    print(f"\n{'✅' if realtime else '❌'} Tiempo real a {args.fps:g} fps: "
+          f"{'sí' if realtime else 'no'} ({video_fps / args.fps:.2f}x)")
+    return 0 if realtime else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Comparación de resultados de benchmark_suite.py entre commits
+
+El primer archivo es la referencia (baseline) y cada archivo siguiente se
+compara contra él. Para cada etapa se calculan intervalos de confianza por
+bootstrap del cambio relativo de la latencia p50 y del rendimiento
+(tableros/s, a partir de la latencia media). Se marca una regresión cuando
+todo el intervalo supera el umbral, y el programa termina con código 1.
+"""
+
+import sys
+import json
+import numpy as np
+
+
+def load_results(path):
+    """Cargar resultados de benchmark_suite.py validando que tengan muestras"""
+    with open(path, 'r') as f:
+        results = json.load(f)
+    stages = results.get('summary', {}).get('stages')
+    if not stages or not all('samples_ms' in s for s in stages.values()):
+        raise ValueError(f"{path} no contiene muestras por etapa de benchmark_suite.py")
+    return results
+
+
+def run_label(results, path):
+    """Etiqueta corta para una ejecución: commit abreviado o nombre de archivo"""
+    commit = results.get('metadata', {}).get('commit')
+    if not commit:
+        return path
+    dirty = '+cambios' if results['metadata'].get('dirty') else ''
+    return commit[:8] + dirty
+
+
+def bootstrap(samples, statistic, n_boot, rng, chunk_size=1 << 22):
+    """Distribución bootstrap de statistic(muestras, axis=1) remuestreando en bloques"""
+    samples = np.asarray(samples, dtype=np.float64)
+    n = samples.size
+    # Limitar memoria: como mucho chunk_size valores remuestreados a la vez
+    rows = max(1, chunk_size // n)
+    values = []
+    for start in range(0, n_boot, rows):
+        idx = rng.integers(0, n, size=(min(rows, n_boot - start), n))
+        values.append(statistic(samples[idx], axis=1))
+    return np.concatenate(values)
+
+
+def relative_change_ci(base, cand, statistic, n_boot, confidence, rng):
+    """Cambio relativo (cand/base - 1) de un estadístico con su intervalo bootstrap"""
+    point = statistic(np.asarray(cand)) / statistic(np.asarray(base)) - 1
+    ratios = (bootstrap(cand, statistic, n_boot, rng) /
+              bootstrap(base, statistic, n_boot, rng) - 1)
+    alpha = (1 - confidence) / 2
+    low, high = np.percentile(ratios, [100 * alpha, 100 * (1 - alpha)])
+    return float(point), [float(low), float(high)]
+
+
+def compare_stage(base_samples, cand_samples, threshold, n_boot, confidence, rng):
+    """Comparar una etapa: latencia p50 y rendimiento con intervalos de confianza"""
+    p50_change, p50_ci = relative_change_ci(base_samples, cand_samples, np.median,
+                                            n_boot, confidence, rng)
+    mean_change, mean_ci = relative_change_ci(base_samples, cand_samples, np.mean,
+                                              n_boot, confidence, rng)
+    # Rendimiento = 1 / latencia media, el intervalo se invierte
+    throughput_change = 1 / (1 + mean_change) - 1
+    throughput_ci = [1 / (1 + mean_ci[1]) - 1, 1 / (1 + mean_ci[0]) - 1]
+
+    base_mean = float(np.mean(base_samples))
+    cand_mean = float(np.mean(cand_samples))
+    return {
+        'baseline_p50_ms': float(np.median(base_samples)),
+        'candidate_p50_ms': float(np.median(cand_samples)),
+        'p50_change': p50_change,
+        'p50_change_ci': p50_ci,
+        'baseline_boards_per_sec': 1000.0 / base_mean if base_mean > 0 else None,
+        'candidate_boards_per_sec': 1000.0 / cand_mean if cand_mean > 0 else None,
+        'throughput_change': throughput_change,
+        'throughput_change_ci': throughput_ci,
+        # Regresión solo si todo el intervalo está más allá del umbral
+        'regression': bool(p50_ci[0] > threshold or throughput_ci[1] < -threshold),
+        'improvement': bool(p50_ci[1] < -threshold and throughput_ci[0] > threshold),
+    }
+
+
+def compare_runs(baseline, candidate, threshold=0.05, max_accuracy_drop=0.005,
+                 n_boot=2000, confidence=0.95, seed=0):
+    """
+    Comparar una ejecución candidata contra la referencia
+
+    Returns:
+        dict con comparación por etapa, precisión y lista de regresiones
+    """
+    rng = np.random.default_rng(seed)
+    base_stages = baseline['summary']['stages']
+    cand_stages = candidate['summary']['stages']
+
+    stages = {}
+    regressions = []
+    for name in sorted(set(base_stages) & set(cand_stages)):
+        base_samples = base_stages[name]['samples_ms']
+        cand_samples = cand_stages[name]['samples_ms']
+        if len(base_samples) < 2 or len(cand_samples) < 2:
+            continue
+        stages[name] = compare_stage(base_samples, cand_samples, threshold,
+                                     n_boot, confidence, rng)
+        if stages[name]['regression']:
+            regressions.append(f"latencia de '{name}': "
+                               f"{stages[name]['p50_change']:+.1%} p50")
+
+    accuracy = {}
+    for key in ('detection_rate', 'tile_accuracy', 'board_accuracy'):
+        base_value = baseline['summary'][key]
+        cand_value = candidate['summary'][key]
+        accuracy[key] = {'baseline': base_value, 'candidate': cand_value,
+                         'change': cand_value - base_value}
+        if cand_value < base_value - max_accuracy_drop:
+            regressions.append(f"{key}: {base_value:.2%} -> {cand_value:.2%}")
+
+    config_keys = ('boards', 'sizes', 'themes', 'seed', 'coarse')
+    base_config = baseline['metadata'].get('config', {})
+    cand_config = candidate['metadata'].get('config', {})
+    return {
+        'threshold': threshold,
+        'confidence': confidence,
+        'bootstrap_samples': n_boot,
+        'same_config': all(base_config.get(k) == cand_config.get(k) for k in config_keys),
+        'stages': stages,
+        'accuracy': accuracy,
+        'regressions': regressions,
+    }
+
+
+def format_ci(change, ci):
+    return f"{change:+7.1%} [{ci[0]:+.1%}, {ci[1]:+.1%}]"
+
+
+def print_comparison(comparison):
+    """Imprimir comparación en consola"""
+    print("\n" + "=" * 90)
+    print(f"  {comparison['baseline']}  vs  {comparison['candidate']}")
+    print("=" * 90)
+    if not comparison['same_config']:
+        print("⚠️  Las ejecuciones usan configuraciones distintas")
+
+    print(f"   {'Etapa':<18} {'p50 base':>9} {'p50 nuevo':>10} "
+          f"{'Δ p50 [IC]':>28} {'Δ tableros/s [IC]':>28}")
+    for name, stage in comparison['stages'].items():
+        flag = '❌' if stage['regression'] else ('✅' if stage['improvement'] else '  ')
+        print(f"{flag} {name:<18} {stage['baseline_p50_ms']:>9.2f} "
+              f"{stage['candidate_p50_ms']:>10.2f} "
+              f"{format_ci(stage['p50_change'], stage['p50_change_ci']):>28} "
+              f"{format_ci(stage['throughput_change'], stage['throughput_change_ci']):>28}")
+
+    print()
+    for key, values in comparison['accuracy'].items():
+        print(f"   {key:<18} {values['baseline']:>9.2%} {values['candidate']:>10.2%} "
+              f"{values['change']:>+10.2%}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Comparar resultados de benchmark_suite.py y detectar regresiones'
+    )
+    parser.add_argument('results', nargs='+',
+                       help='Archivos JSON de resultados, el primero es la referencia')
+    parser.add_argument('--threshold', '-t', type=float, default=0.05,
+                       help='Cambio relativo de latencia/rendimiento tolerado (0.05 = 5%%)')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.005,
+                       help='Caída absoluta de precisión tolerada')
+    parser.add_argument('--bootstrap', type=int, default=2000,
+                       help='Número de remuestreos bootstrap')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                       help='Nivel de confianza de los intervalos')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o',
+                       help='Guardar comparación en JSON (para generate_report.py --comparison)')
+    args = parser.parse_args()
+
+    if len(args.results) < 2:
+        parser.error('se necesitan al menos dos archivos de resultados')
+
+    runs = [(path, load_results(path)) for path in args.results]
+    baseline_path, baseline = runs[0]
+
+    comparisons = []
+    for path, candidate in runs[1:]:
+        comparison = compare_runs(baseline, candidate, args.threshold,
+                                  args.max_accuracy_drop, args.bootstrap,
+                                  args.confidence, args.seed)
+        comparison['baseline'] = run_label(baseline, baseline_path)
+        comparison['candidate'] = run_label(candidate, path)
+        if comparison['baseline'] == comparison['candidate']:
+            # Mismo commit, distinguir por archivo
+            comparison['baseline'], comparison['candidate'] = baseline_path, path
+        comparisons.append(comparison)
+        print_comparison(comparison)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'comparisons': comparisons}, f, indent=2, sort_keys=True)
+        print(f"\n💾 Comparación guardada en: {args.output}")
+
+    regressions = [(c['candidate'], r) for c in comparisons for r in c['regressions']]
+    if regressions:
+        print(f"\n❌ {len(regressions)} regresiones (umbral {args.threshold:.0%}):")
+        for candidate, regression in regressions:
+            print(f"   {candidate}: {regression}")
+        sys.exit(1)
+    print("\n✅ Sin regresiones")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,8 +7,84 @@ import json
 from pathlib import Path
 from datetime import datetime
 
+def generate_comparison_section(comparison_file):
+    """Genera sección HTML comparando ejecuciones (salida de compare_benchmarks.py)"""
+    
+    with open(comparison_file, 'r') as f:
+        comparisons = json.load(f)['comparisons']
+    
+    def change_cell(change, ci):
+        return f"{change:+.1%} <small>[{ci[0]:+.1%}, {ci[1]:+.1%}]</small>"
+    
+    html = """
+            <!-- Comparación entre ejecuciones -->
+            <div class="section">
+                <h2>⏱️ Comparación de Rendimiento entre Commits</h2>
+    """
+    
+    for comparison in comparisons:
+        html += f"""
+                <div class="comparison-box">
+                    <h3>{comparison['baseline']} vs {comparison['candidate']}</h3>
+                    <p>Intervalos de confianza bootstrap al {comparison['confidence']:.0%}, 
+                       umbral de regresión {comparison['threshold']:.0%}</p>
+                </div>
+                <table>
+                    <tr>
+                        <th>Etapa</th>
+                        <th>p50 {comparison['baseline']} (ms)</th>
+                        <th>p50 {comparison['candidate']} (ms)</th>
+                        <th>Δ p50</th>
+                        <th>Tableros/s {comparison['baseline']}</th>
+                        <th>Tableros/s {comparison['candidate']}</th>
+                        <th>Δ Tableros/s</th>
+                        <th>Estado</th>
+                    </tr>
+        """
+        
+        for name, stage in comparison['stages'].items():
+            if stage['regression']:
+                badge = '<span class="badge warning">Regresión</span>'
+            elif stage['improvement']:
+                badge = '<span class="badge success">Mejora</span>'
+            else:
+                badge = '<span class="badge info">Sin cambio</span>'
+            html += f"""
+                    <tr>
+                        <td>{name}</td>
+                        <td>{stage['baseline_p50_ms']:.2f}</td>
+                        <td>{stage['candidate_p50_ms']:.2f}</td>
+                        <td>{change_cell(stage['p50_change'], stage['p50_change_ci'])}</td>
+                        <td>{stage['baseline_boards_per_sec']:.1f}</td>
+                        <td>{stage['candidate_boards_per_sec']:.1f}</td>
+                        <td>{change_cell(stage['throughput_change'], stage['throughput_change_ci'])}</td>
+                        <td>{badge}</td>
+                    </tr>
+            """
+        
+        for key, values in comparison['accuracy'].items():
+            html += f"""
+                    <tr>
+                        <td>{key}</td>
+                        <td colspan="3">{values['baseline']:.2%}</td>
+                        <td colspan="3">{values['candidate']:.2%}</td>
+                        <td>{values['change']:+.2%}</td>
+                    </tr>
+            """
+        
+        html += """
+                </table>
+        """
+    
+    html += """
+            </div>
+    """
+    return html
+
+
 def generate_html_report(results_file='benchmark_results.json', 
-                        output_file='benchmark_report.html'):
+                        output_file='benchmark_report.html',
+                        comparison_file=None):
     """Genera reporte HTML completo"""
     
     with open(results_file, 'r') as f:
@@ -544,6 +620,10 @@ def generate_html_report(results_file='benchmark_results.json',
             </div>
         """
     
+    # Comparación entre commits si existe
+    if comparison_file:
+        html += generate_comparison_section(comparison_file)
+    
     # Análisis de rendimiento
     html += f"""
             <!-- Análisis -->
@@ -704,6 +784,8 @@ def main():
     parser.add_argument('--output', '-o',
                        default='benchmark_report.html',
                        help='Archivo HTML de salida')
+    parser.add_argument('--comparison', '-c',
+                       help='JSON de compare_benchmarks.py para la sección comparativa')
     
     args = parser.parse_args()
     
@@ -712,7 +794,7 @@ def main():
     print("="*70)
     print()
     
-    generate_html_report(args.results, args.output)
+    generate_html_report(args.results, args.output, args.comparison)
     
     print()
     print("="*70)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga del API de ChessBot con distintos números de workers
+
+Para cada número de workers inicia `api_server.py --workers N` en un puerto
+local, envía la misma imagen a /analyze desde varios hilos cliente durante
+un tiempo fijo y reporta peticiones/s y latencia p50/p95/p99. Al final
+detiene el servidor con SIGTERM y comprueba que termine limpiamente.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import subprocess
+import numpy as np
+import requests
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot', 'api_server.py')
+
+
+def wait_for_server(base_url, timeout=120):
+    """Esperar a que el servidor responda en / (los workers cargan el modelo)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(base_url + '/', timeout=1).ok:
+                return True
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def client_loop(base_url, image_bytes, stop_time, latencies, errors):
+    """Hilo cliente: enviar peticiones secuenciales hasta stop_time"""
+    session = requests.Session()
+    while time.monotonic() < stop_time:
+        start = time.perf_counter()
+        try:
+            response = session.post(base_url + '/analyze',
+                                    files={'file': ('board.png', image_bytes)},
+                                    timeout=60)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if ok:
+            latencies.append(elapsed_ms)
+        else:
+            errors.append(elapsed_ms)
+
+
+def run_load(base_url, image_bytes, clients, duration, warmup=2.0):
+    """Ejecutar carga con `clients` hilos y devolver métricas"""
+    # Calentamiento: primera petición de cada worker
+    warm_latencies, warm_errors = [], []
+    client_loop(base_url, image_bytes, time.monotonic() + warmup, warm_latencies, warm_errors)
+
+    latencies, errors = [], []
+    stop_time = time.monotonic() + duration
+    threads = [threading.Thread(target=client_loop,
+                                args=(base_url, image_bytes, stop_time, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    result = {'clients': clients, 'requests': len(latencies), 'errors': len(errors),
+              'requests_per_sec': len(latencies) / elapsed}
+    if latencies:
+        for q in (50, 95, 99):
+            result[f'p{q}_ms'] = float(np.percentile(latencies, q))
+    return result
+
+
+def start_server(workers, port, model=None, threads=1):
+    """Iniciar api_server.py con N workers"""
+    command = [sys.executable, SERVER_SCRIPT, '--host', '127.0.0.1',
+               '--port', str(port), '--workers', str(workers), '--threads', str(threads)]
+    if model:
+        command += ['--model', model]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def stop_server(process, timeout=60):
+    """Detener el servidor con SIGTERM, devolver True si terminó limpiamente"""
+    process.send_signal(signal.SIGTERM)
+    try:
+        return process.wait(timeout) == 0
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        return False
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Prueba de carga del API con distintos números de workers'
+    )
+    parser.add_argument('--image', '-i',
+                       default='tensorflow_chessbot/example_input.png',
+                       help='Imagen enviada a /analyze')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16],
+                       help='Números de workers a probar')
+    parser.add_argument('--clients', type=int, default=None,
+                       help='Hilos cliente (por defecto 2 por worker)')
+    parser.add_argument('--duration', type=float, default=15.0,
+                       help='Segundos de carga por configuración')
+    parser.add_argument('--port', type=int, default=8102)
+    parser.add_argument('--threads', type=int, default=1,
+                       help='Hilos por worker del servidor')
+    parser.add_argument('--model', '-m', help='Ruta al modelo congelado (.pb)')
+    parser.add_argument('--url',
+                       help='Probar un servidor ya iniciado en lugar de lanzar uno')
+    parser.add_argument('--output', '-o', help='Guardar resultados en JSON')
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        image_bytes = f.read()
+
+    results = []
+    for workers in ([None] if args.url else args.workers):
+        clients = args.clients or 2 * (workers or 1)
+        process = None
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            base_url = f'http://127.0.0.1:{args.port}'
+            print(f"🚀 Iniciando servidor con {workers} workers...")
+            process = start_server(workers, args.port, args.model, args.threads)
+            if not wait_for_server(base_url):
+                stop_server(process)
+                print(f"❌ El servidor no respondió con {workers} workers")
+                sys.exit(1)
+
+        try:
+            result = run_load(base_url, image_bytes, clients, args.duration)
+        finally:
+            clean_exit = stop_server(process) if process else None
+        result['workers'] = workers
+        result['clean_shutdown'] = clean_exit
+        results.append(result)
+
+        print(f"📊 workers={workers or 'externo'} clientes={clients}: "
+              f"{result['requests_per_sec']:.1f} req/s, "
+              f"p50 {result.get('p50_ms', float('nan')):.1f} ms, "
+              f"p95 {result.get('p95_ms', float('nan')):.1f} ms, "
+              f"p99 {result.get('p99_ms', float('nan')):.1f} ms, "
+              f"errores {result['errors']}"
+              + ("" if clean_exit is None else
+                 f", apagado {'limpio ✅' if clean_exit else 'forzado ❌'}"))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Resultados guardados en: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -17,8 +17,10 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'
 
 try:
     from tensorflow_chessbot import ChessboardPredictor
+    from helper_functions import getPredictionFromProbabilities
     import helper_image_loading
     import chessboard_finder
+    import pipeline_timing
 except ImportError as e:
     print(f"❌ Error importando módulos: {e}")
     print("   Asegúrate de que tensorflow_chessbot esté disponible")
@@ -65,11 +67,13 @@ class RealBenchmark:
     def process_image(self, image_path):
         """Procesar una imagen y extraer métricas"""
         try:
-            start_time = time.time()
+            start_time = time.perf_counter()
             
             # Cargar imagen directamente como PIL Image
             import PIL.Image
-            img = PIL.Image.open(str(image_path))
+            with pipeline_timing.stage('decode'):
+                img = PIL.Image.open(str(image_path))
+                img.load()
             
             # Resize si es necesario
             img = helper_image_loading.resizeAsNeeded(img)
@@ -82,26 +86,21 @@ class RealBenchmark:
             if tiles is None:
                 raise Exception("No se encontró tablero en la imagen")
             
-            # Hacer predicción
-            fen, tile_certainties = self.predictor.getPrediction(tiles)
-            # Hacer predicción
-            fen, tile_certainties = self.predictor.getPrediction(tiles)
+            # Hacer predicción (una sola ejecución del modelo, las
+            # probabilidades se reutilizan para las métricas por casilla)
+            guess_prob = self.predictor.getTileProbabilities(tiles)
+            with pipeline_timing.stage('fen_encoding'):
+                fen, tile_certainties = getPredictionFromProbabilities(guess_prob)
             
-            inference_time = (time.time() - start_time) * 1000  # ms
+            inference_time = (time.perf_counter() - start_time) * 1000  # ms
             self.inference_times.append(inference_time)
             
             if fen and tile_certainties is not None:
                 self.successful_predictions += 1
                 
-                # Obtener predicciones individuales por casilla
-                # Ejecutar de nuevo para obtener probabilidades
-                validation_set = np.swapaxes(np.reshape(tiles, [32*32, 64]),0,1)
-                guess_prob, guessed = self.predictor.sess.run(
-                    [self.predictor.probabilities, self.predictor.prediction], 
-                    feed_dict={self.predictor.x: validation_set, self.predictor.keep_prob: 1.0})
-                
                 # Analizar predicciones (64 casillas)
-                for prob_dist, pred_idx in zip(guess_prob, guessed):
+                for prob_dist in guess_prob:
+                    pred_idx = int(np.argmax(prob_dist))
                     confidence = prob_dist[pred_idx]
                     piece = self.classes[pred_idx]
                     
@@ -184,7 +183,9 @@ class RealBenchmark:
                 'max_inference_time_ms': np.max(self.inference_times) if self.inference_times else 0,
                 'std_inference_time_ms': np.std(self.inference_times) if self.inference_times else 0
             },
-            'per_piece_stats': {}
+            'per_piece_stats': {},
+            # Latencia por etapa del pipeline (decode, resize, gradient_hough, ...)
+            'stage_timings': pipeline_timing.TIMER.toDict()
         }
         
         # Métricas por pieza
@@ -255,6 +256,11 @@ class RealBenchmark:
         print(f"   Tiempo promedio:           {overall['avg_inference_time_ms']:.1f}ms")
         print(f"   Tiempo mín/máx:            {overall['min_inference_time_ms']:.1f}ms / {overall['max_inference_time_ms']:.1f}ms")
         
+        print(f"\n⏱️  LATENCIA POR ETAPA (p50 / p95):")
+        for stage, timing in metrics['stage_timings'].items():
+            print(f"   {stage:<18s} {timing['p50_ms']:8.2f}ms / {timing['p95_ms']:8.2f}ms "
+                  f"({timing['count']} llamadas)")
+        
         color_metrics = metrics['metrics_by_color']
         print(f"\n🎨 CONFIANZA POR COLOR:")
         print(f"   Piezas Blancas:  {color_metrics['white_pieces']['avg_confidence']:.2%} "
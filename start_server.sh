@@ -32,10 +32,15 @@ fi
 export FLASK_ENV=${FLASK_ENV:-production}
 export FLASK_PORT=${FLASK_PORT:-5000}
 export FLASK_HOST=${FLASK_HOST:-0.0.0.0}
+export FLASK_WORKERS=${FLASK_WORKERS:-4}
+# Métricas de cada worker en su propio puerto (METRICS_PORT + índice)
+export METRICS_PORT=${METRICS_PORT:-9200}
 
 echo "📍 Configuración:"
 echo "   - Host: $FLASK_HOST"
 echo "   - Puerto: $FLASK_PORT"
+echo "   - Workers: $FLASK_WORKERS"
+echo "   - Métricas: puertos $METRICS_PORT-$((METRICS_PORT + FLASK_WORKERS - 1))"
 echo "   - Entorno: $FLASK_ENV"
 echo ""
 
@@ -44,4 +49,5 @@ cd tensorflow_chessbot
 echo "✅ Servidor iniciando..."
 echo "   URL: http://localhost:$FLASK_PORT"
 echo ""
-python api_server.py --host $FLASK_HOST --port $FLASK_PORT
+python api_server.py --host $FLASK_HOST --port $FLASK_PORT --workers $FLASK_WORKERS \
+    --metrics-port $METRICS_PORT
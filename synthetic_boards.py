@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Generador de capturas sintéticas de tableros de ajedrez
+Produce imágenes con esquinas conocidas para benchmarks reproducibles
+"""
+
+import numpy as np
+import PIL.Image
+import PIL.ImageDraw
+import PIL.ImageFilter
+
+
+# Colores (claro, oscuro) de casillas de algunos temas comunes
+BOARD_THEMES = {
+    'lichess': ((240, 217, 181), (181, 136, 99)),
+    'chesscom': ((238, 238, 210), (118, 150, 86)),
+    'blue': ((222, 227, 230), (140, 162, 173)),
+    'gray': ((220, 220, 220), (150, 150, 150)),
+}
+
+
+def random_pieces(rng, piece_prob=0.3):
+    """Piezas aleatorias como dict {(fila, columna): color RGB}"""
+    pieces = {}
+    for rank in range(8):
+        for file in range(8):
+            if rng.random() < piece_prob:
+                white = rng.random() < 0.5
+                pieces[(rank, file)] = (250, 250, 250) if white else (30, 30, 30)
+    return pieces
+
+
+def draw_board(draw, x0, y0, board_size, theme, pieces):
+    """Dibujar tablero 8x8 con piezas simples (círculos) en (x0, y0)"""
+    light, dark = BOARD_THEMES[theme]
+    tile = board_size / 8.0
+
+    for rank in range(8):
+        for file in range(8):
+            color = light if (rank + file) % 2 == 0 else dark
+            tx0 = x0 + int(round(file * tile))
+            ty0 = y0 + int(round(rank * tile))
+            tx1 = x0 + int(round((file + 1) * tile)) - 1
+            ty1 = y0 + int(round((rank + 1) * tile)) - 1
+            draw.rectangle([tx0, ty0, tx1, ty1], fill=color)
+
+            # Pieza aproximada: círculo blanco o negro con borde
+            if (rank, file) in pieces:
+                m = tile * 0.2
+                draw.ellipse([tx0 + m, ty0 + m, tx1 - m, ty1 - m],
+                             fill=pieces[(rank, file)], outline=(0, 0, 0))
+
+
+def generate_screenshot(width, height, board_fraction=0.6, theme=None,
+                        rng=None, noise=True):
+    """
+    Generar captura sintética con un tablero en posición aleatoria
+
+    Args:
+        width, height: Tamaño de la imagen
+        board_fraction: Tamaño del tablero respecto al lado menor
+        theme: Tema de colores (aleatorio si es None)
+        rng: Generador numpy.random.Generator
+        noise: Añadir elementos de interfaz y ruido alrededor del tablero
+
+    Returns:
+        (imagen PIL RGB, esquinas [x0, y0, x1, y1] verdaderas)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    if theme is None:
+        theme = rng.choice(sorted(BOARD_THEMES))
+
+    background = tuple(int(v) for v in rng.integers(20, 80, size=3))
+    img = PIL.Image.new('RGB', (width, height), background)
+    draw = PIL.ImageDraw.Draw(img)
+
+    board_size = int(min(width, height) * board_fraction) // 8 * 8
+    x0 = int(rng.integers(0, width - board_size + 1))
+    y0 = int(rng.integers(0, height - board_size + 1))
+
+    if noise:
+        # Paneles de interfaz fuera del tablero
+        for _ in range(int(rng.integers(2, 6))):
+            px0 = int(rng.integers(0, width))
+            py0 = int(rng.integers(0, height))
+            px1 = px0 + int(rng.integers(20, max(21, width // 4)))
+            py1 = py0 + int(rng.integers(10, max(11, height // 10)))
+            fill = tuple(int(v) for v in rng.integers(60, 200, size=3))
+            draw.rectangle([px0, py0, px1, py1], fill=fill)
+
+    draw_board(draw, x0, y0, board_size, theme, random_pieces(rng))
+
+    if noise:
+        arr = np.asarray(img, dtype=np.int16)
+        arr = arr + rng.integers(-6, 7, size=arr.shape, dtype=np.int16)
+        img = PIL.Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+
+    corners = np.array([x0, y0, x0 + board_size, y0 + board_size], dtype=int)
+    return img, corners
+
+
+NON_BOARD_KINDS = ('photo', 'ui', 'shapes')
+
+
+def generate_non_board(width, height, kind, rng=None):
+    """
+    Generar imagen sin tablero para medir falsos positivos
+
+    kind: 'photo' (ruido suavizado a varias escalas, como una foto),
+    'ui' (paneles y líneas de texto) o 'shapes' (círculos difuminados)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    if kind == 'photo':
+        arr = np.zeros((height, width))
+        for sigma in (3, 11, 37, 101):
+            noise = PIL.Image.fromarray(
+                rng.integers(0, 256, size=(height, width), dtype=np.uint8))
+            layer = np.asarray(noise.filter(PIL.ImageFilter.GaussianBlur(sigma)),
+                               dtype=np.float64)
+            arr += (layer - layer.mean()) / (layer.std() + 1e-6) * np.sqrt(sigma)
+        arr = (arr - arr.min()) / (arr.max() - arr.min()) * 255
+        arr = arr + rng.integers(-10, 11, size=arr.shape)
+        return PIL.Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).convert('RGB')
+
+    background = tuple(int(v) for v in rng.integers(0, 256, size=3))
+    img = PIL.Image.new('RGB', (width, height), background)
+    draw = PIL.ImageDraw.Draw(img)
+    if kind == 'ui':
+        for _ in range(int(rng.integers(5, 20))):
+            x0 = int(rng.integers(0, width))
+            y0 = int(rng.integers(0, height))
+            x1 = x0 + int(rng.integers(20, max(21, width // 3)))
+            y1 = y0 + int(rng.integers(10, max(11, height // 5)))
+            draw.rectangle([x0, y0, x1, y1],
+                           fill=tuple(int(v) for v in rng.integers(0, 256, size=3)))
+        # Líneas de texto como bloques de palabras
+        line_height = int(rng.integers(12, 30))
+        for y in range(20, height - 20, line_height):
+            x = 10
+            while x < width // 2:
+                word = int(rng.integers(10, 60))
+                draw.rectangle([x, y, x + word, y + line_height // 2], fill=(30, 30, 30))
+                x += word + 8
+        return img
+    if kind == 'shapes':
+        for _ in range(int(rng.integers(10, 60))):
+            x0 = int(rng.integers(0, width))
+            y0 = int(rng.integers(0, height))
+            r = int(rng.integers(5, max(6, width // 6)))
+            draw.ellipse([x0, y0, x0 + r, y0 + r],
+                         fill=tuple(int(v) for v in rng.integers(0, 256, size=3)))
+        return img.filter(PIL.ImageFilter.GaussianBlur(2))
+    raise ValueError(f"Tipo desconocido: {kind}")
+
+
+def draw_text_lines(draw, x0, y0, x1, y1, line_height, rng):
+    """Líneas de texto como bloques de palabras grises dentro de la caja"""
+    for y in range(y0, y1 - line_height // 2, line_height):
+        x = x0
+        while True:
+            word = int(rng.integers(max(4, line_height), 5 * max(4, line_height)))
+            if x + word > x1:
+                break
+            draw.rectangle([x, y, x + word, y + line_height // 2], fill=(40, 40, 40))
+            x += word + max(3, line_height // 2)
+
+
+def generate_page(width, height, rows, cols, rng=None, theme=None, noise=True):
+    """
+    Generar página sintética (libro escaneado u hoja de problemas) con una
+    cuadrícula de rows x cols diagramas
+
+    Cada diagrama ocupa su celda con tamaño y desplazamiento aleatorios, con
+    marco negro y un pie de texto debajo; la página tiene texto arriba.
+
+    Returns:
+        (imagen PIL RGB, lista de esquinas [x0, y0, x1, y1] de cada tablero,
+         lista de celdas [x0, y0, x1, y1] de cada diagrama con su pie)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    if theme is None:
+        theme = rng.choice(sorted(BOARD_THEMES))
+
+    paper = tuple(int(v) for v in rng.integers(225, 256) - rng.integers(0, 12, size=3))
+    img = PIL.Image.new('RGB', (width, height), paper)
+    draw = PIL.ImageDraw.Draw(img)
+
+    margin = int(min(width, height) * 0.04)
+    header = int(height * 0.06)
+    draw_text_lines(draw, margin, margin, width - margin, margin + header,
+                    max(6, header // 3), rng)
+
+    top = margin + header + margin // 2
+    cell_w = (width - 2 * margin) / cols
+    cell_h = (height - top - margin) / rows
+    corners, cells = [], []
+    for row in range(rows):
+        for col in range(cols):
+            cx0 = int(margin + col * cell_w)
+            cy0 = int(top + row * cell_h)
+            cx1 = int(margin + (col + 1) * cell_w)
+            cy1 = int(top + (row + 1) * cell_h)
+            caption = max(8, int(cell_h * 0.12))
+            room = min(cx1 - cx0, cy1 - cy0 - caption)
+            board_size = int(room * rng.uniform(0.6, 0.88)) // 8 * 8
+            x0 = cx0 + int(rng.integers(0, cx1 - cx0 - board_size + 1))
+            y0 = cy0 + int(rng.integers(0, cy1 - cy0 - caption - board_size + 1))
+
+            draw.rectangle([x0 - 3, y0 - 3, x0 + board_size + 2, y0 + board_size + 2],
+                           outline=(0, 0, 0), width=2)
+            draw_board(draw, x0, y0, board_size, theme, random_pieces(rng))
+            draw_text_lines(draw, x0, y0 + board_size + caption // 3,
+                            x0 + board_size, y0 + board_size + caption,
+                            max(6, caption // 2), rng)
+            corners.append([x0, y0, x0 + board_size, y0 + board_size])
+            cells.append([cx0, cy0, cx1, cy1])
+
+    if noise:
+        # Ruido y ligero desenfoque de escaneo
+        img = img.filter(PIL.ImageFilter.GaussianBlur(0.6))
+        arr = np.asarray(img, dtype=np.int16)
+        arr = arr + rng.integers(-8, 9, size=arr.shape, dtype=np.int16)
+        img = PIL.Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    return img, np.array(corners, dtype=int), np.array(cells, dtype=int)
+
+
+def get_perspective_coefficients(source, target):
+    """Coeficientes de PIL.Image.PERSPECTIVE que llevan cada punto de target
+    (coordenadas de salida) a su punto de source (coordenadas de entrada)"""
+    rows, values = [], []
+    for (x, y), (u, v) in zip(target, source):
+        rows.append([x, y, 1, 0, 0, 0, -u * x, -u * y])
+        rows.append([0, 0, 0, x, y, 1, -v * x, -v * y])
+        values += [u, v]
+    return np.linalg.solve(np.array(rows, dtype=float), np.array(values, dtype=float))
+
+
+def generate_photo(width, height, rng=None, theme=None, max_angle=35, min_tilt=0.6):
+    """
+    Generar foto sintética de un tablero físico visto en perspectiva
+
+    El tablero, con marco de madera, se proyecta con giro de hasta max_angle
+    grados e inclinación de cámara (lado lejano y profundidad reducidos hasta
+    min_tilt) sobre una mesa con textura, sombras y objetos alrededor.
+
+    Returns:
+        (imagen PIL RGB, esquinas 4x2 del tablero en la imagen en orden
+         superior izquierda, superior derecha, inferior derecha e inferior
+         izquierda del tablero plano)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    if theme is None:
+        theme = rng.choice(sorted(BOARD_THEMES))
+    pieces = random_pieces(rng)
+
+    # Tablero plano con marco
+    board_px, frame_px = 512, 40
+    flat_size = board_px + 2 * frame_px
+    wood = tuple(int(v) for v in rng.integers([90, 50, 20], [150, 100, 60]))
+    flat = PIL.Image.new('RGB', (flat_size, flat_size), wood)
+    draw_board(PIL.ImageDraw.Draw(flat), frame_px, frame_px, board_px, theme, pieces)
+
+    # Cuadrilátero del tablero con marco en la imagen
+    size = min(width, height) * rng.uniform(0.55, 0.8)
+    tilt = rng.uniform(min_tilt, 1.0)
+    depth = rng.uniform(min_tilt, 1.0)
+    angle = np.radians(rng.uniform(-max_angle, max_angle))
+    quad = np.array([[-tilt / 2, -depth / 2], [tilt / 2, -depth / 2],
+                     [0.5, depth / 2], [-0.5, depth / 2]]) * size
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    quad = quad @ rotation.T
+    # Centrar dejando el cuadrilátero dentro de la imagen
+    low, high = -quad.min(axis=0), np.array([width, height]) - quad.max(axis=0)
+    center = rng.uniform(np.minimum(low, high), np.maximum(low, high))
+    quad += center
+
+    # Homografía del tablero plano a la imagen y esquinas de las casillas
+    flat_corners = np.array([[0, 0], [flat_size, 0], [flat_size, flat_size], [0, flat_size]],
+                            dtype=float)
+    coefficients = get_perspective_coefficients(flat_corners, quad)
+    forward = np.append(get_perspective_coefficients(quad, flat_corners), 1).reshape(3, 3)
+    board_corners = np.array([[frame_px, frame_px], [frame_px + board_px, frame_px],
+                              [frame_px + board_px, frame_px + board_px],
+                              [frame_px, frame_px + board_px]], dtype=float)
+    projected = np.c_[board_corners, np.ones(4)] @ forward.T
+    corners = projected[:, :2] / projected[:, 2:]
+
+    # Mesa: degradado de luz, veta y objetos sueltos
+    table = np.array(rng.integers(60, 180, size=3), dtype=float)
+    yy, xx = np.mgrid[0:height, 0:width]
+    light = 0.75 + 0.5 * (xx * rng.uniform(-1, 1) / width + yy * rng.uniform(-1, 1) / height)
+    grain = 8 * np.sin(yy / rng.uniform(3, 12) + rng.uniform(0, 6))
+    arr = np.clip(table * light[..., None] + grain[..., None], 0, 255).astype(np.uint8)
+    img = PIL.Image.fromarray(arr)
+    draw = PIL.ImageDraw.Draw(img)
+    for _ in range(int(rng.integers(2, 6))):
+        x0 = int(rng.integers(0, width))
+        y0 = int(rng.integers(0, height))
+        x1 = x0 + int(rng.integers(20, max(21, width // 5)))
+        y1 = y0 + int(rng.integers(20, max(21, height // 5)))
+        fill = tuple(int(v) for v in rng.integers(0, 256, size=3))
+        if rng.random() < 0.5:
+            draw.ellipse([x0, y0, x1, y1], fill=fill)
+        else:
+            draw.rectangle([x0, y0, x1, y1], fill=fill)
+
+    warped = flat.transform((width, height), PIL.Image.PERSPECTIVE, tuple(coefficients),
+                            PIL.Image.BILINEAR)
+    mask = PIL.Image.new('L', (flat_size, flat_size), 255).transform(
+        (width, height), PIL.Image.PERSPECTIVE, tuple(coefficients), PIL.Image.BILINEAR)
+    img.paste(warped, (0, 0), mask)
+
+    # Iluminación irregular sobre el tablero, desenfoque y ruido de cámara
+    arr = np.asarray(img.filter(PIL.ImageFilter.GaussianBlur(rng.uniform(0.5, 1.2))),
+                     dtype=np.float32)
+    shade = 0.85 + 0.3 * (xx * rng.uniform(-1, 1) / width + yy * rng.uniform(-1, 1) / height)
+    arr = arr * shade[..., None] + rng.normal(0, 4, size=arr.shape)
+    img = PIL.Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    return img, corners
+
+
+def generate_corpus(sizes, per_size=5, seed=0):
+    """Generar lista de (nombre, imagen, esquinas) para varios tamaños"""
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for width, height in sizes:
+        for i in range(per_size):
+            img, corners = generate_screenshot(width, height, rng=rng)
+            corpus.append((f"synthetic_{width}x{height}_{i}", img, corners))
+    return corpus
+
+
+def generate_video_frames(width, height, n_frames, frames_per_move=30, seed=0):
+    """
+    Generar fotogramas de una partida sintética con tablero fijo
+
+    Cada frames_per_move fotogramas se mueve una pieza a otra casilla libre.
+    Devuelve un generador de (imagen PIL RGB, piezas) por fotograma.
+    """
+    rng = np.random.default_rng(seed)
+    theme = rng.choice(sorted(BOARD_THEMES))
+    board_size = int(min(width, height) * 0.8) // 8 * 8
+    x0 = (width - board_size) // 2
+    y0 = (height - board_size) // 2
+    pieces = random_pieces(rng)
+
+    frame = None
+    for i in range(n_frames):
+        if frame is None or (i > 0 and i % frames_per_move == 0):
+            if i > 0 and pieces:
+                # Mover una pieza a una casilla vacía
+                origin = list(pieces)[int(rng.integers(len(pieces)))]
+                empty = [(r, f) for r in range(8) for f in range(8)
+                         if (r, f) not in pieces]
+                target = empty[int(rng.integers(len(empty)))]
+                pieces[target] = pieces.pop(origin)
+            frame = PIL.Image.new('RGB', (width, height), (40, 40, 40))
+            draw_board(PIL.ImageDraw.Draw(frame), x0, y0, board_size, theme, pieces)
+        yield frame, dict(pieces)
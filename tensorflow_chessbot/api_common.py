@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Request parsing and result formatting shared by the Flask (api_server) and
+ASGI (asgi_server) servers, without importing either server or TensorFlow
+"""
+
+import os
+import math
+
+from helper_functions import shortenFEN
+
+DEFAULT_MODEL_PATH = os.path.join(
+    os.path.dirname(__file__), 
+    'saved_models/frozen_graph.pb'
+)
+
+# Legal positions returned as alternatives, default and limit of top_k
+DEFAULT_TOP_K = 3
+MAX_TOP_K = 10
+
+# Error message of each failed request, by the error type counted in metrics
+ERROR_MESSAGES = {
+    "no_file": "No file provided",
+    "no_color_model": "No color model loaded",
+    "too_large": "Image too large to process",
+    "no_board": "Could not find a chessboard in the image",
+    "busy": "Server busy, try again later",
+}
+
+def parse_top_k(value):
+    """top_k form value clamped to 1-MAX_TOP_K, DEFAULT_TOP_K if missing or invalid"""
+    try:
+        return max(1, min(MAX_TOP_K, int(value)))
+    except (TypeError, ValueError):
+        return DEFAULT_TOP_K
+
+def parse_flag(value):
+    """Whether a form value is set, ex. 1, true, yes or on"""
+    return (value or "").strip().lower() in ("1", "true", "yes", "on")
+
+def is_sideways(white_position):
+    """Whether ranks 1 and 8 are the left and right columns of the image"""
+    return white_position in ("left", "right")
+
+def orient_fen(fen, white_position="bottom"):
+    """Short FEN of a predicted FEN with white moved to the bottom"""
+    # Shorten FEN (convert 111 to 3, etc.)
+    short_fen = shortenFEN(fen)
+
+    # Handle white position rotation
+    if white_position == "top":
+        short_fen = flip_fen_vertical(short_fen)
+    elif white_position == "left":
+        short_fen = rotate_fen_90_cw(short_fen)
+    elif white_position == "right":
+        short_fen = rotate_fen_90_ccw(short_fen)
+    return short_fen
+
+def analysis_result(predictions, white_position="bottom"):
+    """
+    Build the /analyze success JSON from the (fen, tile certainties, log
+    probability) of the most probable legal positions, best first
+    """
+    fen, tile_certainties, log_probability = predictions[0]
+    short_fen = orient_fen(fen, white_position)
+
+    # Add standard FEN suffix
+    full_fen = f"{short_fen} w KQkq - 0 1"
+
+    # Calculate certainty and pieces detected
+    certainty = float(tile_certainties.min())
+    pieces_detected = count_pieces_in_fen(short_fen)
+
+    # Scores of each position, relative_probability is against the best one
+    alternatives = [{
+        "fen": f"{orient_fen(alt_fen, white_position)} w KQkq - 0 1",
+        "log_probability": round(alt_log_probability, 4),
+        "relative_probability": round(math.exp(alt_log_probability - log_probability), 6),
+        "certainty": round(float(alt_certainties.min()) * 100, 2),
+    } for alt_fen, alt_certainties, alt_log_probability in predictions]
+
+    return {
+        "success": True,
+        "fen": full_fen,
+        "pieces_detected": pieces_detected,
+        "certainty": round(certainty * 100, 2),
+        "alternatives": alternatives,
+        "message": f"Board analyzed successfully with {certainty*100:.1f}% certainty"
+    }
+
+def flip_fen_vertical(fen):
+    """Flip FEN vertically (mirror top to bottom)"""
+    ranks = fen.split('/')
+    return '/'.join(reversed(ranks))
+
+def rotate_fen_90_cw(fen):
+    """Rotate FEN 90 degrees clockwise"""
+    ranks = fen.split('/')
+    board = []
+    for rank in ranks:
+        board.append(expand_fen_rank(rank))
+
+    # Transpose and reverse for 90° CW rotation
+    rotated = []
+    for col in range(8):
+        new_rank = []
+        for row in range(7, -1, -1):
+            new_rank.append(board[row][col])
+        rotated.append(''.join(new_rank))
+
+    return '/'.join([compress_fen_rank(rank) for rank in rotated])
+
+def rotate_fen_90_ccw(fen):
+    """Rotate FEN 90 degrees counter-clockwise"""
+    ranks = fen.split('/')
+    board = []
+    for rank in ranks:
+        board.append(expand_fen_rank(rank))
+
+    # Transpose and reverse for 90° CCW rotation
+    rotated = []
+    for col in range(7, -1, -1):
+        new_rank = []
+        for row in range(8):
+            new_rank.append(board[row][col])
+        rotated.append(''.join(new_rank))
+
+    return '/'.join([compress_fen_rank(rank) for rank in rotated])
+
+def expand_fen_rank(rank):
+    """Expand compressed FEN rank (3 -> 111)"""
+    expanded = []
+    for char in rank:
+        if char.isdigit():
+            expanded.extend(['1'] * int(char))
+        else:
+            expanded.append(char)
+    return expanded
+
+def compress_fen_rank(rank):
+    """Compress FEN rank (111 -> 3)"""
+    compressed = []
+    empty_count = 0
+    for char in rank:
+        if char == '1':
+            empty_count += 1
+        else:
+            if empty_count > 0:
+                compressed.append(str(empty_count))
+                empty_count = 0
+            compressed.append(char)
+    if empty_count > 0:
+        compressed.append(str(empty_count))
+    return ''.join(compressed)
+
+def count_pieces_in_fen(fen):
+    """Count number of pieces in FEN string"""
+    pieces = 0
+    for char in fen:
+        if char.isalpha():
+            pieces += 1
+    return pieces
@@ -4,39 +4,96 @@ Flask server for TensorFlow Chessbot
 Provides an endpoint compatible with the chess-fen-frontend
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
+from werkzeug.serving import make_server
 import os
 import sys
-import numpy as np
-from PIL import Image
 import io
+import time
+import signal
+import socket
+import threading
+import json
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import tensorflow_chessbot
-from helper_functions import shortenFEN
 import chessboard_finder
 import helper_image_loading
+import pipeline_timing
+import metrics
+from predictor_pool import PredictorPool, PoolTimeout, getIntraOpThreads
+from position_decoder import getLegalPredictionsFromProbabilities
+from api_common import (DEFAULT_MODEL_PATH, ERROR_MESSAGES, parse_top_k, parse_flag,
+                        is_sideways, analysis_result)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Global predictor instance (loaded once at startup)
-predictor = None
+# Larger request bodies are rejected with a 413 before they are parsed
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
 
-def initialize_model():
-    """Initialize the TensorFlow model"""
-    global predictor
+# Global predictor pools (loaded once at startup), request threads check out
+# a predictor session for each inference. The color model is optional and
+# used by /analyze requests with color set
+predictor_pool = None
+color_predictor_pool = None
+
+# Seconds a request waits for a free predictor session before a 503
+POOL_TIMEOUT_SECONDS = 30
+
+def initialize_model(frozen_graph_path=DEFAULT_MODEL_PATH, color_model_path=None,
+                     pool_size=1, intra_op_threads=None):
+    """
+    Initialize a pool of pool_size TensorFlow model sessions, and of the
+    color tile model if given, each session using intra_op_threads threads
+    (default: the cores divided between the sessions)
+    """
+    global predictor_pool, color_predictor_pool
     print("Loading TensorFlow Chessbot model...")
-    frozen_graph_path = os.path.join(
-        os.path.dirname(__file__), 
-        'saved_models/frozen_graph.pb'
-    )
-    predictor = tensorflow_chessbot.ChessboardPredictor(frozen_graph_path)
+    start = time.perf_counter()
+    predictor_pool = PredictorPool(frozen_graph_path, pool_size, intra_op_threads,
+                                   name="grayscale")
+    if color_model_path:
+        color_predictor_pool = PredictorPool(color_model_path, pool_size,
+                                             intra_op_threads, name="color",
+                                             color=True)
+    metrics.MODEL_LOAD_SECONDS.set(time.perf_counter() - start)
     print("Model loaded successfully!")
 
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    metrics.IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUESTS.labels(endpoint=endpoint, status=response.status_code).inc()
+    metrics.REQUEST_LATENCY.labels(endpoint=endpoint).observe(
+        time.perf_counter() - g.request_start)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exception):
+    if 'request_start' in g:
+        metrics.IN_FLIGHT.dec()
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    """JSON error for request bodies over MAX_CONTENT_LENGTH"""
+    metrics.ERRORS.labels(type="upload_too_large").inc()
+    return jsonify({
+        "success": False,
+        "error": f"Upload too large, the limit is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+    }), 413
+
 @app.route("/")
 def root():
     """Health check endpoint"""
@@ -46,96 +103,116 @@ def root():
         "version": "1.0.0"
     })
 
+@app.route("/timings")
+def timings():
+    """Per-stage latency histograms aggregated since startup"""
+    return jsonify(pipeline_timing.TIMER.toDict())
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Request, error, latency and predictor metrics in Prometheus text format"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# /metrics and /timings alone, served by each pre-fork worker on its own port
+metrics_app = Flask("metrics")
+metrics_app.add_url_rule("/metrics", view_func=prometheus_metrics)
+metrics_app.add_url_rule("/timings", view_func=timings)
+
 @app.route("/analyze", methods=["POST"])
 def analyze_board():
     """
     Analyze a chess board image and return FEN notation
-    
+
     Form data:
         file: The uploaded image file
         white_position: Position of white pieces (bottom, top, left, right)
-    
+        top_k: Number of most probable legal positions in alternatives
+        color: If set, predict with the color tile model (--color-model)
+
+    Query parameters:
+        timings: If set, include per-stage latency (ms) of this request
+
     Returns:
-        JSON with success status, FEN string, and pieces detected
+        JSON with success status, FEN string, pieces detected and the
+        alternative positions with their scores
     """
+    with pipeline_timing.collect() as stage_ms:
+        response = _analyze_board()
+
+    if request.args.get('timings'):
+        body, status = (response if isinstance(response, tuple) else (response, 200))
+        payload = body.get_json()
+        payload['timings_ms'] = stage_ms
+        return jsonify(payload), status
+    return response
+
+def _analyze_board():
     try:
         # Check if file is present
         if 'file' not in request.files:
+            metrics.ERRORS.labels(type="no_file").inc()
             return jsonify({
                 "success": False,
-                "error": "No file provided"
+                "error": ERROR_MESSAGES["no_file"]
             }), 400
         
         file = request.files['file']
         white_position = request.form.get('white_position', 'bottom')
+        top_k = parse_top_k(request.form.get('top_k'))
+        color = parse_flag(request.form.get('color'))
         
-        # Read uploaded file
-        contents = file.read()
-        
-        # Convert to PIL Image
-        img = Image.open(io.BytesIO(contents))
-        
-        # Convert to RGB if necessary
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Convert to numpy array
-        img_array = np.array(img)
-        
-        # Resize if needed
-        img_array = helper_image_loading.resizeAsNeeded(img_array)
-        
-        if img_array is None:
+        if color and color_predictor_pool is None:
+            metrics.ERRORS.labels(type="no_color_model").inc()
             return jsonify({
                 "success": False,
-                "error": "Image too large to process"
+                "error": ERROR_MESSAGES["no_color_model"]
             }), 400
+        pool = color_predictor_pool if color else predictor_pool
+        
+        # Read uploaded file
+        contents = file.read()
         
-        # Find chessboard and extract tiles
-        tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img_array)
+        # Decode straight to grayscale (or RGB for the color model) at the
+        # working resolution, letting JPEGs downscale while decoding
+        img, scale = helper_image_loading.loadImageBytes(
+            contents, helper_image_loading.WORKING_SIZE,
+            helper_image_loading.MAX_IMAGE_SIZE, mode='RGB' if color else 'L')
         
-        if tiles is None:
+        if img is None:
+            metrics.ERRORS.labels(type="too_large").inc()
             return jsonify({
                 "success": False,
-                "error": "Could not find a chessboard in the image"
+                "error": ERROR_MESSAGES["too_large"]
             }), 400
         
-        # Make prediction
-        fen, tile_certainties = predictor.getPrediction(tiles)
+        # Find chessboard and extract tiles in the format of the model
+        if color:
+            tiles, corners = chessboard_finder.findColorTilesInImage(img)
+        else:
+            tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img)
         
-        if fen is None:
+        if tiles is None:
+            metrics.ERRORS.labels(type="no_board").inc()
             return jsonify({
                 "success": False,
-                "error": "Could not predict FEN from board"
+                "error": ERROR_MESSAGES["no_board"]
             }), 400
         
-        # Shorten FEN (convert 111 to 3, etc.)
-        short_fen = shortenFEN(fen)
-        
-        # Handle white position rotation
-        if white_position == "top":
-            short_fen = flip_fen_vertical(short_fen)
-        elif white_position == "left":
-            short_fen = rotate_fen_90_cw(short_fen)
-        elif white_position == "right":
-            short_fen = rotate_fen_90_ccw(short_fen)
-        
-        # Add standard FEN suffix
-        full_fen = f"{short_fen} w KQkq - 0 1"
+        # Make prediction, re-running uncertain tiles augmented
+        with pool.predictor(POOL_TIMEOUT_SECONDS) as predictor:
+            predictions = predictor.getTopPredictions(
+                tiles, img, corners, k=top_k, sideways=is_sideways(white_position))
         
-        # Calculate certainty and pieces detected
-        certainty = float(tile_certainties.min())
-        pieces_detected = count_pieces_in_fen(short_fen)
+        return jsonify(analysis_result(predictions, white_position))
         
+    except PoolTimeout:
+        metrics.ERRORS.labels(type="busy").inc()
         return jsonify({
-            "success": True,
-            "fen": full_fen,
-            "pieces_detected": pieces_detected,
-            "certainty": round(certainty * 100, 2),
-            "message": f"Board analyzed successfully with {certainty*100:.1f}% certainty"
-        })
-        
+            "success": False,
+            "error": ERROR_MESSAGES["busy"]
+        }), 503
     except Exception as e:
+        metrics.ERRORS.labels(type="internal").inc()
         print(f"Error processing image: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -144,83 +221,426 @@ def analyze_board():
             "error": f"Internal server error: {str(e)}"
         }), 500
 
-def flip_fen_vertical(fen):
-    """Flip FEN vertically (mirror top to bottom)"""
-    ranks = fen.split('/')
-    return '/'.join(reversed(ranks))
-
-def rotate_fen_90_cw(fen):
-    """Rotate FEN 90 degrees clockwise"""
-    ranks = fen.split('/')
-    board = []
-    for rank in ranks:
-        board.append(expand_fen_rank(rank))
-    
-    # Transpose and reverse for 90° CW rotation
-    rotated = []
-    for col in range(8):
-        new_rank = []
-        for row in range(7, -1, -1):
-            new_rank.append(board[row][col])
-        rotated.append(''.join(new_rank))
-    
-    return '/'.join([compress_fen_rank(rank) for rank in rotated])
-
-def rotate_fen_90_ccw(fen):
-    """Rotate FEN 90 degrees counter-clockwise"""
-    ranks = fen.split('/')
-    board = []
-    for rank in ranks:
-        board.append(expand_fen_rank(rank))
-    
-    # Transpose and reverse for 90° CCW rotation
-    rotated = []
-    for col in range(7, -1, -1):
-        new_rank = []
-        for row in range(8):
-            new_rank.append(board[row][col])
-        rotated.append(''.join(new_rank))
-    
-    return '/'.join([compress_fen_rank(rank) for rank in rotated])
-
-def expand_fen_rank(rank):
-    """Expand compressed FEN rank (3 -> 111)"""
-    expanded = []
-    for char in rank:
-        if char.isdigit():
-            expanded.extend(['1'] * int(char))
+# /analyze_batch limits
+MAX_BATCH_ITEMS = 500
+MAX_ARCHIVE_MEMBER_BYTES = 20 * 1024 * 1024
+MAX_BATCH_BYTES = 200 * 1024 * 1024  # All images of a batch, after unpacking
+# Unpacked tar data read through, skipped members included
+MAX_ARCHIVE_SCAN_BYTES = 2 * MAX_BATCH_BYTES
+BATCH_INFERENCE_BOARDS = 16  # Boards per session run while streaming
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+
+# Detection threads shared by batch requests, numpy and PIL release the GIL
+batch_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+def extract_batch_images(uploads):
+    """
+    Expand uploaded files into a list of (name, image bytes), unpacking zip
+    and tar archives. Raises ValueError if there are more than MAX_BATCH_ITEMS
+    images or they add up to more than MAX_BATCH_BYTES, both checked before
+    each archive member is decompressed, if the uploads add up to more than
+    MAX_UPLOAD_BYTES or if reading through tar archives would decompress more
+    than MAX_ARCHIVE_SCAN_BYTES
+    """
+    items = []
+    remaining_bytes = MAX_BATCH_BYTES
+    upload_bytes = 0
+    scanned_bytes = 0  # Unpacked bytes of the tar archives already read
+
+    def add_item(item_name, size, read):
+        """Append an image of declared size, read() only if within the limits"""
+        nonlocal remaining_bytes
+        if len(items) >= MAX_BATCH_ITEMS:
+            raise ValueError(f"Too many images, the limit is {MAX_BATCH_ITEMS}")
+        if size > MAX_ARCHIVE_MEMBER_BYTES:
+            items.append((item_name, None))
+            return
+        if size > remaining_bytes:
+            raise ValueError(f"Images too large, the limit is "
+                             f"{MAX_BATCH_BYTES // (1024 * 1024)} MB in total")
+        data = read()
+        remaining_bytes -= len(data)
+        items.append((item_name, data))
+
+    for upload in uploads:
+        data = upload.read()
+        name = upload.filename or "upload"
+        upload_bytes += len(data)
+        if upload_bytes > MAX_UPLOAD_BYTES:
+            raise ValueError(f"Uploads too large, the limit is "
+                             f"{MAX_UPLOAD_BYTES // (1024 * 1024)} MB in total")
+        buffer = io.BytesIO(data)
+        if zipfile.is_zipfile(buffer):
+            with zipfile.ZipFile(buffer) as archive:
+                for info in archive.infolist():
+                    if (info.is_dir() or info.filename.startswith("__MACOSX/") or
+                            not info.filename.lower().endswith(IMAGE_EXTENSIONS)):
+                        continue
+                    add_item(f"{name}/{info.filename}", info.file_size,
+                             lambda: read_zip_member(archive, info))
+        elif name.lower().endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")):
+            buffer.seek(0)  # is_zipfile leaves the buffer at its end
+            with tarfile.open(fileobj=buffer, mode="r:*") as archive:
+                for member in archive:
+                    # Reaching the next member decompresses this one, even if
+                    # skipped, so check the stream position after it first
+                    if scanned_bytes + member.offset_data + member.size > MAX_ARCHIVE_SCAN_BYTES:
+                        raise ValueError(f"Archives too large, the limit is "
+                                         f"{MAX_ARCHIVE_SCAN_BYTES // (1024 * 1024)} MB "
+                                         f"unpacked")
+                    if not member.isfile() or not member.name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    # Tar data is exactly member.size bytes of the stream
+                    add_item(f"{name}/{member.name}", member.size,
+                             lambda: archive.extractfile(member).read(member.size))
+                scanned_bytes += archive.offset
         else:
-            expanded.append(char)
-    return expanded
-
-def compress_fen_rank(rank):
-    """Compress FEN rank (111 -> 3)"""
-    compressed = []
-    empty_count = 0
-    for char in rank:
-        if char == '1':
-            empty_count += 1
+            add_item(name, len(data), lambda: data)
+    return items
+
+def read_zip_member(archive, info):
+    """
+    Decompress a zip member, reading at most one byte more than the size in
+    its header, which can lie. Raises ValueError if the data is larger
+    """
+    with archive.open(info) as member:
+        data = member.read(info.file_size + 1)
+    if len(data) > info.file_size:
+        raise ValueError(f"{info.filename} is larger than its zip header says")
+    return data
+
+def detect_batch_item(data):
+    """
+    Run detection for one batch item as /analyze does, returning (error type,
+    error message, None) on failure or (None, None, (tiles, img, corners))
+    with the decoded image and corners for refineUncertainTiles
+    """
+    if data is None:
+        return "too_large", ERROR_MESSAGES["too_large"], None
+    try:
+        img, scale = helper_image_loading.loadImageBytes(
+            data, helper_image_loading.WORKING_SIZE, helper_image_loading.MAX_IMAGE_SIZE)
+        if img is None:
+            return "too_large", ERROR_MESSAGES["too_large"], None
+        tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img)
+    except Exception as e:
+        return "internal", f"Could not process image: {str(e)}", None
+    if tiles is None:
+        return "no_board", ERROR_MESSAGES["no_board"], None
+    return None, None, (tiles, img, corners)
+
+def batch_line(index, name, result):
+    return json.dumps(dict(result, index=index, name=name)) + "\n"
+
+@app.route("/analyze_batch", methods=["POST"])
+def analyze_batch():
+    """
+    Analyze many chess board images in one request
+
+    Form data:
+        files: Image files and/or zip or tar archives of images
+        white_position: Position of white pieces for all images
+        top_k: Number of most probable legal positions in alternatives
+
+    Returns:
+        NDJSON stream with one line per image as it completes (in completion
+        order, with its index and name), each either the /analyze JSON or
+        {"success": false, "error": ...}, followed by a summary line
+    """
+    uploads = [f for key in request.files for f in request.files.getlist(key)]
+    if not uploads:
+        metrics.ERRORS.labels(type="no_file").inc()
+        return jsonify({
+            "success": False,
+            "error": ERROR_MESSAGES["no_file"]
+        }), 400
+    white_position = request.form.get('white_position', 'bottom')
+    top_k = parse_top_k(request.form.get('top_k'))
+
+    try:
+        items = extract_batch_images(uploads)
+    except (ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+        metrics.ERRORS.labels(type="bad_batch").inc()
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+    def infer(pending):
+        """
+        Batched inference for detected boards, uncertain tiles of all of them
+        re-run augmented in one more session run, returns (line, success) pairs
+        """
+        try:
+            with predictor_pool.predictor(POOL_TIMEOUT_SECONDS) as predictor:
+                probabilities = predictor.getBatchTileProbabilities(
+                    [tiles for index, name, (tiles, img, corners) in pending])
+                if predictor.tta_threshold and not predictor.color:
+                    probabilities = predictor.refineBatchUncertainTiles(
+                        probabilities,
+                        [img for index, name, (tiles, img, corners) in pending],
+                        [corners for index, name, (tiles, img, corners) in pending])
+        except PoolTimeout:
+            metrics.ERRORS.labels(type="busy").inc(len(pending))
+            return [(batch_line(index, name, {
+                "success": False,
+                "error": ERROR_MESSAGES["busy"]
+            }), False) for index, name, board in pending]
+        except Exception as e:
+            metrics.ERRORS.labels(type="internal").inc(len(pending))
+            return [(batch_line(index, name, {
+                "success": False,
+                "error": f"Internal server error: {str(e)}"
+            }), False) for index, name, board in pending]
+        lines = []
+        for (index, name, board), board_probabilities in zip(pending, probabilities):
+            with pipeline_timing.stage('fen_encoding'):
+                predictions = getLegalPredictionsFromProbabilities(
+                    board_probabilities, top_k, is_sideways(white_position))
+            lines.append((batch_line(index, name, analysis_result(
+                predictions, white_position)), True))
+        return lines
+
+    def generate():
+        succeeded = 0
+        pending = []  # (index, name, (tiles, img, corners)) waiting for inference
+        futures = dict((batch_executor.submit(detect_batch_item, data), (index, name))
+                       for index, (name, data) in enumerate(items))
+        for future in as_completed(futures):
+            index, name = futures[future]
+            error_type, error, board = future.result()
+            if error is not None:
+                metrics.ERRORS.labels(type=error_type).inc()
+                yield batch_line(index, name, {"success": False, "error": error})
+                continue
+            pending.append((index, name, board))
+            # Infer in chunks so results stream before the whole batch is detected
+            if len(pending) >= BATCH_INFERENCE_BOARDS:
+                for line, success in infer(pending):
+                    succeeded += success
+                    yield line
+                pending = []
+        if pending:
+            for line, success in infer(pending):
+                succeeded += success
+                yield line
+        
+        yield json.dumps({"summary": {
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded
+        }}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+# Restarts of crashed pre-fork workers: the delay doubles with each crash in
+# RESTART_WINDOW_SECONDS, MAX_RESTARTS crashes in the window stop the server
+RESTART_DELAY_SECONDS = 1
+MAX_RESTART_DELAY_SECONDS = 30
+MAX_RESTARTS = 5
+RESTART_WINDOW_SECONDS = 60
+
+def serve_worker(listen_socket, host, port, threads, model_options, ready_fd,
+                 worker=0, metrics_port=None):
+    """
+    Run one pre-forked worker: load the model in this process with the
+    initialize_model keyword arguments model_options, write its pid to
+    ready_fd once it can serve, and serve requests accepted from the shared
+    listening socket until SIGTERM. Its metrics are labelled with the worker
+    index and served on metrics_port + worker if given
+    """
+    # Until serving, terminate immediately instead of the parent's handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Parent handles Ctrl+C
+
+    metrics.REGISTRY.setConstLabels(worker=worker)
+    # TensorFlow sessions are not fork-safe, so each worker loads its own
+    initialize_model(**model_options)
+    server = make_server(host, port, app, threaded=threads > 1,
+                         fd=listen_socket.fileno())
+    if metrics_port:
+        metrics_server = make_server(host, metrics_port + worker, metrics_app,
+                                     threaded=True)
+        threading.Thread(target=metrics_server.serve_forever, daemon=True).start()
+
+    def shutdown(signum, frame):
+        # shutdown() waits for serve_forever to return, so call it off-thread;
+        # the request being handled finishes before the loop exits
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    os.write(ready_fd, os.getpid().to_bytes(4, "little"))
+    server.serve_forever()
+    predictor_pool.close()
+    if color_predictor_pool is not None:
+        color_predictor_pool.close()
+
+def spawn_worker(listen_socket, host, port, threads, model_options, ready_fd,
+                 worker=0, metrics_port=None):
+    """Fork a worker process, return its pid"""
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 0
+        try:
+            serve_worker(listen_socket, host, port, threads, model_options, ready_fd,
+                         worker, metrics_port)
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+    return pid
+
+def serve_prefork(host, port, workers, model_path=DEFAULT_MODEL_PATH, threads=1,
+                  graceful_timeout=30, color_model_path=None, pool_size=None,
+                  metrics_port=None):
+    """
+    Pre-fork server: bind once, fork workers that each load the model and
+    accept from the shared socket. Crashed workers are restarted with an
+    exponential backoff. A worker exiting before it is ready to serve (ex.
+    the model failed to load) or MAX_RESTARTS crashes within
+    RESTART_WINDOW_SECONDS stop the server. On SIGTERM or SIGINT workers
+    finish their in-flight request and exit, and are killed after
+    graceful_timeout seconds. Each worker has pool_size predictor sessions
+    (default one per request thread), the cores are divided between the
+    sessions of all workers. Returns the exit status, 1 if stopped on errors.
+
+    Metrics are counted per worker: /metrics and /timings on port answer for
+    whichever worker accepts the request, with a worker label (its index,
+    kept by its restarts). Scrape each worker on metrics_port + index instead.
+    """
+    pool_size = pool_size or threads
+    model_options = dict(frozen_graph_path=model_path,
+                         color_model_path=color_model_path, pool_size=pool_size,
+                         intra_op_threads=getIntraOpThreads(pool_size, workers))
+
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind((host, port))
+    listen_socket.listen(128)
+    listen_socket.set_inheritable(True)
+
+    # Workers write their pid to this pipe once the model is loaded
+    ready_read, ready_write = os.pipe()
+    os.set_blocking(ready_read, False)
+    ready = set()
+
+    def read_ready():
+        while True:
+            try:
+                data = os.read(ready_read, 4096)
+            except BlockingIOError:
+                return
+            for i in range(0, len(data), 4):
+                ready.add(int.from_bytes(data[i:i + 4], "little"))
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    def spawn(worker):
+        return spawn_worker(listen_socket, host, port, threads, model_options,
+                            ready_write, worker, metrics_port)
+
+    # Worker index of each child pid, restarts keep the index
+    children = dict((spawn(worker), worker) for worker in range(workers))
+    print(f"Started {workers} workers on http://{host}:{port} (pids {sorted(children)})")
+
+    exit_status = 0
+    crash_times = []
+    while not stopping.is_set():
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            stopping.wait(0.5)
+            continue
+        worker = children.pop(pid)
+        read_ready()  # A worker writes before it can exit
+        if stopping.is_set():
+            break
+        if pid not in ready:
+            print(f"Worker {pid} exited with status {status} before it was ready "
+                  f"to serve (see its error above, ex. loading {model_path}), "
+                  f"stopping the server")
+            exit_status = 1
+            break
+        ready.discard(pid)
+        now = time.monotonic()
+        crash_times = [t for t in crash_times if now - t < RESTART_WINDOW_SECONDS]
+        crash_times.append(now)
+        if len(crash_times) >= MAX_RESTARTS:
+            print(f"Worker {pid} exited with status {status}, {len(crash_times)} "
+                  f"crashes in {RESTART_WINDOW_SECONDS}s, stopping the server")
+            exit_status = 1
+            break
+        delay = min(MAX_RESTART_DELAY_SECONDS,
+                    RESTART_DELAY_SECONDS * 2 ** (len(crash_times) - 1))
+        print(f"Worker {pid} exited with status {status}, restarting in {delay}s")
+        if not stopping.wait(delay):
+            children[spawn(worker)] = worker
+
+    print("Shutting down workers...")
+    for pid in children:
+        os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + graceful_timeout
+    while children and time.monotonic() < deadline:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            time.sleep(0.1)
         else:
-            if empty_count > 0:
-                compressed.append(str(empty_count))
-                empty_count = 0
-            compressed.append(char)
-    if empty_count > 0:
-        compressed.append(str(empty_count))
-    return ''.join(compressed)
-
-def count_pieces_in_fen(fen):
-    """Count number of pieces in FEN string"""
-    pieces = 0
-    for char in fen:
-        if char.isalpha():
-            pieces += 1
-    return pieces
+            children.pop(pid, None)
+    for pid in children:
+        print(f"Worker {pid} did not stop in {graceful_timeout}s, killing")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    listen_socket.close()
+    os.close(ready_read)
+    os.close(ready_write)
+    return exit_status
+
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="TensorFlow Chessbot API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of pre-forked worker processes")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Request threads per worker")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="Predictor sessions per worker (default: one per "
+                             "request thread), sharing the cores")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH,
+                        help="Path to frozen graph (.pb)")
+    parser.add_argument("--color-model", default=None,
+                        help="Path to frozen graph of a color tile model, "
+                             "used by /analyze requests with color set")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve /metrics and /timings of worker i on this "
+                             "port + i, to scrape every worker")
+    parser.add_argument("--graceful-timeout", type=float, default=30,
+                        help="Seconds to wait for workers to finish on shutdown")
+    parser.add_argument("--dev", action="store_true",
+                        help="Use the single-process Flask development server")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    # Initialize model before starting server
-    initialize_model()
-    
-    # Run server on port 8002 (to avoid conflicts with other backends)
-    print("Starting Flask server on http://0.0.0.0:8003")
-    app.run(host="0.0.0.0", port=8002, debug=False)
+    args = parse_args()
+
+    if args.dev:
+        # Initialize model before starting server
+        # The development server handles each request in its own thread
+        initialize_model(args.model, args.color_model, args.pool_size or args.threads)
+        print(f"Starting Flask development server on http://{args.host}:{args.port}")
+        app.run(host=args.host, port=args.port, debug=False)
+    else:
+        sys.exit(serve_prefork(args.host, args.port, args.workers, args.model,
+                               args.threads, args.graceful_timeout, args.color_model,
+                               args.pool_size, args.metrics_port))
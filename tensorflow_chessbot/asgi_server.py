@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+ASGI (Starlette) server for TensorFlow Chessbot
+Same /analyze JSON contract as api_server.py, for use with the chess-fen-frontend
+
+Uploads are read asynchronously, decoding and chessboard detection run in a
+bounded process pool that hands tiles back through shared memory
+(tile_transport) and inference goes through a shared batching queue so
+concurrent requests share one session run. Uncertain tiles are refined with
+test-time augmentation like in api_server.py, on the image decoded again only
+when needed. When either queue is full the server answers 503 with a
+Retry-After header instead of queueing unbounded.
+
+    uvicorn asgi_server:app --host 0.0.0.0 --port 8002
+
+Configured with environment variables, see Settings.
+"""
+
+import os
+import sys
+import asyncio
+import functools
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tensorflow_chessbot
+from position_decoder import getLegalPredictionsFromProbabilities
+from api_common import (DEFAULT_MODEL_PATH, ERROR_MESSAGES, parse_top_k, parse_flag,
+                        is_sideways, analysis_result)
+import detection_worker
+import helper_image_loading
+from tile_transport import TileRing, SlotTimeout
+import pipeline_timing
+import metrics
+
+class Settings(object):
+    """Server settings read from CHESSBOT_* environment variables"""
+    def __init__(self, environ=os.environ):
+        self.model_path = environ.get("CHESSBOT_MODEL", DEFAULT_MODEL_PATH)
+        # Optional color tile model, used by requests with color set
+        self.color_model_path = environ.get("CHESSBOT_COLOR_MODEL")
+        self.detect_processes = int(environ.get("CHESSBOT_DETECT_PROCESSES",
+                                                os.cpu_count() or 1))
+        # Uploads waiting for or running detection before answering 503
+        self.max_pending_detections = int(environ.get(
+            "CHESSBOT_MAX_PENDING_DETECTIONS", 4 * self.detect_processes))
+        self.max_batch_boards = int(environ.get("CHESSBOT_MAX_BATCH_BOARDS", 8))
+        self.batch_wait_ms = float(environ.get("CHESSBOT_BATCH_WAIT_MS", 5))
+        self.max_inference_queue = int(environ.get("CHESSBOT_MAX_INFERENCE_QUEUE", 32))
+        # Detected tiles return through shared memory instead of being pickled
+        self.shared_tiles = environ.get("CHESSBOT_SHARED_TILES", "1") != "0"
+        self.retry_after_s = int(environ.get("CHESSBOT_RETRY_AFTER", 1))
+        # Seconds a worker waits for a free tile slot before answering 503
+        self.slot_timeout_s = float(environ.get("CHESSBOT_SLOT_TIMEOUT", 5))
+
+class Overloaded(Exception):
+    """Raised when a bounded queue is full"""
+
+class DetectionPool(object):
+    """
+    Bounded process pool running detection_worker.detectBoard. With
+    shared_tiles workers write grayscale tiles into a TileRing slot per
+    pending detection and only the slot index is sent back. Slots are read
+    and released as soon as a worker returns, also if the request awaiting
+    it was cancelled meanwhile. Color tiles are pickled
+    """
+    def __init__(self, processes, max_pending, shared_tiles=True, slot_timeout=5):
+        # Spawn rather than fork: the parent holds a TensorFlow session
+        context = multiprocessing.get_context("spawn")
+        self.ring = None
+        if shared_tiles:
+            self.ring = TileRing(max_pending, context)
+            self.executor = ProcessPoolExecutor(
+                processes, mp_context=context,
+                initializer=detection_worker.attachTileRing, initargs=(self.ring,))
+        else:
+            self.executor = ProcessPoolExecutor(processes, mp_context=context)
+        self.max_pending = max_pending
+        self.slot_timeout = slot_timeout
+        self.pending = 0
+
+    def readSlot(self, future):
+        """Done callback of a detectBoardToRing task: replace the slot in its
+        result with the tiles read from it and release the slot"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        error, slot, corners, stage_ms = future.result()
+        future.tiles = None
+        if slot is not None:
+            future.tiles = self.ring.read(slot)
+            self.ring.release(slot)
+
+    async def detect(self, data, color=False):
+        """Return (error, tiles, corners) of an image, corners on the image
+        decoded at the working size (for refineUncertainTiles)"""
+        if self.pending >= self.max_pending:
+            raise Overloaded()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if self.ring is None or color:
+                error, tiles, corners, stage_ms = await loop.run_in_executor(
+                    self.executor, functools.partial(
+                        detection_worker.detectBoard, data, color=color,
+                        original_corners=False))
+            else:
+                # The callback runs in the executor's thread whenever the
+                # result arrives, added before wrap_future it runs first
+                future = self.executor.submit(detection_worker.detectBoardToRing,
+                                              data, False, self.slot_timeout, False)
+                future.add_done_callback(self.readSlot)
+                try:
+                    error, slot, corners, stage_ms = await asyncio.wrap_future(future)
+                except SlotTimeout:
+                    raise Overloaded()
+                tiles = future.tiles
+        finally:
+            self.pending -= 1
+        detection_worker.recordStages(stage_ms)
+        return error, tiles, corners
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.ring is not None:
+            self.ring.close()
+
+class InferenceBatcher(object):
+    """
+    Shared inference queue: waits up to max_wait_ms to gather up to
+    max_batch boards and runs them through the predictor in one session run
+    """
+    def __init__(self, predictor, max_batch=8, max_wait_ms=5, max_queue=32):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # TensorFlow session runs off the event loop, one batch at a time
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        self.executor.shutdown(wait=True)
+
+    async def predict(self, tiles):
+        """Return 64x13 tile probabilities for one board"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((tiles, future))
+        except asyncio.QueueFull:
+            raise Overloaded()
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Skip boards whose request was cancelled while queued
+            batch = [(tiles, future) for tiles, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                probabilities = await loop.run_in_executor(
+                    self.executor, self.predictor.getBatchTileProbabilities,
+                    [tiles for tiles, future in batch])
+            except Exception as e:
+                for tiles, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (tiles, future), board_probabilities in zip(batch, probabilities):
+                if not future.done():
+                    future.set_result(board_probabilities)
+
+    async def refine(self, probabilities, data, corners):
+        """predictor.refineUncertainTiles on the image decoded again from data
+        as in detectBoard, as getTopPredictions does. The image is only
+        decoded if a tile is less certain than the predictor's tta_threshold"""
+        predictor = self.predictor
+        if (not predictor.tta_threshold or predictor.color or
+                probabilities.max(axis=1).min() >= predictor.tta_threshold):
+            return probabilities
+        loop = asyncio.get_running_loop()
+        img, _ = await loop.run_in_executor(
+            None, helper_image_loading.loadImageBytes, data,
+            helper_image_loading.WORKING_SIZE, helper_image_loading.MAX_IMAGE_SIZE)
+        return await loop.run_in_executor(
+            self.executor, predictor.refineUncertainTiles, probabilities, img, corners)
+
+def error_response(message, status_code, error_type, headers=None):
+    metrics.ERRORS.labels(type=error_type).inc()
+    return JSONResponse({"success": False, "error": message},
+                        status_code=status_code, headers=headers)
+
+async def root(request):
+    """Health check endpoint"""
+    return JSONResponse({
+        "status": "running",
+        "service": "TensorFlow Chessbot API",
+        "version": "1.0.0"
+    })
+
+async def timings(request):
+    """Per-stage latency histograms aggregated since startup"""
+    return JSONResponse(pipeline_timing.TIMER.toDict())
+
+async def prometheus_metrics(request):
+    """Request, error, latency and predictor metrics in Prometheus text format"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+async def analyze_board(request):
+    """
+    Analyze a chess board image and return FEN notation
+
+    Form data:
+        file: The uploaded image file
+        white_position: Position of white pieces (bottom, top, left, right)
+        top_k: Number of most probable legal positions in alternatives
+        color: If set, use the color tile model (CHESSBOT_COLOR_MODEL)
+
+    Returns:
+        JSON with success status, FEN string, pieces detected and the
+        alternative positions with their scores
+    """
+    state = request.app.state
+    try:
+        form = await request.form()
+        if "file" not in form:
+            return error_response(ERROR_MESSAGES["no_file"], 400, "no_file")
+        white_position = form.get("white_position", "bottom")
+        top_k = parse_top_k(form.get("top_k"))
+        color = parse_flag(form.get("color"))
+        if color and state.color_batcher is None:
+            return error_response(ERROR_MESSAGES["no_color_model"], 400,
+                                  "no_color_model")
+        batcher = state.color_batcher if color else state.batcher
+        contents = await form["file"].read()
+
+        error, tiles, corners = await state.detector.detect(contents, color)
+        if error is not None:
+            return error_response(ERROR_MESSAGES[error], 400, error)
+
+        # Re-run uncertain tiles augmented, as the Flask server does
+        probabilities = await batcher.predict(tiles)
+        probabilities = await batcher.refine(probabilities, contents, corners)
+        with pipeline_timing.stage("fen_encoding"):
+            predictions = getLegalPredictionsFromProbabilities(
+                probabilities, top_k, is_sideways(white_position))
+        return JSONResponse(analysis_result(predictions, white_position))
+
+    except Overloaded:
+        return error_response(ERROR_MESSAGES["busy"], 503, "overloaded",
+                              {"Retry-After": str(state.settings.retry_after_s)})
+    except Exception as e:
+        print(f"Error processing image: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return error_response(f"Internal server error: {str(e)}", 500, "internal")
+
+def instrumented(endpoint, handler):
+    """Wrap a handler with request count, latency and in-flight metrics"""
+    async def wrapper(request):
+        start = asyncio.get_running_loop().time()
+        metrics.IN_FLIGHT.inc()
+        try:
+            response = await handler(request)
+        finally:
+            metrics.IN_FLIGHT.dec()
+        metrics.REQUESTS.labels(endpoint=endpoint, status=response.status_code).inc()
+        metrics.REQUEST_LATENCY.labels(endpoint=endpoint).observe(
+            asyncio.get_running_loop().time() - start)
+        return response
+    return wrapper
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    settings = app.state.settings
+    # Detection workers are spawned, not forked, so they start without this
+    # process's TensorFlow state and the model loaded below
+    app.state.detector = DetectionPool(settings.detect_processes,
+                                       settings.max_pending_detections,
+                                       settings.shared_tiles,
+                                       settings.slot_timeout_s)
+    if app.state.predictor is None:
+        print("Loading TensorFlow Chessbot model...")
+        start = asyncio.get_running_loop().time()
+        app.state.predictor = tensorflow_chessbot.ChessboardPredictor(settings.model_path)
+        metrics.MODEL_LOAD_SECONDS.set(asyncio.get_running_loop().time() - start)
+        print("Model loaded successfully!")
+    if app.state.color_predictor is None and settings.color_model_path:
+        app.state.color_predictor = tensorflow_chessbot.ChessboardPredictor(
+            settings.color_model_path, color=True)
+    batchers = []
+    for predictor in (app.state.predictor, app.state.color_predictor):
+        batcher = None
+        if predictor is not None:
+            batcher = InferenceBatcher(predictor, settings.max_batch_boards,
+                                       settings.batch_wait_ms,
+                                       settings.max_inference_queue)
+            batcher.start()
+        batchers.append(batcher)
+    app.state.batcher, app.state.color_batcher = batchers
+    try:
+        yield
+    finally:
+        for batcher in batchers:
+            if batcher is not None:
+                await batcher.stop()
+        app.state.detector.shutdown()
+        app.state.predictor.close()
+        if app.state.color_predictor is not None:
+            app.state.color_predictor.close()
+
+def create_app(settings=None, predictor=None, color_predictor=None):
+    """Create the Starlette app, predictors are loaded at startup if not given"""
+    app = Starlette(
+        routes=[
+            Route("/", instrumented("/", root)),
+            Route("/timings", instrumented("/timings", timings)),
+            Route("/metrics", instrumented("/metrics", prometheus_metrics)),
+            Route("/analyze", instrumented("/analyze", analyze_board),
+                  methods=["POST"]),
+        ],
+        middleware=[Middleware(CORSMiddleware, allow_origins=["*"],
+                               allow_methods=["*"], allow_headers=["*"])],
+        lifespan=lifespan,
+    )
+    app.state.settings = settings or Settings()
+    app.state.predictor = predictor
+    app.state.color_predictor = color_predictor
+    return app
+
+app = create_app()
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+    parser = argparse.ArgumentParser(description="TensorFlow Chessbot ASGI server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8002)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Concurrency helpers for the reddit chessbot (chessbot.py).
+#
+# The submission stream is the producer, it hands candidate submissions to a
+# SubmissionWorkers pool whose threads download the image, find the chessboard
+# and run the predictor concurrently. Finished responses go to a ReplyQueue, a
+# single thread posting replies no faster than reddit allows, so waiting
+# between replies never blocks the stream or inference.
+#
+# This module deliberately avoids importing praw or tensorflow, anything with
+# a reply(text) method works as a submission.
+from __future__ import print_function
+import re
+import threading
+import time
+from datetime import datetime
+try:
+  # Python 3
+  import queue
+except ImportError:
+  # Python 2
+  import Queue as queue
+
+from cfb_helpers import logMessage
+
+# Queue item telling a thread to exit
+STOP = object()
+
+def getRatelimitDelay(exception):
+  """Seconds reddit asks to wait for a RATELIMIT API error, None otherwise.
+
+  Handles praw's RedditAPIException (items with error_type) and the older
+  APIException (error_type attribute), ex. "you are doing that too much.
+  try again in 9 minutes.\""""
+  items = getattr(exception, 'items', None) or [exception]
+  for item in items:
+    if getattr(item, 'error_type', None) != 'RATELIMIT':
+      continue
+    message = str(getattr(item, 'message', '') or item)
+    match = re.search(r'(\d+) (minute|second)', message)
+    if match is None:
+      return 60 # Unknown delay, wait a minute
+    delay = int(match.group(1))
+    if match.group(2) == 'minute':
+      # Rounded down by reddit, wait until the next full minute
+      delay = (delay + 1) * 60
+    return delay
+  return None
+
+class ReplyQueue(object):
+  """Posts replies from a single thread, at most one every min_interval
+  seconds, waiting out reddit RATELIMIT errors before retrying"""
+  def __init__(self, min_interval=10, dry=False, max_size=100, max_retries=3,
+               sleep=time.sleep, index=None):
+    # min_interval: seconds between replies, the previous bot slept this long
+    #   after every reply in the stream loop
+    # dry: log replies without posting them
+    # max_size: workers block on put() when this many replies are waiting
+    # index: cfb_helpers.ReplyIndex recording posted replies
+    self.min_interval = min_interval
+    self.dry = dry
+    self.max_retries = max_retries
+    self.sleep = sleep
+    self.index = index
+    self.queue = queue.Queue(max_size)
+    self.stats = {'replied': 0, 'failed': 0, 'ratelimited': 0}
+    self.last_reply = None
+    self.thread = None
+
+  def start(self):
+    self.thread = threading.Thread(target=self.run, name='reply-queue')
+    self.thread.daemon = True
+    self.thread.start()
+
+  def stop(self):
+    """Post replies still queued, then stop the thread"""
+    self.queue.put(STOP)
+    self.thread.join()
+
+  def put(self, submission, response):
+    self.queue.put((submission, response))
+
+  def run(self):
+    while True:
+      item = self.queue.get()
+      if item is STOP:
+        return
+      submission, response = item
+      self.waitForInterval()
+      try:
+        self.reply(submission, response)
+      except Exception as e:
+        self.stats['failed'] += 1
+        print("> %s - Couldn't reply to %s: %s" % (datetime.now(), submission.id, e))
+      self.last_reply = time.time()
+
+  def waitForInterval(self):
+    if self.last_reply is not None:
+      remaining = self.last_reply + self.min_interval - time.time()
+      if remaining > 0:
+        self.sleep(remaining)
+
+  def reply(self, submission, response):
+    if self.dry:
+      logMessage(submission, "[DRY-RUN-REPLIED]")
+      self.stats['replied'] += 1
+      return
+    for attempt in range(self.max_retries + 1):
+      try:
+        submission.reply(response)
+        break
+      except Exception as e:
+        delay = getRatelimitDelay(e)
+        if delay is None or attempt == self.max_retries:
+          raise
+        self.stats['ratelimited'] += 1
+        print("> %s - Rate limited, retrying %s in %d seconds" % (
+          datetime.now(), submission.id, delay))
+        self.sleep(delay)
+    if self.index is not None:
+      self.index.add(submission.id, 'replied')
+    logMessage(submission, "[REPLIED]")
+    self.stats['replied'] += 1
+
+class SubmissionWorkers(object):
+  """Pool of threads calling process(submission) on queued submissions.
+
+  The predictor session and image downloads release the GIL so threads
+  overlap network, detection and inference of different submissions"""
+  def __init__(self, process, workers=4, max_pending=32):
+    # process: function(submission), exceptions are logged and skipped
+    # max_pending: submit() blocks while this many submissions are waiting,
+    #   keeping the stream from running ahead of the workers
+    self.process = process
+    self.queue = queue.Queue(max_pending)
+    self.threads = [threading.Thread(target=self.run, name='submission-worker-%d' % i)
+                    for i in range(workers)]
+    self.lock = threading.Lock()
+    self.stats = {'processed': 0, 'errors': 0}
+
+  def start(self):
+    for thread in self.threads:
+      thread.daemon = True
+      thread.start()
+
+  def stop(self):
+    """Finish queued submissions, then stop the threads"""
+    for _ in self.threads:
+      self.queue.put(STOP)
+    for thread in self.threads:
+      thread.join()
+
+  def submit(self, submission):
+    self.queue.put(submission)
+
+  def run(self):
+    while True:
+      submission = self.queue.get()
+      if submission is STOP:
+        return
+      try:
+        self.process(submission)
+        with self.lock:
+          self.stats['processed'] += 1
+      except Exception as e:
+        with self.lock:
+          self.stats['errors'] += 1
+        print("> %s - Error processing %s, skipping: %s" % (
+          datetime.now(), submission.id, e))
@@ -1,13 +1,66 @@
+import sqlite3
+import threading
 import time
 from datetime import datetime
 
 # Check if submission has a comment by this bot already
-def previouslyRepliedTo(submission, me):
+def previouslyRepliedTo(submission, me, index=None):
+  """Look submission up in the ReplyIndex if given, only scanning the
+  comment tree (a network fetch per submission) while the index is cold"""
+  if index is not None:
+    if index.contains(submission.id):
+      return True
+    if index.warm:
+      return False
   for comment in submission.comments:
     if comment.author == me:
+      if index is not None:
+        index.add(submission.id, 'replied')
       return True
   return False
 
+class ReplyIndex(object):
+  """Persistent SQLite index of submission ids the bot already processed,
+  with status 'replied' or 'no-fen', shared by the worker threads"""
+  def __init__(self, path='replied_submissions.db'):
+    self.lock = threading.Lock()
+    self.db = sqlite3.connect(path, check_same_thread=False)
+    self.db.execute('CREATE TABLE IF NOT EXISTS submissions ('
+                    'id TEXT PRIMARY KEY, status TEXT, time REAL)')
+    self.db.commit()
+    # True once backfilled from the bot's comment history, misses can then
+    # be trusted without scanning the submission comments
+    self.warm = False
+
+  def contains(self, submission_id):
+    with self.lock:
+      return self.db.execute('SELECT 1 FROM submissions WHERE id = ?',
+                             (submission_id,)).fetchone() is not None
+
+  def add(self, submission_id, status):
+    with self.lock:
+      self.db.execute('INSERT OR REPLACE INTO submissions VALUES (?, ?, ?)',
+                      (submission_id, status, time.time()))
+      self.db.commit()
+
+  def backfill(self, me, limit=None):
+    """Record submissions of the bot's own comments, read newest first in one
+    paged pass (reddit listings go back at most 1000 comments)"""
+    rows = []
+    for comment in me.comments.new(limit=limit):
+      # link_id is the 't3_' prefixed id of the commented submission
+      rows.append((comment.link_id.split('_', 1)[-1], 'replied', comment.created_utc))
+    with self.lock:
+      # Keep statuses already recorded, ex. 'no-fen' is never overwritten
+      self.db.executemany('INSERT OR IGNORE INTO submissions VALUES (?, ?, ?)', rows)
+      self.db.commit()
+    self.warm = True
+    return len(rows)
+
+  def close(self):
+    with self.lock:
+      self.db.close()
+
 
 def waitWithComments(sleep_time, segment=60):
   """Sleep for sleep_time seconds, printing to stdout every segment of time"""
@@ -10,6 +10,7 @@
 
 # optional arguments:
 #   -h, --help  show this help message and exit
+#   --coarse    Detect on a downscaled image and refine lines at full resolution
 
 
 # sudo apt-get install libatlas-base-dev for numpy error, see https://github.com/Kitt-AI/snowboy/issues/262
@@ -19,25 +20,87 @@ import PIL.Image
 import argparse
 from time import time
 from helper_image_loading import *
+import pipeline_timing
 
+# Test-time augmentations of the board crop for re-running uncertain tiles,
+# (dx, dy, scale) with shifts in pixels of the 256x256 board image (32px per
+# tile) and the crop size scaled about the board center
+TTA_AUGMENTATIONS = (
+  (0.5, 0.0, 1.0), (-0.5, 0.0, 1.0), (0.0, 0.5, 1.0), (0.0, -0.5, 1.0),
+  (0.0, 0.0, 0.98), (0.0, 0.0, 1.02))
 
 def nonmax_suppress_1d(arr, winsize=5):
   """Return 1d array with only peaks, use neighborhood window of winsize px"""
-  _arr = arr.copy()
-
-  for i in range(_arr.size):
-    if i == 0:
-      left_neighborhood = 0
-    else:
-      left_neighborhood = arr[max(0,i-winsize):i]
-    if i >= _arr.size-2:
-      right_neighborhood = 0
-    else:
-      right_neighborhood = arr[i+1:min(arr.size-1,i+winsize)]
-
-    if arr[i] < np.max(left_neighborhood) or arr[i] <= np.max(right_neighborhood):
-      _arr[i] = 0
-  return _arr
+  # Peaks are at least the winsize-1 values before them (0 for the first)
+  # and greater than the winsize-2 after them, ignoring the last value
+  # (0 for the last two), using sliding window maxima
+  size = arr.size
+  padded = np.full(size + 2 * winsize, -np.inf)
+  padded[winsize:winsize + size] = arr
+  left_neighborhood = np.lib.stride_tricks.sliding_window_view(
+    padded[:size + winsize - 1], winsize)[:size].max(axis=1)
+  left_neighborhood[0] = 0
+  padded[winsize + size - 1] = -np.inf
+  right_neighborhood = np.lib.stride_tricks.sliding_window_view(
+    padded[winsize + 1:], winsize - 1)[:size].max(axis=1)
+  right_neighborhood[max(0, size - 2):] = 0
+  return np.where((arr >= left_neighborhood) & (arr > right_neighborhood), arr, 0)
+
+def getGradientProjections(img_arr_gray, chunk_px=1<<18):
+  """Return 1-D sums of the positive and negative components of
+  np.gradient(img_arr_gray), as (gx_pos, gx_neg, gy_pos, gy_neg) where the gx
+  sums are along axis 1 (one per row) and the gy sums along axis 0.
+
+  Gradients are computed in chunks of rows of about chunk_px pixels, so no
+  full-size gradient arrays are built. Integer images (ex. uint8) are
+  differenced in integer arithmetic without a float32 upcast."""
+  height, width = img_arr_gray.shape
+  if np.issubdtype(img_arr_gray.dtype, np.integer):
+    work = np.int16 if img_arr_gray.dtype.itemsize == 1 else np.int64
+    acc = np.int64
+  else:
+    work = img_arr_gray.dtype
+    acc = np.float64
+
+  # Sums of twice the gradient, central differences are halved at the end
+  gx_pos = np.zeros(height, dtype=acc)
+  gx_sum = np.zeros(height, dtype=acc)
+  gy_pos = np.zeros(width, dtype=acc)
+  gy_sum = np.zeros(width, dtype=acc)
+
+  chunk_rows = max(1, chunk_px // width)
+  buf = np.empty([min(chunk_rows, height), width], dtype=work)
+  for r0 in range(0, height, chunk_rows):
+    r1 = min(r0 + chunk_rows, height)
+    d = buf[:r1-r0]
+
+    # Gradient along axis 0, one-sided differences on the first and last row
+    i0, i1 = max(r0, 1), min(r1, height-1)
+    if i1 > i0:
+      np.subtract(img_arr_gray[i0+1:i1+1], img_arr_gray[i0-1:i1-1],
+        out=d[i0-r0:i1-r0], dtype=work)
+    if r0 == 0:
+      np.subtract(img_arr_gray[1], img_arr_gray[0], out=d[0], dtype=work)
+      d[0] *= 2
+    if r1 == height:
+      np.subtract(img_arr_gray[-1], img_arr_gray[-2], out=d[-1], dtype=work)
+      d[-1] *= 2
+    gx_pos[r0:r1] = np.add.reduce(d, axis=1, dtype=acc, where=d>0)
+    gx_sum[r0:r1] = d.sum(axis=1, dtype=acc)
+
+    # Gradient along axis 1, same buffer
+    rows = img_arr_gray[r0:r1]
+    np.subtract(rows[:,2:], rows[:,:-2], out=d[:,1:-1], dtype=work)
+    np.subtract(rows[:,1], rows[:,0], out=d[:,0], dtype=work)
+    d[:,0] *= 2
+    np.subtract(rows[:,-1], rows[:,-2], out=d[:,-1], dtype=work)
+    d[:,-1] *= 2
+    gy_pos += np.add.reduce(d, axis=0, dtype=acc, where=d>0)
+    gy_sum += d.sum(axis=0, dtype=acc)
+
+  # Negative component is positive component minus signed sum
+  return (gx_pos / 2.0, (gx_pos - gx_sum) / 2.0,
+          gy_pos / 2.0, (gy_pos - gy_sum) / 2.0)
 
 def findChessboardCorners(img_arr_gray, noise_threshold = 8000):
   # Load image grayscale as an numpy array
@@ -47,29 +110,215 @@ def findChessboardCorners(img_arr_gray, noise_threshold = 8000):
   # versus the number of pixels, manually measured  bad trigger images
   # at < 5,000 and good  chessboards values at > 10,000
 
-  # Get gradients, split into positive and inverted negative components 
-  gx, gy = np.gradient(img_arr_gray)
-  gx_pos = gx.copy()
-  gx_pos[gx_pos<0] = 0
-  gx_neg = -gx.copy()
-  gx_neg[gx_neg<0] = 0
+  with pipeline_timing.stage('gradient_hough'):
+    # Get gradients, split into positive and inverted negative components,
+    # summed along each axis
+    projections = getGradientProjections(img_arr_gray)
 
-  gy_pos = gy.copy()
-  gy_pos[gy_pos<0] = 0
-  gy_neg = -gy.copy()
-  gy_neg[gy_neg<0] = 0
+  return findChessboardCornersFromProjections(img_arr_gray, projections,
+                                              noise_threshold=noise_threshold)
+
+def findChessboardCornersFromProjections(img_arr_gray, projections,
+                                         offset=(0, 0), noise_threshold=8000):
+  """Find chessboard corners from the (gx_pos, gx_neg, gy_pos, gy_neg)
+  gradient projections of a region of img_arr_gray whose top-left corner is
+  at offset (x, y). Return corners in image coordinates or None"""
+  gx_pos, gx_neg, gy_pos, gy_neg = projections
 
   # 1-D ampltitude of hough transform of gradients about X & Y axes
-  num_px = img_arr_gray.shape[0] * img_arr_gray.shape[1]
-  hough_gx = gx_pos.sum(axis=1) * gx_neg.sum(axis=1)
-  hough_gy = gy_pos.sum(axis=0) * gy_neg.sum(axis=0)
+  hough_gx = gx_pos * gx_neg
+  hough_gy = gy_pos * gy_neg
 
   # Check that gradient peak signal is strong enough by
   # comparing normalized standard deviation to threshold
   if min(hough_gx.std() / hough_gx.size,
          hough_gy.std() / hough_gy.size) < noise_threshold:
     return None
-  
+
+  with pipeline_timing.stage('sequence_search'):
+    best_seqs = getBestLineSequences(hough_gx, hough_gy)
+  if best_seqs is None:
+    return None
+
+  # Line positions in image coordinates, hough_gx is per row
+  best_seq_x, best_seq_y = best_seqs
+  with pipeline_timing.stage('subseq_scoring'):
+    return getBestSubSequenceCorners(img_arr_gray,
+      best_seq_x + offset[1], best_seq_y + offset[0])
+
+def getGradientIntegrals(img_arr_gray, step=4, min_edge=24):
+  """Cumulative sums of the gradient components of the whole image, so the
+  gradient projections and activity of any region are found without
+  recomputing gradients (see getRegionProjections).
+
+  Returns (row_integrals, col_integrals, step). row_integrals stacks the
+  positive and negative axis 0 gradient and the edge activity, summed in
+  blocks of step columns and accumulated along them (3 x H x W/step+1),
+  col_integrals stacks the axis 1 components and the activity likewise per
+  column (3 x H/step+1 x W). Like getGradientProjections values are twice
+  the central differences. Activity is the sum of absolute gradients of at
+  least min_edge, so scan or compression noise doesn't fill the gaps
+  between boards"""
+  img = img_arr_gray.astype(np.int16)
+  height, width = img.shape
+
+  # Central differences along each axis, one-sided (doubled) at the borders
+  g0 = np.empty_like(img)
+  g0[1:-1] = img[2:] - img[:-2]
+  g0[0] = 2 * (img[1] - img[0])
+  g0[-1] = 2 * (img[-1] - img[-2])
+  g1 = np.empty_like(img)
+  g1[:,1:-1] = img[:,2:] - img[:,:-2]
+  g1[:,0] = 2 * (img[:,1] - img[:,0])
+  g1[:,-1] = 2 * (img[:,-1] - img[:,-2])
+
+  def accumulate(gradient, abs_gradient, activity, axis):
+    # Sum blocks of step pixels along axis, split the gradient sums into
+    # positive and negative parts (|g| + g and |g| - g are both even), then
+    # cumulative sum with a leading zero so [i1] - [i0] sums blocks i0 to i1
+    components = np.stack([gradient, abs_gradient, activity])
+    pad = (-components.shape[axis + 1]) % step
+    if pad:
+      pad_width = [(0, 0), (0, 0), (0, 0)]
+      pad_width[axis + 1] = (0, pad)
+      components = np.pad(components, pad_width)
+    # Strided adds, much faster than a reduction over a short last axis.
+    # Block sums of step <= 16 gradients (at most 1020) fit in int16
+    blocks = components[:, :, 0::step] if axis == 1 else components[:, 0::step]
+    blocks = blocks.copy()
+    for offset in range(1, step):
+      blocks += components[:, :, offset::step] if axis == 1 else components[:, offset::step]
+    blocks = blocks.astype(np.int32)
+    total, absolute = blocks[0], blocks[1]
+    blocks[0], blocks[1] = (absolute + total) // 2, (absolute - total) // 2
+    shape = list(blocks.shape)
+    shape[axis + 1] += 1
+    integrals = np.zeros(shape, dtype=np.int32)
+    np.cumsum(blocks, axis=axis + 1,
+              out=integrals[:, :, 1:] if axis == 1 else integrals[:, 1:])
+    return integrals
+
+  abs_g0, abs_g1 = np.abs(g0), np.abs(g1)
+  activity = abs_g0 + abs_g1
+  activity[activity < min_edge] = 0
+
+  row_integrals = accumulate(g0, abs_g0, activity, axis=1)
+  col_integrals = accumulate(g1, abs_g1, activity, axis=0)
+  return row_integrals, col_integrals, step
+
+def getRegionProjections(integrals, region):
+  """Return (gx_pos, gx_neg, gy_pos, gy_neg) gradient projections as in
+  getGradientProjections, plus row and column edge activity, of region
+  [x0, y0, x1, y1] using getGradientIntegrals.
+  Region edges along the summed axis are rounded to the integral step"""
+  row_integrals, col_integrals, step = integrals
+  x0, y0, x1, y1 = region
+  c0, c1 = int(round(x0 / float(step))), int(round(x1 / float(step)))
+  r0, r1 = int(round(y0 / float(step))), int(round(y1 / float(step)))
+  rows = (row_integrals[:, y0:y1, c1] - row_integrals[:, y0:y1, c0]) / 2.0
+  cols = (col_integrals[:, r1, x0:x1] - col_integrals[:, r0, x0:x1]) / 2.0
+  return (rows[0], rows[1], cols[0], cols[1]), (rows[2], cols[2])
+
+def getActivityGaps(activity, min_gap_px, max_activity=50):
+  """Return (start, end) runs of at least min_gap_px of the 1-D gradient
+  activity of at most max_activity (a couple of stray edge pixels), touching
+  neither end. Every row or column crossing a board crosses its 9 tile edges"""
+  quiet = activity <= max_activity
+  edges = np.flatnonzero(np.diff(quiet.astype(np.int8))) + 1
+  bounds = np.concatenate([[0], edges, [quiet.size]])
+  return [(start, end) for start, end in zip(bounds[:-1], bounds[1:])
+          if quiet[start] and start > 0 and end < quiet.size and end - start >= min_gap_px]
+
+def splitRegionAtGaps(integrals, region, min_gap_px):
+  """Split region into the blocks between quiet gaps of gradient activity
+  along the axis with the most gaps (one XY-cut step). Returns [region] if
+  there are none"""
+  x0, y0, x1, y1 = region
+  _, (row_activity, col_activity) = getRegionProjections(integrals, region)
+  row_gaps = getActivityGaps(row_activity, min_gap_px)
+  col_gaps = getActivityGaps(col_activity, min_gap_px)
+  if not row_gaps and not col_gaps:
+    return [region]
+
+  # Cut in the middle of each gap
+  if len(row_gaps) >= len(col_gaps):
+    cuts = [y0] + [y0 + (start + end) // 2 for start, end in row_gaps] + [y1]
+    return [[x0, a, x1, b] for a, b in zip(cuts[:-1], cuts[1:])]
+  cuts = [x0] + [x0 + (start + end) // 2 for start, end in col_gaps] + [x1]
+  return [[a, y0, b, y1] for a, b in zip(cuts[:-1], cuts[1:])]
+
+def getSurroundingRegions(region, corners, margin_px):
+  """Parts of region above, below, left and right of the board at corners
+  (grown by margin_px). They overlap at the corners so a board beside the
+  found one isn't cut in two"""
+  x0, y0, x1, y1 = region
+  bx0, by0, bx1, by1 = (int(corners[0]) - margin_px, int(corners[1]) - margin_px,
+                        int(corners[2]) + margin_px, int(corners[3]) + margin_px)
+  return [[x0, y0, x1, max(y0, by0)], [x0, min(y1, by1), x1, y1],
+          [x0, y0, max(x0, bx0), y1], [min(x1, bx1), y0, x1, y1]]
+
+def getOverlap(a, b):
+  """Intersection over the smaller area of two [x0, y0, x1, y1] boxes"""
+  w = min(a[2], b[2]) - max(a[0], b[0])
+  h = min(a[3], b[3]) - max(a[1], b[1])
+  if w <= 0 or h <= 0:
+    return 0.0
+  smaller = min((a[2]-a[0]) * (a[3]-a[1]), (b[2]-b[0]) * (b[3]-b[1]))
+  return w * h / float(smaller)
+
+def findAllChessboardCorners(img_arr_gray, min_board_px=48, min_score=0.4,
+                             max_boards=32, noise_threshold=2000):
+  """Find every chessboard in the image, ex. the diagrams of a book page.
+  Return list of corners in reading order (top to bottom, left to right).
+
+  Gradients are computed once for the whole image. Regions are split at
+  quiet gaps of gradient activity (recursive XY-cut), the single board
+  search runs on each block from its projections, and the rest of a block
+  around a found board is searched again for boards not separated by gaps.
+  Boards must correlate with an ideal chessboard by at least min_score
+  (getCheckerboardScore)"""
+  with pipeline_timing.stage('gradient_integrals'):
+    integrals = getGradientIntegrals(img_arr_gray)
+  height, width = img_arr_gray.shape
+  min_gap_px = max(6, min_board_px // 8)
+
+  boards = []
+  regions = [[0, 0, width, height]]
+  with pipeline_timing.stage('region_search'):
+    while regions and len(boards) < max_boards:
+      region = regions.pop()
+      if min(region[2] - region[0], region[3] - region[1]) < min_board_px:
+        continue
+      blocks = splitRegionAtGaps(integrals, region, min_gap_px)
+      if len(blocks) > 1:
+        regions.extend(blocks)
+        continue
+
+      projections, _ = getRegionProjections(integrals, region)
+      corners = findChessboardCornersFromProjections(img_arr_gray, projections,
+        offset=region[:2], noise_threshold=noise_threshold)
+      if corners is None or min(corners[2] - corners[0], corners[3] - corners[1]) < min_board_px:
+        continue
+      if getCheckerboardScore(img_arr_gray, corners) < min_score:
+        continue
+      if any(getOverlap(corners, board) > 0.5 for board in boards):
+        continue
+      boards.append(corners)
+      regions.extend(getSurroundingRegions(region, corners, min_gap_px))
+
+  # Reading order, rows of boards whose tops are within half a board
+  boards.sort(key=lambda c: (c[1], c[0]))
+  rows = []
+  for board in boards:
+    if rows and board[1] - rows[-1][0][1] < (board[3] - board[1]) / 2:
+      rows[-1].append(board)
+    else:
+      rows.append([board])
+  return [board for row in rows for board in sorted(row, key=lambda c: c[0])]
+
+def getBestLineSequences(hough_gx, hough_gy):
+  """Return strongest evenly spaced sequences of 7-9 potential chessboard
+  lines about each axis as (best_seq_x, best_seq_y), or None"""
   # Normalize and skeletonize to just local peaks
   hough_gx = nonmax_suppress_1d(hough_gx) / hough_gx.max()
   hough_gy = nonmax_suppress_1d(hough_gy) / hough_gy.max()
@@ -147,6 +396,11 @@ def findChessboardCorners(img_arr_gray, noise_threshold = 8000):
   best_seq_x = seqs_x[scores_x.argmax()]
   best_seq_y = seqs_y[scores_y.argmax()]
   # print(best_seq_x, best_seq_y)
+  return best_seq_x, best_seq_y
+
+def getBestSubSequenceCorners(img_arr_gray, best_seq_x, best_seq_y):
+  """Return corners of the 7 line sub-sequences of best_seq_x and best_seq_y
+  that correlate best with an ideal chessboard"""
 
   # Now if we have sequences greater than length 7, (up to 9),
   # that means we have up to 9 possible combinations of sets of 7 sequences
@@ -171,12 +425,7 @@ def findChessboardCorners(img_arr_gray, noise_threshold = 8000):
   gray_img_crop = PIL.Image.fromarray(img_arr_gray).crop(corners)
 
   # Build a kernel image of an idea chessboard to correlate against
-  k = 8 # Arbitrarily chose 8x8 pixel tiles for correlation image
-  quad = np.ones([k,k])
-  kernel = np.vstack([np.hstack([quad,-quad]), np.hstack([-quad,quad])])
-  kernel = np.tile(kernel,(4,4)) # Becomes an 8x8 alternating grid (chessboard)
-  kernel = kernel/np.linalg.norm(kernel) # normalize
-  # 8*8 = 64x64 pixel ideal chessboard
+  kernel = getChessboardKernel()
 
   k = 0
   n = max(len(sub_seqs_x), len(sub_seqs_y))
@@ -207,6 +456,143 @@ def findChessboardCorners(img_arr_gray, noise_threshold = 8000):
 
   return final_corners
 
+def getChessboardKernel():
+  """Return 64x64 px normalized ideal chessboard for correlation"""
+  k = 8 # Arbitrarily chose 8x8 pixel tiles for correlation image
+  quad = np.ones([k,k])
+  kernel = np.vstack([np.hstack([quad,-quad]), np.hstack([-quad,quad])])
+  kernel = np.tile(kernel,(4,4)) # Becomes an 8x8 alternating grid (chessboard)
+  return kernel/np.linalg.norm(kernel) # normalize
+
+def getCheckerboardScore(img_arr_gray, corners):
+  """Return correlation of image region within corners against an ideal
+  chessboard, normalized for brightness and contrast to the range 0-1.
+  Cheap enough to validate previously found corners on a new frame"""
+  sub_img = np.asarray(PIL.Image.fromarray(img_arr_gray).crop(
+    tuple(int(c) for c in corners)).resize((64,64)), dtype=np.float32)
+  sub_img = sub_img - sub_img.mean()
+  norm = np.linalg.norm(sub_img)
+  if norm == 0:
+    return 0.0
+  # Use absolute since it's possible board is rotated 90 deg
+  return float(np.abs(np.sum(getChessboardKernel() * sub_img)) / norm)
+
+def downscaleImage(img_arr_gray, factor):
+  """Return image downscaled by an integer factor using block averaging"""
+  h = (img_arr_gray.shape[0] // factor) * factor
+  w = (img_arr_gray.shape[1] // factor) * factor
+  blocks = img_arr_gray[:h, :w].reshape(h // factor, factor, w // factor, factor)
+  return blocks.mean(axis=(1,3), dtype=np.float32)
+
+def refineLineInBand(img_arr_gray, line, span, band_px, axis):
+  """Return position of strongest gradient line within +/- band_px of line.
+  axis=1 looks for vertical lines (x positions), using rows span[0]:span[1]
+  axis=0 looks for horizontal lines (y positions), using cols span[0]:span[1]"""
+  size = img_arr_gray.shape[axis]
+  lo = max(0, line - band_px - 1)
+  hi = min(size, line + band_px + 2)
+  if hi - lo < 3:
+    return line
+
+  # Same hough response as findChessboardCorners, on a narrow band only
+  if axis == 1:
+    band = img_arr_gray[span[0]:span[1], lo:hi]
+    if band.shape[0] < 2:
+      return line
+    _, _, g_pos, g_neg = getGradientProjections(band)
+  else:
+    band = img_arr_gray[lo:hi, span[0]:span[1]]
+    if band.shape[1] < 2:
+      return line
+    g_pos, g_neg, _, _ = getGradientProjections(band)
+  hough = g_pos * g_neg
+
+  # Ignore the outermost columns of the band, their gradient is one-sided
+  hough[[0,-1]] = 0
+  return lo + int(hough.argmax())
+
+def findChessboardCornersCoarseToFine(img_arr_gray, max_coarse_size=500,
+                                      band_px=None, noise_threshold=8000):
+  """Find chessboard corners on a downscaled image, then refine the inner
+  chessboard lines in narrow bands at full resolution.
+
+  Images already smaller than max_coarse_size fall through to
+  findChessboardCorners. Returns corners in full resolution coordinates,
+  or None on failure"""
+  factor = int(np.ceil(max(img_arr_gray.shape) / float(max_coarse_size)))
+  if factor <= 1:
+    return findChessboardCorners(img_arr_gray, noise_threshold)
+
+  # Normalized hough std scales linearly with image size, scale threshold too
+  with pipeline_timing.stage('downscale'):
+    coarse_img = downscaleImage(img_arr_gray, factor)
+  coarse_corners = findChessboardCorners(coarse_img, noise_threshold / factor)
+  if coarse_corners is None:
+    return None
+
+  # Coarse line positions are only known to within a coarse pixel
+  if band_px is None:
+    band_px = 2 * factor
+
+  x0, y0, x1, y1 = coarse_corners * factor
+  height, width = img_arr_gray.shape
+  rows = (max(0, y0), min(height, y1))
+  cols = (max(0, x0), min(width, x1))
+
+  # Refine the 7 inner lines of the board along each axis
+  steps = np.arange(1, 8) / 8.0
+  with pipeline_timing.stage('line_refinement'):
+    lines_x = [refineLineInBand(img_arr_gray, int(round(x0 + s*(x1-x0))), rows,
+                                band_px, axis=1) for s in steps]
+    lines_y = [refineLineInBand(img_arr_gray, int(round(y0 + s*(y1-y0))), cols,
+                                band_px, axis=0) for s in steps]
+
+  # Same outer tile buffer as findChessboardCorners
+  dx = np.median(np.diff(lines_x))
+  dy = np.median(np.diff(lines_y))
+  return np.array([
+    int(lines_x[0]-dx), int(lines_y[0]-dy),
+    int(lines_x[-1]+dx), int(lines_y[-1]+dy)], dtype=int)
+
+def getPeriodicityScore(hough, min_lag=3, smooth_px=9):
+  """Return normalized autocorrelation of a 1-D hough projection at the most
+  periodic line spacing between min_lag and 1/8th of its length.
+
+  The slowly varying part (wider than smooth_px) is removed first, so what
+  remains of a chessboard are the peaks of its evenly spaced lines, which
+  correlate with themselves shifted by one and two tile widths"""
+  n = hough.size
+  max_lag = n // 8
+  if max_lag < min_lag:
+    return 0.0
+  peaks = hough - np.convolve(hough, np.ones(smooth_px) / smooth_px, mode='same')
+  # Zero padded FFT gives the linear (not circular) autocorrelation
+  spectrum = np.fft.rfft(peaks, 2*n)
+  autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+  if autocorr[0] <= 0:
+    return 0.0
+  lags = np.arange(min_lag, max_lag + 1)
+  return float(np.minimum(autocorr[lags], autocorr[2*lags]).max() / autocorr[0])
+
+def getPrefilterScore(img_arr_gray, max_size=256):
+  """Periodicity score of the weaker axis of the image, box-downscaled to at
+  most max_size px wide. Chessboards score about 0.2-0.7, images without
+  evenly spaced lines along both axes below 0.1"""
+  factor = int(np.ceil(max(img_arr_gray.shape) / float(max_size)))
+  if factor > 1:
+    img = PIL.Image.fromarray(np.asarray(img_arr_gray, dtype=np.uint8))
+    img_arr_gray = np.asarray(img.reduce(factor))
+  gx_pos, gx_neg, gy_pos, gy_neg = getGradientProjections(img_arr_gray)
+  return min(getPeriodicityScore(gx_pos * gx_neg),
+             getPeriodicityScore(gy_pos * gy_neg))
+
+def isPlausibleChessboard(img_arr_gray, max_size=256, min_score=0.15):
+  """Cheap pre-filter for findChessboardCorners, False if the image can't
+  contain a chessboard. Takes about 2ms compared with the full resolution
+  gradients, hough and sequence search of the full finder"""
+  with pipeline_timing.stage('prefilter'):
+    return getPrefilterScore(img_arr_gray, max_size) >= min_score
+
 def getAllSequences(seq, min_seq_len=7, err_px=5):
   """Given sequence of increasing numbers, get all sequences with common
   spacing (within err_px) that contain at least min_seq_len values"""
@@ -246,48 +632,46 @@ def getAllSequences(seq, min_seq_len=7, err_px=5):
         seqs.append(s)
   return seqs
 
-def getChessTilesColor(img, corners):
-  # img is a color RGB image
+def getChessBoardColor(img, corners):
+  # img is a color RGB uint8 image array
   # corners = (x0, y0, x1, y1) for top-left corner to bot-right corner of board
-  height, width, depth = img.shape
-  if depth !=3:
+  # Return 256x256x3 uint8 RGB image of the board, 32x32px tiles
+  return np.asarray(PIL.Image.fromarray(getPaddedCrop(img, corners)) \
+    .resize([256,256], PIL.Image.BILINEAR), dtype=np.uint8)
+
+def getColorTiles(board_img, out=None):
+  """Given 256x256x3 uint8 RGB image of a chessboard return a 64x32x32x3
+  float32 tile array normalized 0-1, tile A1 first then A2 etc. Written into
+  out if given, ex. a slot of a Nx64x32x32x3 batch from allocateColorTileBatch"""
+  if out is None:
+    out = np.empty([64, 32, 32, 3], dtype=np.float32)
+  # Blocks of (rank row, y, file, x, channel), A1 is bottom left of image so
+  # reverse the rank rows, then tile-major order, all as one strided view
+  tiles = board_img.reshape([8, 32, 8, 32, 3])[::-1].transpose(0, 2, 1, 3, 4)
+  np.multiply(tiles.reshape([64, 32, 32, 3]), 1 / 255.0, out=out, casting='unsafe')
+  return out
+
+def getChessTilesColor(img, corners, out=None):
+  """Return 64x32x32x3 RGB tile array (see getColorTiles) of the board at
+  corners in RGB uint8 image array img, or None if img isn't RGB"""
+  if img.ndim != 3 or img.shape[2] != 3:
     print("Need RGB color image input")
     return None
+  return getColorTiles(getChessBoardColor(img, corners), out)
 
-  # corners could be outside image bounds, pad image as needed
-  padl_x = max(0, -corners[0])
-  padl_y = max(0, -corners[1])
-  padr_x = max(0, corners[2] - width)
-  padr_y = max(0, corners[3] - height)
-
-  img_padded = np.pad(img, ((padl_y,padr_y),(padl_x,padr_x), (0,0)), mode='edge')
+def allocateColorTileBatch(n):
+  """Empty Nx64x32x32x3 float32 buffer for the color tiles of n boards"""
+  return np.empty([n, 64, 32, 32, 3], dtype=np.float32)
 
-  chessboard_img = img_padded[
-    (padl_y + corners[1]):(padl_y + corners[3]), 
-    (padl_x + corners[0]):(padl_x + corners[2]), :]
+def getGrayTilesFromColor(tiles):
+  """32x32x64 grayscale tile array (as getTiles) of 64x32x32x3 color tiles,
+  using the ITU-R 601-2 luma transform like PIL's 'L' conversion"""
+  return np.moveaxis(tiles @ np.float32([0.299, 0.587, 0.114]), 0, 2)
 
-  # 256x256 px RGB image, 32x32px individual RGB tiles, normalized 0-1 floats
-  chessboard_img_resized = np.asarray( \
-        PIL.Image.fromarray(chessboard_img) \
-        .resize([256,256], PIL.Image.BILINEAR), dtype=np.float32) / 255.0
-
-  # stack deep 64 tiles with 3 channesl RGB each
-  # so, first 3 slabs are RGB for tile A1, then next 3 slabs for tile A2 etc.
-  tiles = np.zeros([32,32,3*64], dtype=np.float32) # color
-  # Assume A1 is bottom left of image, need to reverse rank since images start
-  # with origin in top left
-  for rank in range(8): # rows (numbers)
-    for file in range(8): # columns (letters)
-      # color
-      tiles[:,:,3*(rank*8+file):3*(rank*8+file+1)] = \
-        chessboard_img_resized[(7-rank)*32:((7-rank)+1)*32,file*32:(file+1)*32]
-
-  return tiles
-
-def getChessBoardGray(img, corners):
-  # img is a grayscale image
-  # corners = (x0, y0, x1, y1) for top-left corner to bot-right corner of board
-  height, width = img.shape
+def getPaddedCrop(img, corners):
+  # img is a grayscale or color image
+  # corners = (x0, y0, x1, y1) integer crop, edge padded where outside image
+  height, width = img.shape[:2]
 
   # corners could be outside image bounds, pad image as needed
   padl_x = max(0, -corners[0])
@@ -295,60 +679,152 @@ def getChessBoardGray(img, corners):
   padr_x = max(0, corners[2] - width)
   padr_y = max(0, corners[3] - height)
 
-  img_padded = np.pad(img, ((padl_y,padr_y),(padl_x,padr_x)), mode='edge')
+  img_padded = np.pad(img, ((padl_y,padr_y),(padl_x,padr_x)) + ((0,0),) * (img.ndim - 2),
+                      mode='edge')
 
-  chessboard_img = img_padded[
+  return img_padded[
     (padl_y + corners[1]):(padl_y + corners[3]), 
     (padl_x + corners[0]):(padl_x + corners[2])]
 
+def getChessBoardGrayPixels(img, corners):
+  # img is a grayscale image
+  # corners = (x0, y0, x1, y1) for top-left corner to bot-right corner of board
+  # Return 256x256 px uint8 image, 32x32px individual tiles
+  chessboard_img = getPaddedCrop(img, corners)
+  return np.asarray(PIL.Image.fromarray(chessboard_img) \
+    .resize([256,256], PIL.Image.BILINEAR), dtype=np.uint8)
+
+def getChessBoardGray(img, corners):
   # 256x256 px image, 32x32px individual tiles
   # Normalized
-  chessboard_img_resized = np.asarray( \
-        PIL.Image.fromarray(chessboard_img) \
-        .resize([256,256], PIL.Image.BILINEAR), dtype=np.uint8) / 255.0
-  return chessboard_img_resized
-
-def getChessTilesGray(img, corners):
+  return getChessBoardGrayPixels(img, corners) / 255.0
+
+def getChessTilesGray(img, corners, out=None):
+  """32x32x64 tiles of the board at corners, written into out if given, a
+  uint8 out (ex. a tile_transport slot) gets the 0-255 pixels instead of
+  values normalized 0-1"""
+  if out is not None and out.dtype == np.uint8:
+    return getTiles(getChessBoardGrayPixels(img, corners), out)
   chessboard_img_resized = getChessBoardGray(img, corners)
-  return getTiles(chessboard_img_resized)
-
-
-def getTiles(processed_gray_img):
+  return getTiles(chessboard_img_resized, out)
+
+def getAugmentedChessBoardGray(img, corners, dx=0.0, dy=0.0, scale=1.0):
+  """ Like getChessBoardGray with the crop shifted by (dx, dy) pixels of the
+  256x256 output, so fractions are sub-pixel shifts, and scaled about the
+  board center """
+  x0, y0, x1, y1 = [float(c) for c in corners]
+  half_w = (x1 - x0) * scale / 2.0
+  half_h = (y1 - y0) * scale / 2.0
+  cx = (x0 + x1) / 2.0 + dx * (x1 - x0) / 256.0
+  cy = (y0 + y1) / 2.0 + dy * (y1 - y0) / 256.0
+  box = [cx - half_w, cy - half_h, cx + half_w, cy + half_h]
+
+  # Crop whole pixels around the float box, resize samples the box inside it
+  crop = [int(np.floor(box[0])), int(np.floor(box[1])),
+          int(np.ceil(box[2])), int(np.ceil(box[3]))]
+  chessboard_img = getPaddedCrop(img, crop)
+  box = (box[0] - crop[0], box[1] - crop[1], box[2] - crop[0], box[3] - crop[1])
+  return np.asarray(PIL.Image.fromarray(chessboard_img) \
+    .resize([256,256], PIL.Image.BILINEAR, box=box), dtype=np.uint8) / 255.0
+
+def getAugmentedChessTilesGray(img, corners, augmentations=TTA_AUGMENTATIONS):
+  """ List of 32x32x64 tile arrays, one per (dx, dy, scale) augmentation """
+  return [getTiles(getAugmentedChessBoardGray(img, corners, dx, dy, scale))
+          for dx, dy, scale in augmentations]
+
+
+def getTiles(processed_gray_img, out=None):
   # Given 256x256 px normalized grayscale image of a chessboard (32x32px per tile)
   # NOTE (values must be in range 0-1)
-  # Return a 32x32x64 tile array
+  # Return a 32x32x64 tile array, float32 or written into out if given
   # 
   # stack deep 64 tiles
   # so, first slab is tile A1, then A2 etc.
-  tiles = np.zeros([32,32,64], dtype=np.float32) # grayscale
   # Assume A1 is bottom left of image, need to reverse rank since images start
-  # with origin in top left
-  for rank in range(8): # rows (numbers)
-    for file in range(8): # columns (letters)
-      tiles[:,:,(rank*8+file)] = \
-        processed_gray_img[(7-rank)*32:((7-rank)+1)*32,file*32:(file+1)*32]
-
-  return tiles
-
-def findGrayscaleTilesInImage(img):
-  """ Find chessboard and convert into input tiles for CNN """
+  # with origin in top left. Blocks of (rank row, y, file, x) moved to
+  # (y, x, rank, file) in one copy
+  if out is None:
+    out = np.empty([32, 32, 64], dtype=np.float32)
+  out.reshape([32, 32, 8, 8])[...] = \
+    processed_gray_img.reshape([8, 32, 8, 32])[::-1].transpose(1, 3, 0, 2)
+  return out
+
+def findGrayscaleTilesInImage(img, coarse_to_fine=False, prefilter=False, out=None):
+  """ Find chessboard and convert into input tiles for CNN.
+  With prefilter images failing isPlausibleChessboard are skipped early.
+  Tiles are written into out if given (see getChessTilesGray) """
   if img is None:
     return None, None
 
-  # Convert to grayscale numpy array 
-  img_arr = np.asarray(img.convert("L"), dtype=np.float32)
+  # Convert to grayscale numpy array, kept as uint8 to avoid a float copy
+  with pipeline_timing.stage('grayscale'):
+    if img.mode != 'L':
+      img = img.convert("L")
+    img_arr = np.asarray(img, dtype=np.uint8)
+
+  # Skip images without a periodic line structure
+  if prefilter and not isPlausibleChessboard(img_arr):
+    return None, None
   
   # Use computer vision to find orthorectified chessboard corners in image
-  corners = findChessboardCorners(img_arr)
+  if coarse_to_fine:
+    corners = findChessboardCornersCoarseToFine(img_arr)
+  else:
+    corners = findChessboardCorners(img_arr)
   if corners is None:
     return None, None
 
   # Pull grayscale tiles out given image and chessboard corners
-  tiles = getChessTilesGray(img_arr, corners)
+  with pipeline_timing.stage('tile_extraction'):
+    tiles = getChessTilesGray(img_arr, corners, out)
 
   # Return both the tiles as well as chessboard corner locations in the image
   return tiles, corners
 
+def findColorTilesInImage(img, coarse_to_fine=False, prefilter=False, out=None):
+  """ Find chessboard on the grayscale image and pull color input tiles for
+  a color CNN out of the RGB image, returns (64x32x32x3 tiles, corners), the
+  tiles written into out if given (see getChessTilesColor).
+  With prefilter images failing isPlausibleChessboard are skipped early """
+  if img is None:
+    return None, None
+
+  with pipeline_timing.stage('grayscale'):
+    if img.mode != 'RGB':
+      img = img.convert('RGB')
+    img_rgb = np.asarray(img, dtype=np.uint8)
+    img_arr = np.asarray(img.convert('L'), dtype=np.uint8)
+
+  if prefilter and not isPlausibleChessboard(img_arr):
+    return None, None
+
+  if coarse_to_fine:
+    corners = findChessboardCornersCoarseToFine(img_arr)
+  else:
+    corners = findChessboardCorners(img_arr)
+  if corners is None:
+    return None, None
+
+  with pipeline_timing.stage('tile_extraction'):
+    tiles = getChessTilesColor(img_rgb, corners, out)
+
+  return tiles, corners
+
+def findAllGrayscaleTilesInImage(img, min_board_px=48):
+  """Find every chessboard in image (see findAllChessboardCorners), return
+  list of (tiles, corners) in reading order"""
+  if img is None:
+    return []
+
+  with pipeline_timing.stage('grayscale'):
+    if img.mode != 'L':
+      img = img.convert("L")
+    img_arr = np.asarray(img, dtype=np.uint8)
+
+  boards = findAllChessboardCorners(img_arr, min_board_px=min_board_px)
+  with pipeline_timing.stage('tile_extraction'):
+    return [(getChessTilesGray(img_arr, corners), corners) for corners in boards]
+
 # DEBUG
 # from matplotlib import pyplot as plt
 # def plotTiles(tiles):
@@ -372,7 +848,7 @@ def findGrayscaleTilesInImage(img):
 #       plt.title('%s %d' % (files[file], rank+1), fontsize=6)
 #   plt.show()
 
-def main(url):
+def main(url, coarse_to_fine=False):
   print("Loading url %s..." % url)
   color_img, url = loadImageFromURL(url)
   
@@ -386,7 +862,10 @@ def main(url):
   print("Processing...")
   a = time()
   img_arr = np.asarray(color_img.convert("L"), dtype=np.float32)
-  corners = findChessboardCorners(img_arr)
+  if coarse_to_fine:
+    corners = findChessboardCornersCoarseToFine(img_arr)
+  else:
+    corners = findChessboardCorners(img_arr)
   print("Took %.4fs" % (time()-a))
   # corners = [x0, y0, x1, y1] where (x0,y0) 
   # is top left and (x1,y1) is bot right
@@ -411,6 +890,8 @@ if __name__ == '__main__':
   parser = argparse.ArgumentParser(description='Find orthorectified chessboard corners in image')
   parser.add_argument('urls', default=['https://i.redd.it/1uw3h772r0fy.png'],
     metavar='urls', type=str,  nargs='*', help='Input image urls')
+  parser.add_argument('--coarse', default=False, action='store_true',
+    help='Detect on a downscaled image and refine lines at full resolution')
   # main('http://www.chessanytime.com/img/jeudirect/simplechess.png')
   # main('https://i.imgur.com/JpzfV3y.jpg')
   # main('https://i.imgur.com/jsCKzU9.jpg')
@@ -422,5 +903,5 @@ if __name__ == '__main__':
   # main('https://i.imgur.com/KLcCiuk.jpg')
   args = parser.parse_args()
   for url in args.urls:
-    main(url)
+    main(url, args.coarse)
 
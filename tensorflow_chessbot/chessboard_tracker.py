@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ChessboardTracker, reuses chessboard detection and predictions across
+# consecutive frames of a video or screen capture where the board rarely moves.
+#
+# Corners found on a previous frame are validated on the new frame with a cheap
+# checkerboard correlation score, full detection only runs when that fails.
+# Tiles whose pixels didn't change since the previous frame keep their previous
+# predictions, so only changed tiles (ex. the two squares of a move) are sent
+# to the neural network.
+import numpy as np
+
+import chessboard_finder
+import pipeline_timing
+from helper_functions import getPredictionFromProbabilities
+
+class ChessboardTracker(object):
+  """Stateful chessboard finder and predictor for consecutive frames"""
+  def __init__(self, predictor=None, min_score_ratio=0.9,
+               tile_change_threshold=4/255.0, coarse_to_fine=False):
+    # predictor: ChessboardPredictor, only needed for update()
+    # min_score_ratio: cached corners are kept while the checkerboard score on
+    #   the new frame is at least this fraction of the score when detected
+    # tile_change_threshold: max absolute pixel difference (0-1 range) below
+    #   which a tile is considered unchanged
+    self.predictor = predictor
+    self.min_score_ratio = min_score_ratio
+    self.tile_change_threshold = tile_change_threshold
+    self.coarse_to_fine = coarse_to_fine
+    self.stats = {'frames': 0, 'detections': 0, 'reused_corners': 0,
+                  'tiles_inferred': 0, 'tiles_skipped': 0}
+    self.reset()
+
+  def reset(self):
+    """Forget cached corners, tiles and predictions"""
+    self.corners = None
+    self.reference_score = None
+    self.tiles = None
+    self.probabilities = None
+
+  def validateCorners(self, img_arr):
+    """Return True if cached corners still match a chessboard in image"""
+    if self.corners is None:
+      return False
+    # A zero score when detected (ex. flat region) would accept every frame
+    if self.reference_score is None or self.reference_score <= 0:
+      return False
+    score = chessboard_finder.getCheckerboardScore(img_arr, self.corners)
+    return score >= self.min_score_ratio * self.reference_score
+
+  def findTiles(self, img):
+    """Stateful equivalent of chessboard_finder.findGrayscaleTilesInImage"""
+    if img is None:
+      return None, None
+    self.stats['frames'] += 1
+    with pipeline_timing.stage('grayscale'):
+      img_arr = np.asarray(img.convert("L"), dtype=np.uint8)
+
+    with pipeline_timing.stage('corner_validation'):
+      valid = self.validateCorners(img_arr)
+    if valid:
+      self.stats['reused_corners'] += 1
+    else:
+      # Fall back to full detection
+      self.stats['detections'] += 1
+      if self.coarse_to_fine:
+        corners = chessboard_finder.findChessboardCornersCoarseToFine(img_arr)
+      else:
+        corners = chessboard_finder.findChessboardCorners(img_arr)
+      if corners is None:
+        self.reset()
+        return None, None
+      if self.corners is None or np.any(corners != self.corners):
+        # Board moved, previous tiles can't be compared against
+        self.tiles = None
+        self.probabilities = None
+      self.corners = corners
+      self.reference_score = chessboard_finder.getCheckerboardScore(
+        img_arr, corners)
+
+    with pipeline_timing.stage('tile_extraction'):
+      tiles = chessboard_finder.getChessTilesGray(img_arr, self.corners)
+    return tiles, self.corners
+
+  def getChangedTiles(self, tiles):
+    """Return indices (A1-H8 order) of tiles that differ from previous frame"""
+    if self.tiles is None:
+      return np.arange(64)
+    diff = np.abs(tiles - self.tiles).reshape([32*32, 64]).max(axis=0)
+    return np.where(diff > self.tile_change_threshold)[0]
+
+  def update(self, img):
+    """Find chessboard in frame and predict it, re-running the network only
+    on tiles that changed. Returns fen, tile_certainties and corners, or Nones
+    if no chessboard was found"""
+    tiles, corners = self.findTiles(img)
+    if tiles is None:
+      return None, None, None
+
+    changed = self.getChangedTiles(tiles)
+    if self.probabilities is None or changed.size == 64:
+      self.probabilities = self.predictor.getTileProbabilities(tiles)
+    elif changed.size > 0:
+      self.probabilities[changed] = self.predictor.getTileProbabilities(
+        tiles, changed)
+    self.stats['tiles_inferred'] += changed.size
+    self.stats['tiles_skipped'] += 64 - changed.size
+
+    # Keep tiles that were inferred as the reference for the next frame, so
+    # slow drifts still eventually trigger inference
+    if self.tiles is None:
+      self.tiles = tiles
+    else:
+      self.tiles[..., changed] = tiles[..., changed]
+
+    with pipeline_timing.stage('fen_encoding'):
+      fen, tile_certainties = getPredictionFromProbabilities(self.probabilities)
+    return fen, tile_certainties, corners
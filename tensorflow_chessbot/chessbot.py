@@ -9,6 +9,7 @@ import praw
 import requests
 import socket
 import time
+from collections import deque
 from datetime import datetime
 import argparse
 
@@ -16,12 +17,20 @@ import tensorflow_chessbot # For neural network model
 from helper_functions_chessbot import *
 from helper_functions import shortenFEN
 from cfb_helpers import * # logging, comment waiting and self-reply helpers
+from bot_workers import ReplyQueue, SubmissionWorkers
+from predictor_pool import PredictorPool
+
+# Submission ids remembered to skip streams restarting with old submissions,
+# older ones are caught by the reply index or the comment scan
+SEEN_SUBMISSIONS = 10000
 
 def generateResponseMessage(submission, predictor):
   print("\n---\nImage URL: %s" % submission.url)
   
-  # Use CNN to make a prediction
-  fen, certainty, visualize_link = predictor.makePrediction(submission.url)
+  # Use CNN to make a prediction, most stream images aren't chessboards so
+  # pre-filter them before full chessboard detection
+  fen, certainty, visualize_link = predictor.makePrediction(submission.url,
+                                                            prefilter=True)
 
   if fen is None:
     print("> %s - Couldn't generate FEN, skipping..." % datetime.now())
@@ -40,46 +49,55 @@ def generateResponseMessage(submission, predictor):
   return msg
 
 
-def processSubmission(submission, cfb, predictor, args, reply_wait_time=10):
-  # Check if submission passes requirements and wasn't already replied to
-  if isPotentialChessboardTopic(submission):
-    if not previouslyRepliedTo(submission, cfb):
-      # Generate response
-      response = generateResponseMessage(submission, predictor)
-      if response is None:
-        logMessage(submission,"[NO-FEN]") # Skip since couldn't generate FEN
-        return
-
-      # Reply to submission with response
-      if not args.dry:
-        logMessage(submission,"[REPLIED]")
-        submission.reply(response)
-      else:
-        logMessage(submission,"[DRY-RUN-REPLIED]")
-
-      # Wait after submitting to not overload
-      waitWithComments(reply_wait_time)
-    else:
-      logMessage(submission,"[SKIP]") # Skip since replied to already
+def processSubmission(submission, cfb, predictors, replies, index=None):
+  """Worker side: generate a response for a candidate submission with a
+  predictor checked out of the predictors pool and queue the reply, replies
+  are rate limited by the ReplyQueue"""
+  # Skip if already replied to
+  if previouslyRepliedTo(submission, cfb, index):
+    logMessage(submission,"[SKIP]")
+    return
 
-  else:
-    logMessage(submission)
-    time.sleep(1) # Wait a second between normal submissions
+  # Generate response
+  with predictors.predictor() as predictor:
+    response = generateResponseMessage(submission, predictor)
+  if response is None:
+    logMessage(submission,"[NO-FEN]") # Skip since couldn't generate FEN
+    if index is not None:
+      index.add(submission.id, 'no-fen')
+    return
+
+  logMessage(submission,"[QUEUED]")
+  replies.put(submission, response)
+
+def runStream(subreddit, cfb, predictors, args, index=None):
+  """Read the submission stream and process candidates on a worker pool
+  sharing the predictors pool until interrupted"""
+  replies = ReplyQueue(args.reply_interval, dry=args.dry, index=index)
+  workers = SubmissionWorkers(
+    lambda submission: processSubmission(submission, cfb, predictors, replies, index),
+    args.workers)
+  replies.start()
+  workers.start()
+  # Last submissions handed to workers, streams restart with old ones
+  seen = set()
+  seen_order = deque()
 
-def main(args):
-  resetTensorflowGraph()
   running = True
-  reddit = praw.Reddit('CFB') # client credentials set up in local praw.ini file
-  cfb = reddit.user.me() # ChessFenBot object
-  subreddit = reddit.subreddit('chess+chessbeginners+AnarchyChess+betterchess+chesspuzzles')
-  predictor = tensorflow_chessbot.ChessboardPredictor()
-
   while running:
     # Start live stream on all submissions in the subreddit
     stream = subreddit.stream.submissions()
     try:
       for submission in stream:
-        processSubmission(submission, cfb, predictor, args)
+        if not isPotentialChessboardTopic(submission):
+          logMessage(submission)
+        elif submission.id not in seen:
+          seen.add(submission.id)
+          seen_order.append(submission.id)
+          if len(seen_order) > SEEN_SUBMISSIONS:
+            seen.discard(seen_order.popleft())
+          workers.submit(submission)
+      running = False # Stream ended
     except (socket.error, requests.exceptions.ReadTimeout,
             requests.packages.urllib3.exceptions.ReadTimeoutError,
             requests.exceptions.ConnectionError) as e:
@@ -97,9 +115,37 @@ def main(args):
       running = False
       break
 
-  predictor.close()
+  # Let workers finish queued submissions and post their replies
+  workers.stop()
+  replies.stop()
+
+def main(args):
+  resetTensorflowGraph()
+  reddit = praw.Reddit('CFB') # client credentials set up in local praw.ini file
+  cfb = reddit.user.me() # ChessFenBot object
+  subreddit = reddit.subreddit('chess+chessbeginners+AnarchyChess+betterchess+chesspuzzles')
+  # One predictor session per worker, so workers never share a session
+  predictors = PredictorPool(size=args.workers, name='chessbot')
+  index = openReplyIndex(args.index, cfb)
+
+  runStream(subreddit, cfb, predictors, args, index)
+
+  index.close()
+  predictors.close()
   print('Finished')
 
+def openReplyIndex(path, cfb):
+  """Open the replied submissions index and backfill it from the bot's
+  comment history, on failure it stays cold and comments get scanned"""
+  index = ReplyIndex(path)
+  try:
+    count = index.backfill(cfb)
+    print("> %s - Reply index backfilled with %d comments" % (datetime.now(), count))
+  except Exception as e:
+    print("> %s - Couldn't backfill reply index, scanning comments: %s" % (
+      datetime.now(), e))
+  return index
+
 def resetTensorflowGraph():
   """WIP needed to restart predictor after an error"""
   import tensorflow as tf
@@ -110,15 +156,20 @@ def runSpecificSubmission(args):
   resetTensorflowGraph()
   reddit = praw.Reddit('CFB') # client credentials set up in local praw.ini file
   cfb = reddit.user.me() # ChessFenBot object
-  predictor = tensorflow_chessbot.ChessboardPredictor()
+  predictors = PredictorPool(name='chessbot')
 
   submission = reddit.submission(args.sub)
   print("URL: ", submission.url)
-  if submission:
+  if submission and isPotentialChessboardTopic(submission):
     print('Processing...')
-    processSubmission(submission, cfb, predictor, args)
-
-  predictor.close()
+    index = ReplyIndex(args.index)
+    replies = ReplyQueue(dry=args.dry, index=index)
+    replies.start()
+    processSubmission(submission, cfb, predictors, replies, index)
+    replies.stop()
+    index.close()
+
+  predictors.close()
   print('Done')
 
 def dryRunTest(submission='5tuerh'):
@@ -152,6 +203,12 @@ if __name__ == '__main__':
   parser.add_argument('--test', help='Dry run test on pre-existing comment)',
                       action="store_true", default=False)
   parser.add_argument('--sub', help='Pass submission string to process')
+  parser.add_argument('--workers', type=int, default=4,
+                      help='submissions processed concurrently')
+  parser.add_argument('--reply-interval', type=float, default=10,
+                      help='minimum seconds between replies')
+  parser.add_argument('--index', default='replied_submissions.db',
+                      help='SQLite index of submissions already processed')
   args = parser.parse_args()
   if args.test:
     print('Doing dry run test on submission')
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# CPU-bound part of the recognition pipeline, decoding an uploaded image and
+# finding the chessboard tiles, packaged for running in worker processes.
+#
+# This module deliberately avoids importing tensorflow so spawned pool
+# workers start quickly and never touch a TensorFlow session.
+#
+# Workers given a tile_transport.TileRing (attachTileRing as the pool
+# initializer) write tiles into its shared memory with detectBoardToRing and
+# return only the slot index instead of pickling the tiles.
+import chessboard_finder
+import helper_image_loading
+import pipeline_timing
+
+# TileRing of this worker process, set by attachTileRing
+tile_ring = None
+
+def detectBoard(data, coarse_to_fine=False,
+                max_size=helper_image_loading.WORKING_SIZE,
+                max_fail_size=helper_image_loading.MAX_IMAGE_SIZE, out=None,
+                color=False, original_corners=True):
+  """Decode image bytes and find chessboard tiles, RGB tiles for a color
+  model if color.
+
+  Returns (error, tiles, corners, stage_ms) where error is None on success,
+  'too_large' or 'no_board', corners are in original image coordinates (on
+  the image decoded at max_size if not original_corners, ex. to refine tiles
+  on it) and stage_ms holds per-stage ms of this call so the parent process
+  can record them. Tiles are written into out if given"""
+  with pipeline_timing.collect() as stage_ms:
+    img, scale = helper_image_loading.loadImageBytes(
+      data, max_size, max_fail_size, mode='RGB' if color else 'L')
+    if img is None:
+      return 'too_large', None, None, stage_ms
+
+    if color:
+      tiles, corners = chessboard_finder.findColorTilesInImage(
+        img, coarse_to_fine=coarse_to_fine, out=out)
+    else:
+      tiles, corners = chessboard_finder.findGrayscaleTilesInImage(
+        img, coarse_to_fine=coarse_to_fine, out=out)
+  if tiles is None:
+    return 'no_board', None, None, stage_ms
+  if original_corners:
+    corners = helper_image_loading.scaleCornersToOriginal(corners, scale)
+  return None, tiles, corners, stage_ms
+
+def attachTileRing(ring):
+  """Process pool initializer, detectBoardToRing writes tiles into ring"""
+  global tile_ring
+  tile_ring = ring
+
+def detectBoardToRing(data, coarse_to_fine=False, slot_timeout=None,
+                      original_corners=True):
+  """Grayscale detectBoard writing the tiles as uint8 straight into a slot
+  of the attached TileRing, waiting up to slot_timeout seconds for a free
+  slot.
+
+  Returns (error, slot, corners, stage_ms), slot is None on error, else the
+  caller reads its tiles and releases it"""
+  slot = tile_ring.acquire(slot_timeout)
+  try:
+    error, tiles, corners, stage_ms = detectBoard(
+      data, coarse_to_fine, out=tile_ring.view(slot),
+      original_corners=original_corners)
+  except BaseException:
+    tile_ring.release(slot)
+    raise
+  if error is not None:
+    tile_ring.release(slot)
+    return error, None, None, stage_ms
+  return None, slot, corners, stage_ms
+
+def recordStages(stage_ms, timer=None):
+  """Record per-stage ms returned by a worker into a PipelineTimer"""
+  timer = timer or pipeline_timing.TIMER
+  for name, ms in stage_ms.items():
+    timer.record(name, int(ms * 1e6))
@@ -0,0 +1,30 @@
+"""
+Gunicorn configuration for the TensorFlow Chessbot API
+
+    gunicorn -c gunicorn_config.py api_server:app
+
+Equivalent to `python api_server.py --workers N`: the model is loaded in
+each worker after fork, since TensorFlow sessions are not fork-safe.
+/metrics is per worker, labelled with the worker pid, and answered by
+whichever worker accepts the scrape; `python api_server.py --metrics-port`
+serves every worker on its own port.
+"""
+
+import os
+
+bind = f"{os.environ.get('CHESSBOT_HOST', '0.0.0.0')}:{os.environ.get('CHESSBOT_PORT', '8002')}"
+workers = int(os.environ.get("CHESSBOT_WORKERS", "4"))
+threads = int(os.environ.get("CHESSBOT_THREADS", "1"))
+preload_app = False
+graceful_timeout = 30
+timeout = 120  # First request of a worker may include TensorFlow warm-up
+
+def post_worker_init(worker):
+    """Load the model once per worker process, one session per thread"""
+    import api_server
+    import metrics
+    from predictor_pool import getIntraOpThreads
+    metrics.REGISTRY.setConstLabels(worker=worker.pid)
+    api_server.initialize_model(
+        os.environ.get("CHESSBOT_MODEL", api_server.DEFAULT_MODEL_PATH),
+        pool_size=threads, intra_op_threads=getIntraOpThreads(threads, workers))
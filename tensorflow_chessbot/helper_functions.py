@@ -108,6 +108,49 @@ def label2Name(label):
   """Convert label vector into name of piece"""
   return labelIndex2Name(label.argmax())
 
+def getPredictionFromProbabilities(guess_prob):
+  """Return FEN and 8x8 tile certainties from 64x13 tile label probabilities"""
+  return getPredictionFromLabels(guess_prob, np.argmax(guess_prob, axis=1))
+
+def getPredictionFromLabels(guess_prob, guessed):
+  """Return FEN and 8x8 tile certainties for 64 chosen tile labels (A1-H8
+  order) given the 64x13 tile label probabilities"""
+  # Prediction bounds
+  a = guess_prob[np.arange(guessed.size), guessed]
+  tile_certainties = a.reshape([8,8])[::-1,:]
+
+  # Convert guess into FEN string
+  # guessed is tiles A1-H8 rank-order, so to make a FEN we just need to flip the files from 1-8 to 8-1
+  labelIndex2Name = lambda label_index: ' KQRBNPkqrbnp'[label_index]
+  pieceNames = list(map(lambda k: '1' if k == 0 else labelIndex2Name(k), guessed)) # exchange ' ' for '1' for FEN
+  fen = '/'.join([''.join(pieceNames[i*8:(i+1)*8]) for i in reversed(range(8))])
+  return fen, tile_certainties
+
+def getEmptyTileMask(tiles, max_std=0.04, max_color_diff=0.08,
+                     min_calibration_tiles=4, border_px=4):
+  """Return boolean mask (A1-H8 order) of confidently empty squares from a
+  32x32x64 tile array normalized 0-1, computed over all tiles at once.
+
+  The two square colors are calibrated per board as the median of the flat
+  tiles of each checker parity, a tile is empty if the inner region (inside
+  border_px, away from misaligned edges) is flat and matches its square color"""
+  inner = tiles[border_px:-border_px, border_px:-border_px, :].reshape([-1, 64])
+  means = inner.mean(axis=0)
+  flat = inner.std(axis=0) < max_std
+
+  # Squares alternate color along ranks and files, A1 and H8 share a color
+  # so the parity holds for flipped boards too
+  index = np.arange(64)
+  parity = (index // 8 + index % 8) % 2 == 0
+  empty = np.zeros(64, dtype=bool)
+  for square in (parity, ~parity):
+    candidates = flat & square
+    if candidates.sum() < min_calibration_tiles:
+      continue
+    square_color = np.median(means[candidates])
+    empty |= candidates & (np.abs(means - square_color) < max_color_diff)
+  return empty
+
 def shortenFEN(fen):
   """Reduce FEN to shortest form (ex. '111p11Q' becomes '3p2Q')"""
   return fen.replace('11111111','8').replace('1111111','7') \
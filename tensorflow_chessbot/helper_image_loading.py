@@ -17,6 +17,17 @@ except ImportError:
 import requests
 from bs4 import BeautifulSoup
 
+import pipeline_timing
+
+# Size policy: larger images are downscaled to fit WORKING_SIZE before
+# chessboard detection, only images larger than MAX_IMAGE_SIZE are rejected
+WORKING_SIZE = (2000, 2000)
+MAX_IMAGE_SIZE = (12000, 12000)
+
+# Bytes read from a URL before checking the image header, enough for the
+# dimensions of PNG/GIF and of most JPEGs (which may start with EXIF data)
+URL_HEADER_BYTES = 64 * 1024
+
 # All images are returned as PIL images, not numpy arrays
 def loadImageGrayscale(img_file):
   """Load image from file, convert to grayscale float32 numpy array"""
@@ -25,10 +36,45 @@ def loadImageGrayscale(img_file):
   # Convert to grayscale and return
   return img.convert("L")
 
-def loadImageFromURL(url, max_size_bytes=4000000):
+def loadImageBytes(data, max_size=None, max_fail_size=None, mode='L'):
+  """Decode image bytes directly to a PIL image in mode ('L' grayscale or
+  'RGB') that fits in max_size if given, return (img, scale) with
+  scale = new / original size.
+
+  JPEGs are decoded in draft mode: the decoder outputs the target mode
+  directly (luminance only for 'L') and downscales by the largest power of 2
+  (up to 8) that keeps the image at least as large as max_size allows, the
+  remaining downscale is a resize.
+  Returns (None, None) without decoding if larger than max_fail_size"""
+  with pipeline_timing.stage('decode'):
+    img = PIL.Image.open(BytesIO(data))
+    original_width = img.size[0]
+    if isTooLarge(img.size, max_fail_size):
+      return None, None
+    target_size = img.size
+    if max_size is not None:
+      target_size, _ = getFitSize(img.size, max_size)
+    if img.format == 'JPEG':
+      img.draft(mode, target_size)
+    img.load()
+    if img.mode != mode:
+      img = img.convert(mode)
+
+  if max_size is not None:
+    with pipeline_timing.stage('resize'):
+      img, _ = resizeToFit(img, max_size)
+  return img, float(img.size[0]) / original_width
+
+def loadImageBytesGrayscale(data, max_size=None, max_fail_size=None):
+  """Decode image bytes to a grayscale 'L' PIL image, see loadImageBytes"""
+  return loadImageBytes(data, max_size, max_fail_size, mode='L')
+
+def loadImageFromURL(url, max_size_bytes=4000000, max_fail_size=MAX_IMAGE_SIZE):
   """Load image from url.
 
-  If the url has more data than max_size_bytes, fail out
+  If the url has more data than max_size_bytes, fail out. Non-image or
+  oversize urls are skipped from a HEAD request and the first bytes of the
+  image header when possible, without downloading the whole body.
   Try and update with metadata url link if an imgur link"""
   
   # If imgur try to load from metadata
@@ -36,23 +82,86 @@ def loadImageFromURL(url, max_size_bytes=4000000):
 
   # Try loading image from url directly
   try:
-    req = Request(url, headers={'User-Agent' : "TensorFlow Chessbot"})
-    con = urlopen(req)
-    # Load up to max_size_bytes of data from url
-    data = con.read(max_size_bytes)
-    # If there is more, image is too big, skip
-    if len(con.read(1)) != 0:
-      print("Skipping, url data larger than %d bytes" % max_size_bytes)
+    with pipeline_timing.stage('url_probe'):
+      reason = checkImageHeaders(headURL(url), max_size_bytes)
+    if reason is not None:
+      print("Skipping, %s" % reason)
       return None, url
 
+    with pipeline_timing.stage('download'):
+      req = Request(url, headers={'User-Agent' : "TensorFlow Chessbot"})
+      con = urlopen(req)
+      # Servers without HEAD support still send headers with the body
+      reason = checkImageHeaders(con.headers, max_size_bytes)
+      if reason is None:
+        # Check dimensions from the start of the image before reading on
+        header_bytes = min(URL_HEADER_BYTES, max_size_bytes)
+        data = con.read(header_bytes)
+        reason = checkImageHeaderBytes(data, max_fail_size,
+                                       complete=len(data) < header_bytes)
+      if reason is not None:
+        con.close()
+        print("Skipping, %s" % reason)
+        return None, url
+      # Load up to max_size_bytes of data from url
+      data += con.read(max_size_bytes - len(data))
+      # If there is more, image is too big, skip
+      if len(con.read(1)) != 0:
+        print("Skipping, url data larger than %d bytes" % max_size_bytes)
+        return None, url
+
     # Process into PIL image
-    img = PIL.Image.open(BytesIO(data))
+    with pipeline_timing.stage('decode'):
+      img = PIL.Image.open(BytesIO(data))
+      img.load()
     # Return PIL image and url used
     return img, url
   except IOError as e:
     # Return None on failure to load image from url
     return None, url
 
+def headURL(url, timeout=10):
+  """Return response headers of a HEAD request, None if it fails (some
+  servers don't support HEAD, the GET response headers are checked then)"""
+  try:
+    req = Request(url, headers={'User-Agent' : "TensorFlow Chessbot"})
+    req.get_method = lambda: 'HEAD'
+    con = urlopen(req, timeout=timeout)
+    con.close()
+    return con.headers
+  except IOError:
+    return None
+
+def checkImageHeaders(headers, max_size_bytes):
+  """Return reason to skip a url from its Content-Type and Content-Length
+  response headers, None if it may be an image within max_size_bytes"""
+  if headers is None:
+    return None
+  content_type = headers.get('Content-Type')
+  # Missing or generic types are left to the image header check
+  if content_type and not content_type.startswith(('image/', 'application/octet-stream',
+                                                   'binary/octet-stream')):
+    return "url content type is %s, not an image" % content_type
+  content_length = headers.get('Content-Length')
+  if content_length and content_length.isdigit() and int(content_length) > max_size_bytes:
+    return "url data larger than %d bytes (%s)" % (max_size_bytes, content_length)
+  return None
+
+def checkImageHeaderBytes(data, max_fail_size, complete=False):
+  """Return reason to skip an image from its first bytes, None if it may be
+  loaded. PIL reads the format and dimensions lazily from the header, if
+  data is the complete file and PIL can't identify it it's not an image"""
+  try:
+    img = PIL.Image.open(BytesIO(data))
+  except PIL.Image.DecompressionBombError as e:
+    return str(e)
+  except IOError:
+    # Header cut short (ex. a long JPEG EXIF block) unless this is all of it
+    return "url data is not an image" if complete else None
+  if isTooLarge(img.size, max_fail_size):
+    return "image dimensions %dx%d larger than %dx%d" % (img.size + max_fail_size)
+  return None
+
 def tryUpdateImgurURL(url):
   """Try to get actual image url from imgur metadata"""
   if 'imgur' not in url: # Only attempt on urls that have imgur in it
@@ -77,30 +186,56 @@ def loadImageFromPath(img_path):
   return PIL.Image.open(open(img_path,'rb'))
 
 
-def resizeAsNeeded(img, max_size=(2000,2000), max_fail_size=(2000,2000)):
-  # Check if it's a PIL Image (compatible with newer Pillow versions)
-  if not isinstance(img, PIL.Image.Image):
-    img = PIL.Image.fromarray(img) # Convert to PIL Image if not already
-
-  # If image is larger than fail size, don't try resizing and give up
-  if img.size[0] > max_fail_size[0] or img.size[1] > max_fail_size[1]:
-    return None
-
-  """Resize if image larger than max size"""
-  if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-    print("Image too big (%d x %d)" % (img.size[0], img.size[1]))
-    new_size = np.min(max_size) # px
-    if img.size[0] > img.size[1]:
-      # resize by width to new limit
-      ratio = np.float(new_size) / img.size[0]
-    else:
-      # resize by height
-      ratio = np.float(new_size) / img.size[1]
-    print("Reducing by factor of %.2g" % (1./ratio))
-    new_size = (np.array(img.size) * ratio).astype(int)
-    print("New size: (%d x %d)" % (new_size[0], new_size[1]))
-    img = img.resize(new_size, PIL.Image.BILINEAR)
-  return img
+def isTooLarge(size, max_fail_size):
+  return max_fail_size is not None and (
+    size[0] > max_fail_size[0] or size[1] > max_fail_size[1])
+
+def getFitSize(size, max_size):
+  """Return (new_size, scale) fitting size within max_size keeping aspect
+  ratio, scale is at most 1 (never upscales)"""
+  scale = min(1.0, float(max_size[0]) / size[0], float(max_size[1]) / size[1])
+  new_size = (max(1, int(size[0] * scale)), max(1, int(size[1] * scale)))
+  return new_size, scale
+
+def getResampleFilter(scale):
+  """Resampling filter for a downscale by scale (0-1]"""
+  if scale >= 0.5:
+    # Mild reduction, bilinear keeps the board line edges sharp
+    return PIL.Image.BILINEAR
+  # Large reduction, box averages every source pixel at the lowest cost
+  return PIL.Image.BOX
+
+def resizeToFit(img, max_size):
+  """Downscale PIL image to fit max_size, return (img, scale)"""
+  new_size, scale = getFitSize(img.size, max_size)
+  if new_size == img.size:
+    return img, 1.0
+  # Scale actually applied after rounding to whole pixels
+  scale = float(new_size[0]) / img.size[0]
+  # Large reductions first shrink by an integer factor with reduce()
+  return img.resize(new_size, getResampleFilter(scale), reducing_gap=3.0), scale
+
+def resizeAsNeededWithScale(img, max_size=WORKING_SIZE, max_fail_size=MAX_IMAGE_SIZE):
+  """Resize PIL image or numpy array to fit max_size, return (img, scale)
+  where scale maps original to resized coordinates, or (None, None) if the
+  image is larger than max_fail_size"""
+  with pipeline_timing.stage('resize'):
+    # Check if it's a PIL Image (compatible with newer Pillow versions)
+    if not isinstance(img, PIL.Image.Image):
+      img = PIL.Image.fromarray(img) # Convert to PIL Image if not already
+
+    # If image is larger than fail size, don't try resizing and give up
+    if isTooLarge(img.size, max_fail_size):
+      return None, None
+    return resizeToFit(img, max_size)
+
+def resizeAsNeeded(img, max_size=WORKING_SIZE, max_fail_size=MAX_IMAGE_SIZE):
+  """Resize image to fit max_size, None if larger than max_fail_size"""
+  return resizeAsNeededWithScale(img, max_size, max_fail_size)[0]
+
+def scaleCornersToOriginal(corners, scale):
+  """Map corners found on an image resized by scale back to the original"""
+  return np.round(np.asarray(corners) / scale).astype(int)
 
 def getVisualizeLink(corners, url):
   """Return online link to visualize found corners for url"""
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Low-overhead in-process metrics exported in the Prometheus text format.
+#
+# Counters, gauges and histograms are plain Python objects guarded by a lock,
+# label children are cached per label values so the hot path is a dict lookup
+# plus an addition:
+#
+#   metrics.ERRORS.labels(type='no_board').inc()
+#   metrics.render() # Prometheus text exposition for a /metrics endpoint
+#
+# Per-stage pipeline latencies are not duplicated here, they are read from the
+# pipeline_timing histograms when rendering.
+#
+# Metrics are per process. Pre-forked server workers each label their series
+# with REGISTRY.setConstLabels(worker=index) and are scraped separately.
+#
+# Run this file to benchmark the per-call overhead.
+import threading
+from bisect import bisect_left
+
+import pipeline_timing
+
+class _Child(object):
+  """One labelled series of a metric"""
+  __slots__ = ('metric', 'value', 'counts', 'sum')
+  def __init__(self, metric):
+    self.metric = metric
+    self.value = 0.0
+    if metric.kind == 'histogram':
+      self.counts = [0] * (len(metric.buckets) + 1)
+      self.sum = 0.0
+
+  def inc(self, amount=1):
+    with self.metric.lock:
+      self.value += amount
+
+  def dec(self, amount=1):
+    with self.metric.lock:
+      self.value -= amount
+
+  def set(self, value):
+    with self.metric.lock:
+      self.value = value
+
+  def observe(self, value):
+    index = bisect_left(self.metric.buckets, value)
+    with self.metric.lock:
+      self.counts[index] += 1
+      self.sum += value
+
+class Metric(object):
+  """Counter, gauge or histogram with optional label names"""
+  def __init__(self, kind, name, documentation, labelnames=(), buckets=None):
+    self.kind = kind
+    self.name = name
+    self.documentation = documentation
+    self.labelnames = tuple(labelnames)
+    self.buckets = sorted(buckets) if buckets else None
+    self.lock = threading.Lock()
+    self.children = {}
+    if not self.labelnames:
+      # Unlabelled metrics delegate inc/set/observe to a single child
+      self.child = self.labels()
+
+  def labels(self, **labels):
+    key = tuple(str(labels[name]) for name in self.labelnames)
+    child = self.children.get(key)
+    if child is None:
+      with self.lock:
+        child = self.children.setdefault(key, _Child(self))
+    return child
+
+  def inc(self, amount=1):
+    self.child.inc(amount)
+
+  def dec(self, amount=1):
+    self.child.dec(amount)
+
+  def set(self, value):
+    self.child.set(value)
+
+  def observe(self, value):
+    self.child.observe(value)
+
+  def render(self, const_pairs=()):
+    lines = ['# HELP %s %s' % (self.name, self.documentation),
+             '# TYPE %s %s' % (self.name, self.kind)]
+    with self.lock:
+      children = sorted(self.children.items())
+      snapshot = [(key, child.value, list(child.counts), child.sum)
+                  if self.kind == 'histogram' else (key, child.value, None, None)
+                  for key, child in children]
+    for key, value, counts, total in snapshot:
+      pairs = list(const_pairs) + list(zip(self.labelnames, key))
+      if self.kind == 'histogram':
+        bounds = [formatValue(b) for b in self.buckets] + ['+Inf']
+        lines.extend(renderHistogram(self.name, pairs, bounds, counts, total))
+      else:
+        lines.append('%s%s %s' % (self.name, formatLabels(pairs), formatValue(value)))
+    return lines
+
+def formatValue(value):
+  if float(value).is_integer() and abs(value) < 1e15:
+    return str(int(value))
+  return repr(float(value))
+
+def formatLabels(pairs):
+  if not pairs:
+    return ''
+  escaped = ('%s="%s"' % (name, str(value).replace('\\', r'\\')
+                          .replace('"', r'\"').replace('\n', r'\n'))
+             for name, value in pairs)
+  return '{%s}' % ','.join(escaped)
+
+def renderHistogram(name, pairs, bounds, counts, total):
+  """Prometheus histogram lines from non-cumulative bucket counts"""
+  lines = []
+  cumulative = 0
+  for bound, count in zip(bounds, counts):
+    cumulative += count
+    lines.append('%s_bucket%s %d' % (name, formatLabels(pairs + [('le', bound)]),
+                                     cumulative))
+  lines.append('%s_sum%s %s' % (name, formatLabels(pairs), formatValue(total)))
+  lines.append('%s_count%s %d' % (name, formatLabels(pairs), cumulative))
+  return lines
+
+class Registry(object):
+  """Ordered collection of metrics rendered together"""
+  def __init__(self):
+    self.metrics = []
+    self.const_pairs = []
+
+  def setConstLabels(self, **labels):
+    """Labels added to every rendered series, ex. the server worker"""
+    self.const_pairs = sorted((name, str(value)) for name, value in labels.items())
+
+  def counter(self, name, documentation, labelnames=()):
+    return self.register(Metric('counter', name, documentation, labelnames))
+
+  def gauge(self, name, documentation, labelnames=()):
+    return self.register(Metric('gauge', name, documentation, labelnames))
+
+  def histogram(self, name, documentation, labelnames=(), buckets=None):
+    return self.register(Metric('histogram', name, documentation, labelnames,
+                                buckets))
+
+  def register(self, metric):
+    self.metrics.append(metric)
+    return metric
+
+  def render(self, timer=None):
+    lines = []
+    for metric in self.metrics:
+      lines.extend(metric.render(self.const_pairs))
+    if timer is not None:
+      lines.extend(renderStageHistograms(timer, const_pairs=self.const_pairs))
+    return '\n'.join(lines) + '\n'
+
+def renderStageHistograms(timer, name='chessbot_stage_duration_seconds',
+                          const_pairs=()):
+  """Render pipeline_timing stage histograms as one Prometheus histogram"""
+  lines = ['# HELP %s Latency of each recognition pipeline stage.' % name,
+           '# TYPE %s histogram' % name]
+  bounds = [formatValue(b / 1e9) for b in pipeline_timing.BUCKET_BOUNDS_NS] + ['+Inf']
+  with timer.lock:
+    snapshot = [(stage, list(h.counts), h.total_ns)
+                for stage, h in sorted(timer.histograms.items())]
+  for stage, counts, total_ns in snapshot:
+    lines.extend(renderHistogram(name, list(const_pairs) + [('stage', stage)],
+                                 bounds, counts, total_ns / 1e9))
+  return lines
+
+# Global registry and metrics used by the API server and predictor
+REGISTRY = Registry()
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+WAIT_BUCKETS = [0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+
+REQUESTS = REGISTRY.counter(
+  'chessbot_requests_total', 'HTTP requests handled.', ['endpoint', 'status'])
+ERRORS = REGISTRY.counter(
+  'chessbot_errors_total', 'Failed analysis requests by error type.', ['type'])
+REQUEST_LATENCY = REGISTRY.histogram(
+  'chessbot_request_duration_seconds', 'HTTP request latency.', ['endpoint'],
+  LATENCY_BUCKETS)
+IN_FLIGHT = REGISTRY.gauge(
+  'chessbot_requests_in_flight', 'HTTP requests currently being handled.')
+MODEL_LOAD_SECONDS = REGISTRY.gauge(
+  'chessbot_model_load_seconds', 'Time taken to load the predictor model.')
+PREDICTOR_BATCH_SIZE = REGISTRY.histogram(
+  'chessbot_predictor_batch_size', 'Tiles per predictor session run.',
+  buckets=BATCH_SIZE_BUCKETS)
+PREDICTOR_POOL_SIZE = REGISTRY.gauge(
+  'chessbot_predictor_pool_size', 'Predictor sessions in the pool.', ['pool'])
+PREDICTOR_POOL_IN_USE = REGISTRY.gauge(
+  'chessbot_predictor_pool_in_use', 'Pooled predictor sessions checked out.', ['pool'])
+PREDICTOR_POOL_WAIT = REGISTRY.histogram(
+  'chessbot_predictor_pool_wait_seconds',
+  'Time waiting to check out a pooled predictor session.', ['pool'], WAIT_BUCKETS)
+PREDICTOR_POOL_TIMEOUTS = REGISTRY.counter(
+  'chessbot_predictor_pool_timeouts_total',
+  'Checkouts that gave up waiting for a pooled predictor session.', ['pool'])
+
+def render():
+  """Prometheus text exposition of the global registry and stage timings"""
+  return REGISTRY.render(pipeline_timing.TIMER)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def main(iterations):
+  from time import perf_counter_ns
+  registry = Registry()
+  counter = registry.counter('bench_total', 'Benchmark counter.', ['type'])
+  histogram = registry.histogram('bench_seconds', 'Benchmark histogram.',
+                                 ['endpoint'], LATENCY_BUCKETS)
+  gauge = registry.gauge('bench_in_flight', 'Benchmark gauge.')
+
+  def timeit(fn):
+    start = perf_counter_ns()
+    for _ in range(iterations):
+      fn()
+    return (perf_counter_ns() - start) / iterations
+
+  baseline = timeit(lambda: None)
+  results = [
+    ('counter.labels().inc()', timeit(lambda: counter.labels(type='no_board').inc())),
+    ('histogram.labels().observe()',
+     timeit(lambda: histogram.labels(endpoint='/analyze').observe(0.042))),
+    ('gauge.inc() + gauge.dec()', timeit(lambda: (gauge.inc(), gauge.dec()))),
+  ]
+  print('Overhead per call (%d iterations, loop overhead removed):' % iterations)
+  per_request = 0
+  for name, ns in results:
+    per_request += ns - baseline
+    print('  %-30s %8.0f ns' % (name, ns - baseline))
+  # A request records a status counter, a latency histogram and in-flight gauge
+  print('  %-30s %8.0f ns (%.4f%% of a 50 ms request)' % (
+    'per request total', per_request, per_request / 50e6 * 100))
+
+  for i in range(50):
+    histogram.labels(endpoint='/e%d' % i).observe(0.01)
+  start = perf_counter_ns()
+  text = registry.render(pipeline_timing.TIMER)
+  print('  %-30s %8.0f us (%d lines)' % ('render', (perf_counter_ns() - start) / 1e3,
+                                         text.count('\n')))
+
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description='Benchmark metrics overhead.')
+  parser.add_argument('--iterations', type=int, default=200000)
+  args = parser.parse_args()
+  main(args.iterations)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Perspective-corrected chessboard detection for photos of physical boards.
+#
+# chessboard_finder assumes an axis-aligned board, so it fails on photos
+# taken at an angle. Here straight lines are found with Canny + Hough and
+# split into two families of directions. Under perspective the lines of each
+# family meet at a vanishing point, estimated RANSAC-style from line pairs.
+# Mapping both vanishing points to infinity rectifies the board up to a
+# scale and offset per axis, so its 9 lines per family become evenly spaced
+# positions, found like chessboard_finder.getAllSequences does for screen
+# captures. The board quad then gives the homography that warps it to the
+# canonical 256x256 input with one cv2.warpPerspective.
+import numpy as np
+import cv2
+from time import perf_counter
+
+import pipeline_timing
+from chessboard_finder import getChessboardKernel, getTiles
+
+# Canonical board image size the tiles are cut from (32px per tile)
+BOARD_SIZE_PX = 256
+
+def getImageLines(img_arr_gray, max_lines=60, min_length=0.15):
+  """Return up to max_lines strongest distinct straight lines as Nx3 array of
+  normalized (a, b, c) with a*x + b*y + c = 0 and a^2 + b^2 = 1. Lines need
+  Hough support of min_length times the smaller image side"""
+  blurred = cv2.GaussianBlur(img_arr_gray, (5, 5), 0)
+  # Low Canny thresholds, low contrast board themes have tile steps of ~50
+  edges = cv2.Canny(blurred, 20, 60)
+  votes = int(min(img_arr_gray.shape) * min_length)
+  hough = cv2.HoughLines(edges, 1, np.pi / 180, votes)
+  if hough is None:
+    return np.zeros([0, 3])
+
+  # Hough lines come strongest first, drop near duplicates of stronger ones
+  # (similar angle and distance from the origin, also across the 0/pi wrap)
+  tolerance_px = max(3.0, min(img_arr_gray.shape) * 0.01)
+  kept = []
+  for rho, theta in hough[:, 0]:
+    duplicate = False
+    for kept_rho, kept_theta in kept:
+      dtheta = abs(theta - kept_theta)
+      if dtheta < np.radians(2) and abs(rho - kept_rho) < tolerance_px:
+        duplicate = True
+      elif np.pi - dtheta < np.radians(2) and abs(rho + kept_rho) < tolerance_px:
+        duplicate = True
+      if duplicate:
+        break
+    if not duplicate:
+      kept.append((rho, theta))
+      if len(kept) == max_lines:
+        break
+  kept = np.array(kept)
+  return np.stack([np.cos(kept[:, 1]), np.sin(kept[:, 1]), -kept[:, 0]], axis=1)
+
+def splitLineFamilies(lines, iterations=10):
+  """Split lines into two families of directions by 2-means clustering of
+  their doubled angles. Returns (family_a, family_b) index arrays"""
+  angles = 2 * np.arctan2(lines[:, 1], lines[:, 0])
+  points = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+  # Start from the strongest line and the line most unlike it
+  centers = points[[0, np.argmin(points @ points[0])]]
+  for _ in range(iterations):
+    family = np.argmax(points @ centers.T, axis=1)
+    for k in range(2):
+      if (family == k).any():
+        center = points[family == k].mean(axis=0)
+        centers[k] = center / max(np.linalg.norm(center), 1e-9)
+  return np.flatnonzero(family == 0), np.flatnonzero(family == 1)
+
+def findVanishingPoint(lines, rng, iterations=200, tolerance=0.01):
+  """RANSAC vanishing point of lines (normalized coordinates, see
+  findChessboardQuad): the unit 3-vector meeting the most lines within
+  tolerance, refined by least squares on those lines. Returns
+  (point, inlier mask) or (None, None). Points at infinity (parallel lines)
+  have a zero last coordinate"""
+  if len(lines) < 2:
+    return None, None
+  normalized = lines / np.linalg.norm(lines[:, :2], axis=1, keepdims=True)
+  best_inliers = None
+  pairs = [(i, j) for i in range(len(lines)) for j in range(i + 1, len(lines))]
+  if len(pairs) > iterations:
+    pairs = [pairs[k] for k in rng.choice(len(pairs), iterations, replace=False)]
+  for i, j in pairs:
+    point = np.cross(normalized[i], normalized[j])
+    norm = np.linalg.norm(point)
+    if norm < 1e-9:
+      continue
+    inliers = np.abs(normalized @ (point / norm)) < tolerance
+    if best_inliers is None or inliers.sum() > best_inliers.sum():
+      best_inliers = inliers
+  if best_inliers is None or best_inliers.sum() < 2:
+    return None, None
+
+  # Least squares point meeting all inlier lines, smallest singular vector
+  _, _, vt = np.linalg.svd(normalized[best_inliers])
+  return vt[-1], best_inliers
+
+def getEvenlySpacedLines(positions, min_lines=7, tolerance=0.15, max_grids=3):
+  """Evenly spaced subsets of at least min_lines sorted positions, with
+  spacing errors within tolerance of the step. Returns up to max_grids
+  distinct (start, step, indices) least squares fits position = start +
+  step * index, most lines and smallest error first. Several are kept since
+  a board frame edge can extend the sequence of the board lines"""
+  grids = []
+  n = len(positions)
+  for i in range(n - 1):
+    for j in range(i + 1, n):
+      step = positions[j] - positions[i]
+      if step <= 0:
+        continue
+      # Extend in steps from the last member, snapping to the nearest
+      # position, with the step re-estimated from the members so far since
+      # small vanishing point errors make the spacing drift slightly
+      members, indices = [i, j], [0, 1]
+      for k in range(2, 9):
+        errors = np.abs(positions - (positions[members[-1]] + (k - indices[-1]) * step))
+        nearest = int(errors.argmin())
+        if errors[nearest] < tolerance * step:
+          members.append(nearest)
+          indices.append(k)
+          step = (positions[nearest] - positions[i]) / k
+        elif indices[-1] < k - 1:
+          break
+      if len(members) < min_lines:
+        continue
+      fit, residuals = np.polyfit(indices, positions[members], 1, full=True)[:2]
+      error = float(residuals[0]) / len(members) / fit[0]**2 if len(residuals) else 0.0
+      grids.append(((len(members), -error), (fit[1], fit[0], np.array(indices))))
+
+  distinct = []
+  for _, grid in sorted(grids, key=lambda g: g[0], reverse=True):
+    start, step, indices = grid
+    if all(abs(start + step * indices[0] - other[0] - other[1] * other[2][0]) > step / 4 or
+           abs(start + step * indices[-1] - other[0] - other[1] * other[2][-1]) > step / 4
+           for other in distinct):
+      distinct.append(grid)
+      if len(distinct) == max_grids:
+        break
+  return distinct
+
+def getRectifiedPositions(lines, other_point, origin):
+  """Positions along the axis they cross of lines through one vanishing
+  point, after mapping it and other_point to infinity and origin to the
+  rectified origin (see findChessboardQuad)"""
+  return -(lines @ origin) / (lines @ other_point)
+
+def warpBoard(img_arr_gray, quad, size=BOARD_SIZE_PX):
+  """Warp the board at quad (4x2 corners in clockwise order from its top-left)
+  to a size x size image with one cv2.warpPerspective"""
+  target = np.array([[0, 0], [size, 0], [size, size], [0, size]], dtype=np.float32)
+  homography = cv2.getPerspectiveTransform(np.float32(quad), target)
+  return cv2.warpPerspective(img_arr_gray, homography, (size, size),
+                             flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+def getWarpedCheckerboardScore(img_arr_gray, quad):
+  """Correlation of the board warped from quad with an ideal chessboard, as
+  chessboard_finder.getCheckerboardScore"""
+  board = warpBoard(img_arr_gray, quad, 64).astype(np.float32)
+  board -= board.mean()
+  norm = np.linalg.norm(board)
+  if norm == 0:
+    return 0.0
+  return float(np.abs(np.sum(getChessboardKernel() * board)) / norm)
+
+def orderQuad(quad):
+  """Order 4 corners clockwise (in image coordinates) starting from the one
+  nearest the top-left of the image, so the warp never mirrors the board"""
+  center = quad.mean(axis=0)
+  quad = quad[np.argsort(np.arctan2(quad[:, 1] - center[1], quad[:, 0] - center[0]))]
+  start = int(np.argmin(quad.sum(axis=1)))
+  return np.roll(quad, -start, axis=0)
+
+def isPastDeadline(deadline):
+  return deadline is not None and perf_counter() > deadline
+
+def findChessboardQuad(img_arr_gray, max_size=800, min_score=0.35, seed=0,
+                       deadline=None):
+  """Find a chessboard seen in perspective. Returns its 4x2 corners in
+  img_arr_gray coordinates, clockwise from the top-left, or None.
+  Detection runs on the image downscaled to at most max_size px, boards
+  must correlate with an ideal chessboard by at least min_score. Gives up
+  between stages once time.perf_counter() passes deadline"""
+  with pipeline_timing.stage('perspective_lines'):
+    height, width = img_arr_gray.shape
+    scale = min(1.0, max_size / float(max(height, width)))
+    small = img_arr_gray
+    if scale < 1.0:
+      small = cv2.resize(img_arr_gray, (int(width * scale), int(height * scale)),
+                         interpolation=cv2.INTER_AREA)
+    lines = getImageLines(small)
+    if len(lines) < 14 or isPastDeadline(deadline):
+      return None
+
+  with pipeline_timing.stage('perspective_vanishing'):
+    # Lines in normalized coordinates, centered on the image with unit half
+    # size, so vanishing point tolerances don't depend on the image size
+    half = max(small.shape) / 2.0
+    to_pixels = np.array([[half, 0, small.shape[1] / 2.0],
+                          [0, half, small.shape[0] / 2.0], [0, 0, 1]])
+    lines = lines @ to_pixels
+    rng = np.random.RandomState(seed)
+    families = []
+    for family in splitLineFamilies(lines):
+      point, inliers = findVanishingPoint(lines[family], rng)
+      if point is None or inliers.sum() < 7:
+        return None
+      families.append((lines[family][inliers], point))
+    if isPastDeadline(deadline):
+      return None
+
+  with pipeline_timing.stage('perspective_grid'):
+    # Map both vanishing points to infinity with the image center as origin,
+    # leaving only a scale and offset per axis: the lines of each family
+    # are evenly spaced positions along the other axis
+    (lines_a, point_a), (lines_b, point_b) = families
+    origin = np.array([0.0, 0.0, 1.0])
+    grids = []
+    for own_lines, other_point in ((lines_a, point_b), (lines_b, point_a)):
+      positions = getRectifiedPositions(own_lines, other_point, origin)
+      found = getEvenlySpacedLines(np.sort(positions))
+      if not found or isPastDeadline(deadline):
+        return None
+      # Candidate board spans (start, step) of 8 steps covering the lines
+      grids.append([(start + step * k, step) for start, step, indices in found
+                    for k in range(indices[-1] - 8, indices[0] + 1)])
+
+    # Board corners for every candidate span, the best warped correlation wins
+    unrectify = np.stack([point_a, point_b, origin], axis=1)
+    best, best_score = None, None
+    for a0, step_a in grids[0]:
+      for b0, step_b in grids[1]:
+        a1, b1 = a0 + 8 * step_a, b0 + 8 * step_b
+        # Family a lines are rows of constant rectified y, b lines columns
+        rectified = np.array([[b0, a0, 1], [b1, a0, 1], [b1, a1, 1], [b0, a1, 1]])
+        corners = rectified @ unrectify.T
+        if np.any(np.abs(corners[:, 2]) < 1e-9):
+          continue
+        corners = corners[:, :2] / corners[:, 2:] * half
+        corners += [small.shape[1] / 2.0, small.shape[0] / 2.0]
+        quad = orderQuad(corners)
+        score = getWarpedCheckerboardScore(small, quad)
+        if best_score is None or score > best_score:
+          best, best_score = quad, score
+    if best is None or best_score < min_score:
+      return None
+  return best / scale
+
+def getPerspectiveTilesGray(img_arr_gray, quad):
+  """32x32x64 tile array of the board at quad, as chessboard_finder.getTiles"""
+  with pipeline_timing.stage('perspective_warp'):
+    board = warpBoard(img_arr_gray, quad) / 255.0
+    return getTiles(board)
+
+def findPerspectiveTilesInImage(img, max_size=800, budget_ms=None):
+  """Find a chessboard seen in perspective and return (tiles, quad) or
+  (None, None). With a latency budget_ms detection gives up once it's
+  spent, and a slower image is reported on stdout so it can be tuned
+  (ex. with a smaller max_size)"""
+  if img is None:
+    return None, None
+  start = perf_counter()
+  deadline = None if budget_ms is None else start + budget_ms / 1000.0
+  with pipeline_timing.stage('grayscale'):
+    if img.mode != 'L':
+      img = img.convert("L")
+    img_arr = np.asarray(img, dtype=np.uint8)
+
+  quad = findChessboardQuad(img_arr, max_size, deadline=deadline)
+  tiles = None
+  if quad is not None:
+    tiles = getPerspectiveTilesGray(img_arr, quad)
+
+  elapsed_ms = (perf_counter() - start) * 1000
+  if budget_ms is not None and elapsed_ms > budget_ms:
+    print("Perspective detection took %.1fms, over budget of %.1fms" % (elapsed_ms, budget_ms))
+  if quad is None:
+    return None, None
+  return tiles, quad
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Lightweight per-stage latency instrumentation for the recognition pipeline.
+#
+# Wrap a stage of work with the stage context manager:
+#
+#   with pipeline_timing.stage('session_run'):
+#     ...
+#
+# Durations are measured with time.perf_counter_ns and aggregated per stage
+# into the global TIMER as log2-bucketed histograms plus a bounded reservoir
+# of raw samples (a uniform sample of every run) for percentiles.
+# Use pipeline_timing.collect() to also capture the stages run by the current
+# thread, ex. for a single API request.
+import copy
+import json
+import random
+import threading
+from time import perf_counter_ns
+
+# Histogram bucket upper bounds in nanoseconds, 1us to ~68s in powers of 2
+BUCKET_BOUNDS_NS = [1000 * 2**i for i in range(27)]
+
+class StageHistogram(object):
+  """Latency histogram for one pipeline stage"""
+  def __init__(self, max_samples=100000):
+    self.max_samples = max_samples
+    self.random = random.Random(0)
+    self.reset()
+
+  def reset(self):
+    self.counts = [0] * (len(BUCKET_BOUNDS_NS) + 1) # Last bucket is overflow
+    self.count = 0
+    self.total_ns = 0
+    self.min_ns = None
+    self.max_ns = None
+    self.samples = []
+
+  def record(self, duration_ns):
+    # Index of first bucket with duration <= 1us * 2**index, via bit_length
+    bucket = ((max(duration_ns, 1) - 1) // 1000).bit_length()
+    self.counts[min(bucket, len(BUCKET_BOUNDS_NS))] += 1
+    self.count += 1
+    self.total_ns += duration_ns
+    if self.min_ns is None or duration_ns < self.min_ns:
+      self.min_ns = duration_ns
+    if self.max_ns is None or duration_ns > self.max_ns:
+      self.max_ns = duration_ns
+    if len(self.samples) < self.max_samples:
+      self.samples.append(duration_ns)
+    else:
+      # Reservoir sampling, each of the count runs is kept with equal chance
+      index = self.random.randrange(self.count)
+      if index < self.max_samples:
+        self.samples[index] = duration_ns
+
+  def copy(self):
+    """Snapshot of the histogram, to report on without holding a lock"""
+    snapshot = copy.copy(self)
+    snapshot.counts = list(self.counts)
+    snapshot.samples = list(self.samples)
+    return snapshot
+
+  def percentile(self, q, ordered=None):
+    """Return q-th percentile (0-100) in ms from raw samples, ordered is the
+    already sorted samples"""
+    if ordered is None:
+      ordered = sorted(self.samples)
+    if not ordered:
+      return None
+    index = min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))
+    return ordered[index] / 1e6
+
+  def toDict(self, include_samples=False):
+    ordered = sorted(self.samples)
+    result = {
+      'count': self.count,
+      'total_ms': self.total_ns / 1e6,
+      'mean_ms': self.total_ns / 1e6 / self.count if self.count else None,
+      'min_ms': None if self.min_ns is None else self.min_ns / 1e6,
+      'max_ms': None if self.max_ns is None else self.max_ns / 1e6,
+      'p50_ms': self.percentile(50, ordered),
+      'p95_ms': self.percentile(95, ordered),
+      'p99_ms': self.percentile(99, ordered),
+      'buckets_le_ms': [b / 1e6 for b in BUCKET_BOUNDS_NS] + ['+Inf'],
+      'bucket_counts': list(self.counts),
+    }
+    if include_samples:
+      result['samples_ms'] = [s / 1e6 for s in self.samples]
+    return result
+
+class _StageContext(object):
+  """Context manager timing one run of a stage"""
+  __slots__ = ('timer', 'name', 'start')
+  def __init__(self, timer, name):
+    self.timer = timer
+    self.name = name
+
+  def __enter__(self):
+    self.start = perf_counter_ns()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.timer.record(self.name, perf_counter_ns() - self.start)
+    return False
+
+class PipelineTimer(object):
+  """Thread-safe collection of per-stage latency histograms"""
+  def __init__(self, enabled=True):
+    self.enabled = enabled
+    self.histograms = {}
+    self.lock = threading.Lock()
+    self.local = threading.local()
+
+  def stage(self, name):
+    return _StageContext(self, name)
+
+  def record(self, name, duration_ns):
+    if not self.enabled:
+      return
+    with self.lock:
+      histogram = self.histograms.get(name)
+      if histogram is None:
+        histogram = self.histograms[name] = StageHistogram()
+      histogram.record(duration_ns)
+    # Per-thread collectors, see collect()
+    for collected in getattr(self.local, 'collectors', ()):
+      collected[name] = collected.get(name, 0.0) + duration_ns / 1e6
+
+  def collect(self):
+    return _Collector(self)
+
+  def reset(self):
+    with self.lock:
+      self.histograms = {}
+
+  def toDict(self, include_samples=False):
+    # Only copy under the lock, sorting the samples would block record()
+    with self.lock:
+      histograms = [(name, h.copy())
+                    for name, h in sorted(self.histograms.items())]
+    return dict((name, h.toDict(include_samples)) for name, h in histograms)
+
+  def toJSON(self, include_samples=False, **kwargs):
+    return json.dumps(self.toDict(include_samples), **kwargs)
+
+  def save(self, filepath, include_samples=False):
+    with open(filepath, 'w') as f:
+      f.write(self.toJSON(include_samples, indent=2))
+
+class _Collector(object):
+  """Collects total ms per stage run by the current thread while active"""
+  def __init__(self, timer):
+    self.timer = timer
+    self.stages = {}
+
+  def __enter__(self):
+    local = self.timer.local
+    if not hasattr(local, 'collectors'):
+      local.collectors = []
+    local.collectors.append(self.stages)
+    return self.stages
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    collectors = self.timer.local.collectors
+    del collectors[[c is self.stages for c in collectors].index(True)]
+    return False
+
+# Global timer used by the pipeline modules
+TIMER = PipelineTimer()
+
+def stage(name):
+  """Time a pipeline stage with the global timer"""
+  return TIMER.stage(name)
+
+def collect():
+  """Capture per-stage ms of the current thread with the global timer"""
+  return TIMER.collect()
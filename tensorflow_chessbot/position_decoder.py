@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Legal-position decoding of the 64x13 tile label probabilities.
+#
+# Taking the argmax of every tile independently can produce impossible
+# positions, like three kings or pawns on the back rank. getLegalPredictions
+# finds the k most probable labelings satisfying basic legality constraints:
+#  * exactly one king per side
+#  * no pawns on ranks 1 and 8
+#  * at most 8 pawns and 16 pieces per side, with no more promoted pieces
+#    (queens beyond 1, rooks, bishops or knights beyond 2) than missing pawns
+#
+# Tiles keep their argmax label unless they are uncertain or involved in a
+# violated constraint, so the common legal case is a single pass over the 64
+# tiles. The remaining free tiles are searched best-first over their
+# candidate labels in order of decreasing total log probability, pruning
+# branches whose fixed tiles already break a count constraint.
+import heapq
+import numpy as np
+
+from helper_functions import getPredictionFromLabels
+
+# Label indices, see helper_functions.labelIndex2Name, black is WHITE + 6
+WHITE, BLACK = 1, 7
+KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN = range(6)
+
+def getBackRankMask(sideways=False):
+  """Boolean mask (A1-H8 order) of ranks 1 and 8, the left and right image
+  columns instead of bottom and top rows for boards rotated 90 degrees"""
+  tile = np.arange(64)
+  if sideways:
+    return (tile % 8 == 0) | (tile % 8 == 7)
+  return (tile < 8) | (tile >= 56)
+
+def violatesCounts(counts, possible=None):
+  """True if no labeling with these label counts can be legal. With possible,
+  the number of further tiles that could still take each label, counts are
+  of the fixed tiles only and it's True if no completion can be legal"""
+  for side in (WHITE, BLACK):
+    king, queen, rook, bishop, knight, pawn = counts[side:side+6]
+    if king > 1 or king + queen + rook + bishop + knight + pawn > 16:
+      return True
+    # Pieces beyond the starting ones are promoted pawns
+    promoted = pawn
+    if queen > 1:
+      promoted += queen - 1
+    if rook > 2:
+      promoted += rook - 2
+    if bishop > 2:
+      promoted += bishop - 2
+    if knight > 2:
+      promoted += knight - 2
+    if promoted > 8:
+      return True
+    if king == 0 and (possible is None or possible[side] == 0):
+      return True
+  return False
+
+def isLegalPosition(labels, sideways=False):
+  """True if 64 tile labels (A1-H8 order) satisfy the legality constraints"""
+  labels = np.asarray(labels)
+  pawns = (labels == WHITE + PAWN) | (labels == BLACK + PAWN)
+  return (not (pawns & getBackRankMask(sideways)).any() and
+          not violatesCounts(np.bincount(labels, minlength=13)))
+
+def getFreeTiles(best, order, cost, k, max_cost, max_labels):
+  """Dict of tile index to candidate labels (cheapest first) for the tiles
+  the search may change, tiles in violated constraints first"""
+  counts = np.bincount(best, minlength=13)
+  free = {}
+  def addTiles(tiles, label=None, max_cost=np.inf):
+    for tile in tiles:
+      labels = set(free.get(tile, []))
+      labels.update(l for l in order[tile, :max_labels]
+                    if np.isfinite(cost[tile, l]) and cost[tile, l] <= max_cost)
+      if label is not None:
+        labels.add(label)
+      free[tile] = sorted(labels, key=lambda l: cost[tile, l])
+
+  for side in (WHITE, BLACK):
+    side_tiles = np.flatnonzero((best >= side) & (best < side + 6))
+    king, queen, rook, bishop, knight, pawn = counts[side:side+6]
+    if king > 1:
+      addTiles(np.flatnonzero(best == side + KING))
+    elif king == 0:
+      # Most likely squares for the missing king
+      likely = np.argsort(cost[:, side + KING])[:max_labels]
+      addTiles(likely[np.isfinite(cost[likely, side + KING])], side + KING)
+    promoted = max(0, queen - 1) + max(0, rook - 2) + max(0, bishop - 2) + max(0, knight - 2)
+    if side_tiles.size > 16:
+      addTiles(side_tiles)
+    elif pawn > 8 or promoted + pawn > 8:
+      # Pawns and the piece types beyond their starting number
+      extra = [side + piece for piece, count, start in
+               ((QUEEN, queen, 1), (ROOK, rook, 2), (BISHOP, bishop, 2),
+                (KNIGHT, knight, 2), (PAWN, pawn, 0)) if count > start]
+      addTiles(np.flatnonzero(np.isin(best, extra)))
+
+  if k > 1:
+    # Uncertain tiles, an alternative label at most max_cost less likely
+    addTiles(np.flatnonzero(cost[np.arange(64), order[:, 1]] <= max_cost),
+             max_cost=max_cost)
+  return free
+
+def getLegalPredictions(guess_prob, k=1, sideways=False, max_cost=3.0,
+                        max_labels=4, max_states=5000):
+  """Return up to k (labels, log_probability) for the most probable legal
+  positions given 64x13 tile label probabilities, most probable first.
+  labels are 64 tile labels in A1-H8 order.
+
+  Uncertain tiles have an alternative label at most max_cost (log
+  probability) less likely than their best. If no legal position is found
+  within max_states search states, the argmax position is returned alone"""
+  log_prob = np.log(np.clip(guess_prob, 1e-12, 1.0))
+  # Pawns can't stand on the back ranks
+  back_rank = getBackRankMask(sideways)
+  log_prob[np.ix_(back_rank, [WHITE + PAWN, BLACK + PAWN])] = -np.inf
+
+  # Common case, a legal argmax and only the best position wanted
+  best = np.argmax(log_prob, axis=1)
+  best_log_prob = log_prob[np.arange(64), best]
+  if k == 1 and not violatesCounts(np.bincount(best, minlength=13)):
+    return [(best, float(best_log_prob.sum()))]
+
+  order = np.argsort(-log_prob, axis=1)
+  cost = best_log_prob[:, None] - log_prob # >= 0, inf for impossible labels
+  free = getFreeTiles(best, order, cost, k, max_cost, max_labels)
+  tiles = list(free)
+  candidates = [np.array(free[tile]) for tile in tiles]
+  candidate_costs = [cost[tile, labels] for tile, labels in zip(tiles, candidates)]
+
+  fixed = np.ones(64, dtype=bool)
+  fixed[tiles] = False
+  fixed_counts = np.bincount(best[fixed], minlength=13).tolist()
+  # possible[i] counts the tiles from i on that could take each label
+  possible = np.zeros([len(tiles) + 1, 13], dtype=int)
+  for i in reversed(range(len(tiles))):
+    possible[i] = possible[i + 1]
+    possible[i, candidates[i]] += 1
+  possible = possible.tolist()
+  candidates = [labels.tolist() for labels in candidates]
+  candidate_costs = [costs.tolist() for costs in candidate_costs]
+
+  # Best-first enumeration of candidate rank tuples: a state only changes
+  # tiles from its last changed index on, so each tuple is reached once and
+  # the tiles before it stay fixed for all its successors
+  results = []
+  start = (0,) * len(tiles)
+  heap = [(0.0, start, 0)]
+  states = 0
+  while heap and len(results) < k and states < max_states:
+    total_cost, ranks, last = heapq.heappop(heap)
+    states += 1
+    labels = [candidates[i][rank] for i, rank in enumerate(ranks)]
+
+    # Counts of the fixed tiles plus the free tiles before index i, the
+    # successor changing tile i can't change them anymore. Violations only
+    # grow with i, so no later successor is feasible once one isn't
+    counts = list(fixed_counts)
+    for label in labels[:last]:
+      counts[label] += 1
+    feasible = True
+    for i in range(last, len(tiles)):
+      if violatesCounts(counts, possible[i]):
+        feasible = False
+        break
+      if ranks[i] + 1 < len(candidates[i]):
+        successor = ranks[:i] + (ranks[i] + 1,) + ranks[i+1:]
+        successor_cost = (total_cost + candidate_costs[i][ranks[i] + 1] -
+                          candidate_costs[i][ranks[i]])
+        heapq.heappush(heap, (successor_cost, successor, i))
+      counts[labels[i]] += 1
+
+    if feasible and not violatesCounts(counts):
+      position = best.copy()
+      position[tiles] = labels
+      results.append((position, float(best_log_prob.sum() - total_cost)))
+
+  if not results:
+    results.append((best, float(best_log_prob.sum())))
+  return results
+
+def getLegalPredictionsFromProbabilities(guess_prob, k=1, sideways=False):
+  """Return up to k (fen, 8x8 tile certainties, log_probability) of the most
+  probable legal positions from 64x13 tile label probabilities"""
+  return [getPredictionFromLabels(guess_prob, labels) + (log_probability,)
+          for labels, log_probability in getLegalPredictions(guess_prob, k, sideways)]
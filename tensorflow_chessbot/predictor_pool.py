@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Pool of ChessboardPredictor sessions shared by concurrent request threads.
+#
+# By default a TensorFlow session runs each op on every core, so concurrent
+# requests on one shared session oversubscribe the CPU, and the predictor's
+# own state (stats) is not guarded. The pool holds size predictors that share
+# one loaded graph, each session with an intra-op thread budget of
+# cores / size, and hands each predictor to one thread at a time:
+#
+#   pool = PredictorPool('saved_models/frozen_graph.pb', size=4)
+#   with pool.predictor() as predictor:
+#     fen, tile_certainties = predictor.getPrediction(tiles, img, corners)
+#
+# Checkout wait times, pool size, predictors in use and checkout timeouts are
+# exported in metrics, labelled with the pool name.
+import os
+import queue
+from contextlib import contextmanager
+from time import perf_counter
+
+import metrics
+
+class PoolTimeout(Exception):
+  """No pooled predictor was checked in within the checkout timeout"""
+
+def getIntraOpThreads(size, processes=1):
+  """Intra-op threads per session so that size sessions in each of
+  processes use every core once"""
+  return max(1, (os.cpu_count() or 1) // (size * processes))
+
+class PredictorPool(object):
+  """Fixed set of predictors, each checked out by one thread at a time"""
+  def __init__(self, frozen_graph_path='saved_models/frozen_graph.pb', size=1,
+               intra_op_threads=None, name='default', factory=None,
+               **predictor_kwargs):
+    # size: number of predictor sessions, the most concurrent session runs
+    # intra_op_threads: threads per session run, None divides the cores
+    #   between the sessions (getIntraOpThreads)
+    # name: pool label of the exported metrics
+    # factory: callable returning a new predictor, by default the frozen graph
+    #   is loaded once and ChessboardPredictor sessions are created on it
+    #   with predictor_kwargs
+    if size < 1:
+      raise ValueError('Pool size must be at least 1, got %d' % size)
+    self.name = name
+    self.size = size
+    self.intra_op_threads = intra_op_threads or getIntraOpThreads(size)
+    if factory is None:
+      factory = getSessionFactory(frozen_graph_path, self.intra_op_threads,
+                                  **predictor_kwargs)
+    self.predictors = [factory() for _ in range(size)]
+
+    # Most recently checked in first, keeping the fewest sessions warm
+    self.available = queue.LifoQueue()
+    for predictor in self.predictors:
+      self.available.put(predictor)
+
+    self.wait_seconds = metrics.PREDICTOR_POOL_WAIT.labels(pool=name)
+    self.in_use = metrics.PREDICTOR_POOL_IN_USE.labels(pool=name)
+    self.timeouts = metrics.PREDICTOR_POOL_TIMEOUTS.labels(pool=name)
+    metrics.PREDICTOR_POOL_SIZE.labels(pool=name).set(size)
+
+  def checkout(self, timeout=None):
+    """Take a predictor out of the pool, waiting up to timeout seconds (None
+    waits forever) for one to be checked in. Raises PoolTimeout"""
+    start = perf_counter()
+    try:
+      predictor = self.available.get(timeout=timeout)
+    except queue.Empty:
+      self.timeouts.inc()
+      raise PoolTimeout('No predictor of pool %r available after %gs' % (
+        self.name, timeout))
+    self.wait_seconds.observe(perf_counter() - start)
+    self.in_use.inc()
+    return predictor
+
+  def checkin(self, predictor):
+    """Return a checked out predictor to the pool"""
+    if not any(predictor is pooled for pooled in self.predictors):
+      raise ValueError('Predictor does not belong to pool %r' % self.name)
+    self.in_use.dec()
+    self.available.put(predictor)
+
+  @contextmanager
+  def predictor(self, timeout=None):
+    """Checked out predictor for the with block, checked in afterwards even
+    if the block raises"""
+    predictor = self.checkout(timeout)
+    try:
+      yield predictor
+    finally:
+      self.checkin(predictor)
+
+  def getStats(self):
+    """Sum of the stats of the pooled predictors"""
+    stats = {}
+    for predictor in self.predictors:
+      for key, value in predictor.stats.items():
+        stats[key] = stats.get(key, 0) + value
+    return stats
+
+  def close(self):
+    """Wait for every predictor to be checked in and close them"""
+    for _ in range(self.size):
+      self.available.get().close()
+    metrics.PREDICTOR_POOL_SIZE.labels(pool=self.name).set(0)
+
+def getSessionFactory(frozen_graph_path, intra_op_threads, **predictor_kwargs):
+  """Load the frozen graph once, return a callable creating a predictor with
+  its own session on it"""
+  import tensorflow_chessbot
+  print("\t Loading model '%s'" % frozen_graph_path)
+  graph = tensorflow_chessbot.load_graph(frozen_graph_path)
+  def factory():
+    return tensorflow_chessbot.ChessboardPredictor(
+      frozen_graph_path, intra_op_threads=intra_op_threads, graph=graph,
+      **predictor_kwargs)
+  return factory
@@ -43,9 +43,12 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1' # Ignore Tensorflow INFO debug messages
 import tensorflow as tf
 import numpy as np
 
-from helper_functions import shortenFEN, unflipFEN
+from helper_functions import shortenFEN, unflipFEN, getEmptyTileMask
+from position_decoder import getLegalPredictionsFromProbabilities
 import helper_image_loading
 import chessboard_finder
+import pipeline_timing
+import metrics
 
 def load_graph(frozen_graph_filepath):
     # Load and parse the protobuf file to retrieve the unserialized graph_def.
@@ -61,47 +64,219 @@ def load_graph(frozen_graph_filepath):
 
 class ChessboardPredictor(object):
   """ChessboardPredictor using saved model"""
-  def __init__(self, frozen_graph_path='saved_models/frozen_graph.pb'):
+  def __init__(self, frozen_graph_path='saved_models/frozen_graph.pb',
+               skip_empty_tiles=False, tta_threshold=0.9, color=None,
+               intra_op_threads=None, graph=None):
+    # skip_empty_tiles: tiles found confidently empty by a cheap per-board
+    #   calibrated flatness test (getEmptyTileMask) skip the neural network,
+    #   off until benchmark_empty_tiles.py shows it agrees with the model
+    # tta_threshold: tiles less certain than this are re-run on test-time
+    #   augmented crops of the board when the image is available, 0 disables
+    # color: whether the model takes 32x32x3 RGB tiles instead of 32x32
+    #   grayscale, None detects it from the model input size
+    # intra_op_threads: threads used by one op of a session run, None lets
+    #   TensorFlow use every core (see predictor_pool for several sessions)
+    # graph: already loaded graph of frozen_graph_path, sessions can share it
+    self.skip_empty_tiles = skip_empty_tiles
+    self.tta_threshold = tta_threshold
+    self.stats = {'tiles': 0, 'tiles_skipped': 0, 'tiles_refined': 0}
+
     # Restore model using a frozen graph.
-    print("\t Loading model '%s'" % frozen_graph_path)
-    graph = load_graph(frozen_graph_path)
-    self.sess = tf.compat.v1.Session(graph=graph)
+    if graph is None:
+      print("\t Loading model '%s'" % frozen_graph_path)
+      graph = load_graph(frozen_graph_path)
+    config = None
+    if intra_op_threads:
+      # The graph is a chain of ops, one inter-op thread is enough
+      config = tf.compat.v1.ConfigProto(
+        intra_op_parallelism_threads=intra_op_threads,
+        inter_op_parallelism_threads=1)
+    self.sess = tf.compat.v1.Session(graph=graph, config=config)
 
     # Connect input/output pipes to model.
     self.x = graph.get_tensor_by_name('tcb/Input:0')
     self.keep_prob = graph.get_tensor_by_name('tcb/KeepProb:0')
     self.prediction = graph.get_tensor_by_name('tcb/prediction:0')
     self.probabilities = graph.get_tensor_by_name('tcb/probabilities:0')
+
+    # Grayscale models take 32*32 values per tile, color models 32*32*3
+    is_color_model = self.x.shape.as_list()[-1] == 32*32*3
+    if color is not None and color != is_color_model:
+      raise ValueError("Model '%s' takes %s tiles" % (
+        frozen_graph_path, 'color' if is_color_model else 'grayscale'))
+    self.color = is_color_model
     print("\t Model restored.")
 
-  def getPrediction(self, tiles):
-    """Run trained neural network on tiles generated from image"""
+  def getNetworkInput(self, tiles):
+    """Reshape tiles into 64xN rows of input data, format used by the neural
+    network, N = 1024 for 32x32x64 grayscale tiles, 3072 for 64x32x32x3 color"""
+    if self.color != (np.ndim(tiles) == 4):
+      raise ValueError("Model takes %s tiles" % ('color' if self.color else 'grayscale'))
+    if self.color:
+      return np.reshape(tiles, [64, 32*32*3])
+    return np.swapaxes(np.reshape(tiles, [32*32, 64]),0,1)
+
+  def findTilesInImage(self, img, **kwargs):
+    """Find chessboard in image, return (tiles, corners) in the format the
+    model takes, see chessboard_finder.find(Grayscale|Color)TilesInImage"""
+    if self.color:
+      return chessboard_finder.findColorTilesInImage(img, **kwargs)
+    return chessboard_finder.findGrayscaleTilesInImage(img, **kwargs)
+
+  def runNetwork(self, validation_set):
+    """Run neural network on Nx1024 (Nx3072 color) rows of tile data, return
+    Nx13 label probabilities"""
+    metrics.PREDICTOR_BATCH_SIZE.observe(len(validation_set))
+    with pipeline_timing.stage('session_run'):
+      return self.sess.run(self.probabilities,
+        feed_dict={self.x: validation_set, self.keep_prob: 1.0})
+
+  def getEmptyTiles(self, tiles):
+    """Boolean mask (A1-H8 order) of tiles that can skip the network"""
+    if not self.skip_empty_tiles:
+      return np.zeros(64, dtype=bool)
+    with pipeline_timing.stage('empty_tiles'):
+      if self.color:
+        tiles = chessboard_finder.getGrayTilesFromColor(tiles)
+      return getEmptyTileMask(tiles)
+
+  def combineProbabilities(self, empty, network_probabilities):
+    """Nx13 probabilities, certain ' ' labels for empty tiles and network
+    probabilities in order for the others"""
+    probabilities = np.zeros([empty.size, 13], dtype=np.float32)
+    probabilities[empty, 0] = 1.0
+    if network_probabilities is not None:
+      probabilities[~empty] = network_probabilities
+    self.stats['tiles'] += empty.size
+    self.stats['tiles_skipped'] += int(empty.sum())
+    return probabilities
+
+  def getTileProbabilities(self, tiles, tile_indices=None):
+    """Run trained neural network on tiles, return Nx13 label probabilities.
+    If tile_indices is given only those tiles (A1-H8 order) are evaluated"""
+    validation_set = self.getNetworkInput(tiles)
+    if tile_indices is None:
+      tile_indices = np.arange(64)
+    empty = self.getEmptyTiles(tiles)[tile_indices]
+
+    # Run neural network on the tiles that aren't confidently empty
+    network_probabilities = None
+    if not empty.all():
+      network_probabilities = self.runNetwork(
+        validation_set[np.asarray(tile_indices)[~empty]])
+    return self.combineProbabilities(empty, network_probabilities)
+
+  def getBatchTileProbabilities(self, tiles_list):
+    """Run the neural network once on the tiles of several boards, return a
+    list with the 64x13 label probabilities of each board"""
+    empties = [self.getEmptyTiles(tiles) for tiles in tiles_list]
+    validation_set = np.concatenate(
+      [self.getNetworkInput(tiles)[~empty]
+       for tiles, empty in zip(tiles_list, empties)])
+
+    network_probabilities = np.zeros([0, 13], dtype=np.float32)
+    if len(validation_set) > 0:
+      network_probabilities = self.runNetwork(validation_set)
+    # Split network output back per board by their number of non-empty tiles
+    splits = np.cumsum([(~empty).sum() for empty in empties])[:-1]
+    return [self.combineProbabilities(empty, board_probabilities)
+            for empty, board_probabilities in
+            zip(empties, np.split(network_probabilities, splits))]
+
+  def refineUncertainTiles(self, probabilities, img, corners):
+    """Re-run tiles less certain than tta_threshold on augmented crops of the
+    board (chessboard_finder.TTA_AUGMENTATIONS) in one batch, averaging their
+    probabilities with the original ones. img is the image the tiles were
+    cut from at corners. Grayscale models only"""
+    return self.refineBatchUncertainTiles([probabilities], [img], [corners])[0]
+
+  def refineBatchUncertainTiles(self, probabilities_list, imgs, corners_list):
+    """refineUncertainTiles of several boards with one session run for the
+    uncertain tiles of all of them"""
+    uncertain_list = [np.flatnonzero(probabilities.max(axis=1) < self.tta_threshold)
+                      for probabilities in probabilities_list]
+    if not any(uncertain.size for uncertain in uncertain_list):
+      return probabilities_list
+
+    with pipeline_timing.stage('tta'):
+      validation_sets = []
+      for img, corners, uncertain in zip(imgs, corners_list, uncertain_list):
+        if uncertain.size == 0:
+          continue
+        if img.mode != 'L':
+          img = img.convert('L')
+        augmented = chessboard_finder.getAugmentedChessTilesGray(
+          np.asarray(img, dtype=np.uint8), corners)
+        validation_sets.extend(np.swapaxes(np.reshape(tiles, [32*32, 64]),0,1)[uncertain]
+                               for tiles in augmented)
+      augmented_probabilities = self.runNetwork(np.concatenate(validation_sets))
+
+      # Split network output back per board, augmentations of a board in order
+      augmentations = len(chessboard_finder.TTA_AUGMENTATIONS)
+      refined = []
+      offset = 0
+      for probabilities, uncertain in zip(probabilities_list, uncertain_list):
+        if uncertain.size > 0:
+          board_probabilities = augmented_probabilities[
+            offset:offset + augmentations * uncertain.size].reshape(
+              [augmentations, uncertain.size, 13])
+          offset += augmentations * uncertain.size
+          probabilities = probabilities.copy()
+          probabilities[uncertain] = (probabilities[uncertain] +
+            board_probabilities.sum(axis=0)) / (augmentations + 1)
+        refined.append(probabilities)
+    self.stats['tiles_refined'] += sum(uncertain.size for uncertain in uncertain_list)
+    return refined
+
+  def getPrediction(self, tiles, img=None, corners=None):
+    """Run trained neural network on tiles generated from image, return FEN
+    and 8x8 tile certainties of the most probable legal position. Given the
+    image and corners the tiles came from, uncertain tiles are re-run with
+    test-time augmentation"""
     if tiles is None or len(tiles) == 0:
       print("Couldn't parse chessboard")
       return None, 0.0
-    
-    # Reshape into Nx1024 rows of input data, format used by neural network
-    validation_set = np.swapaxes(np.reshape(tiles, [32*32, 64]),0,1)
-
-    # Run neural network on data
-    guess_prob, guessed = self.sess.run(
-      [self.probabilities, self.prediction], 
-      feed_dict={self.x: validation_set, self.keep_prob: 1.0})
-    
-    # Prediction bounds
-    a = np.array(list(map(lambda x: x[0][x[1]], zip(guess_prob, guessed))))
-    tile_certainties = a.reshape([8,8])[::-1,:]
-
-    # Convert guess into FEN string
-    # guessed is tiles A1-H8 rank-order, so to make a FEN we just need to flip the files from 1-8 to 8-1
-    labelIndex2Name = lambda label_index: ' KQRBNPkqrbnp'[label_index]
-    pieceNames = list(map(lambda k: '1' if k == 0 else labelIndex2Name(k), guessed)) # exchange ' ' for '1' for FEN
-    fen = '/'.join([''.join(pieceNames[i*8:(i+1)*8]) for i in reversed(range(8))])
+    fen, tile_certainties, _ = self.getTopPredictions(tiles, img, corners, k=1)[0]
     return fen, tile_certainties
 
+  def getTopPredictions(self, tiles, img=None, corners=None, k=3, sideways=False):
+    """Return up to k (fen, 8x8 tile certainties, log probability) of the
+    most probable legal positions, best first. sideways boards are rotated
+    90 degrees, with ranks 1 and 8 on the left and right"""
+    guess_prob = self.getTileProbabilities(tiles)
+    if self.tta_threshold and img is not None and not self.color:
+      guess_prob = self.refineUncertainTiles(guess_prob, img, corners)
+    with pipeline_timing.stage('fen_encoding'):
+      return getLegalPredictionsFromProbabilities(guess_prob, k, sideways)
+
+  def getAllPredictions(self, img, k=1):
+    """Find every chessboard in img, ex. the diagrams of a book page, and
+    predict them with one neural network batch. Return list of (corners,
+    top k (fen, 8x8 tile certainties, log probability)) in reading order"""
+    boards = chessboard_finder.findAllGrayscaleTilesInImage(img)
+    if not boards:
+      return []
+    if self.color:
+      # Detection is on grayscale, cut the color tiles into one batch buffer
+      with pipeline_timing.stage('tile_extraction'):
+        img_rgb = np.asarray(img.convert('RGB'), dtype=np.uint8)
+        batch = chessboard_finder.allocateColorTileBatch(len(boards))
+        boards = [(chessboard_finder.getChessTilesColor(img_rgb, corners, out), corners)
+                  for (_, corners), out in zip(boards, batch)]
+    probabilities = self.getBatchTileProbabilities([tiles for tiles, _ in boards])
+    results = []
+    for (tiles, corners), guess_prob in zip(boards, probabilities):
+      if self.tta_threshold and not self.color:
+        guess_prob = self.refineUncertainTiles(guess_prob, img, corners)
+      with pipeline_timing.stage('fen_encoding'):
+        results.append((corners, getLegalPredictionsFromProbabilities(guess_prob, k)))
+    return results
+
   ## Wrapper for chessbot
-  def makePrediction(self, url):
-    """Try and return a FEN prediction and certainty for URL, return Nones otherwise"""
+  def makePrediction(self, url, prefilter=False):
+    """Try and return a FEN prediction and certainty for URL, return Nones otherwise.
+    With prefilter images without a periodic chessboard-like structure are
+    rejected before full chessboard detection"""
     img, url = helper_image_loading.loadImageFromURL(url, max_size_bytes=2000000)
     result = [None, None, None]
     
@@ -110,8 +285,8 @@ class ChessboardPredictor(object):
       print('Couldn\'t load URL: "%s"' % url)
       return result
 
-    # Resize image if too large
-    img = helper_image_loading.resizeAsNeeded(img)
+    # Resize image if too large, keeping the scale to map corners back
+    img, scale = helper_image_loading.resizeAsNeededWithScale(img)
 
     # Exit on failure if image was too large teo resize
     if img is None:
@@ -119,21 +294,22 @@ class ChessboardPredictor(object):
       return result
 
     # Look for chessboard in image, get corners and split chessboard into tiles
-    tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img)
+    tiles, corners = self.findTilesInImage(img, prefilter=prefilter)
 
     # Exit on failure to find chessboard in image
     if tiles is None:
       print('Couldn\'t find chessboard in image')
       return result
     
-    # Make prediction on input tiles
-    fen, tile_certainties = self.getPrediction(tiles)
+    # Make prediction on input tiles, re-running uncertain ones augmented
+    fen, tile_certainties = self.getPrediction(tiles, img, corners)
     
     # Use the worst case certainty as our final uncertainty score
     certainty = tile_certainties.min()
 
-    # Get visualize link
-    visualize_link = helper_image_loading.getVisualizeLink(corners, url)
+    # Get visualize link, corners in original image coordinates
+    visualize_link = helper_image_loading.getVisualizeLink(
+      helper_image_loading.scaleCornersToOriginal(corners, scale), url)
 
     # Update result and return
     result = [fen, certainty, visualize_link]
@@ -162,8 +338,14 @@ def main(args):
   # Resize image if too large
   # img = helper_image_loading.resizeAsNeeded(img)
 
+  if args.multi:
+    return mainMulti(args, img)
+
   # Look for chessboard in image, get corners and split chessboard into tiles
-  tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img)
+  if args.color:
+    tiles, corners = chessboard_finder.findColorTilesInImage(img)
+  else:
+    tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img)
 
   # Exit on failure to find chessboard in image
   if tiles is None:
@@ -180,8 +362,9 @@ def main(args):
     print("\n--- Prediction on file %s ---" % args.filepath)
   
   # Initialize predictor, takes a while, but only needed once
-  predictor = ChessboardPredictor()
-  fen, tile_certainties = predictor.getPrediction(tiles)
+  predictor = ChessboardPredictor(args.model, skip_empty_tiles=args.skip_empty,
+                                  tta_threshold=args.tta_threshold, color=args.color)
+  fen, tile_certainties = predictor.getPrediction(tiles, img, corners)
   predictor.close()
   if args.unflip:
       fen = unflipFEN(fen)
@@ -198,6 +381,23 @@ def main(args):
   print("---\nPredicted FEN:\n%s %s - - 0 1" % (short_fen, active))
   print("Final Certainty: %.1f%%" % (certainty*100))
 
+def mainMulti(args, img):
+  """Predict every chessboard found in the image"""
+  predictor = ChessboardPredictor(args.model, skip_empty_tiles=args.skip_empty,
+                                  tta_threshold=args.tta_threshold, color=args.color)
+  results = predictor.getAllPredictions(img)
+  predictor.close()
+  if not results:
+    raise Exception('Couldn\'t find chessboard in image')
+
+  print("\n--- Found %d chessboards ---" % len(results))
+  for i, (corners, predictions) in enumerate(results):
+    fen, tile_certainties, _ = predictions[0]
+    if args.unflip:
+      fen = unflipFEN(fen)
+    print("%d. corners %s\n   %s %s - - 0 1 (certainty %.1f%%)" % (
+      i + 1, corners, shortenFEN(fen), args.active, tile_certainties.min()*100))
+
 if __name__ == '__main__':
   np.set_printoptions(suppress=True, precision=3)
   import argparse
@@ -206,6 +406,15 @@ if __name__ == '__main__':
   parser.add_argument('--filepath', help='filepath to image (ex. u4zF5Hj.png)')
   parser.add_argument('--unflip', default=False, action='store_true', help='revert the image of a flipped chessboard')
   parser.add_argument('--active', default='w')
+  parser.add_argument('--skip-empty', default=False, action='store_true',
+                      help='skip the neural network on tiles found confidently empty (see benchmark_empty_tiles.py)')
+  parser.add_argument('--tta-threshold', default=0.9, type=float,
+                      help='re-run tiles below this certainty on augmented crops, 0 to disable')
+  parser.add_argument('--model', default='saved_models/frozen_graph.pb', help='frozen graph of the model')
+  parser.add_argument('--color', default=False, action='store_true',
+    help='use RGB tiles, for models trained on color tiles')
+  parser.add_argument('--multi', default=False, action='store_true',
+                      help='predict every chessboard in the image, ex. a book page of diagrams')
   args = parser.parse_args()
   main(args)
 
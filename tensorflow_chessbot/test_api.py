@@ -6,7 +6,10 @@ Tests that the API server can start and process a simple request
 
 import requests
 import sys
+import io
+import json
 import time
+import zipfile
 from pathlib import Path
 
 # API endpoint
@@ -80,6 +83,9 @@ def test_analyze_with_sample():
             print(f"  FEN: {result.get('fen', 'N/A')}")
             print(f"  Pieces detected: {result.get('pieces_detected', 'N/A')}")
             print(f"  Certainty: {result.get('certainty', 'N/A')}%")
+            for alternative in result.get('alternatives', [])[1:]:
+                print(f"  Alternative: {alternative['fen']} "
+                      f"({alternative['relative_probability']:.2%} as likely)")
             return True
         else:
             print(f"✗ Analysis failed with status {response.status_code}")
@@ -93,6 +99,52 @@ def test_analyze_with_sample():
         print(f"✗ Error: {e}")
         return False
 
+def test_analyze_batch():
+    """Test the batch endpoint with a zip of sample images plus a broken file"""
+    print("\nTesting analyze_batch endpoint...")
+    
+    sample = Path(__file__).parent / "example_input.png"
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as z:
+        for i in range(3):
+            z.writestr(f"boards/{i}.png", sample.read_bytes())
+        z.writestr("boards/broken.png", b"not an image")
+    
+    try:
+        response = requests.post(
+            f"{API_URL}/analyze_batch",
+            files=[('files', ('boards.zip', archive.getvalue(), 'application/zip')),
+                   ('files', (sample.name, sample.read_bytes(), 'image/png'))],
+            stream=True,
+            timeout=120
+        )
+        if response.status_code != 200:
+            print(f"✗ Batch analysis failed with status {response.status_code}")
+            print(f"  Response: {response.text}")
+            return False
+        
+        # Results arrive as NDJSON lines while the batch is processed
+        results = [json.loads(line) for line in response.iter_lines() if line]
+        summary = results.pop()["summary"]
+        for result in sorted(results, key=lambda r: r["index"]):
+            status = result.get("fen") if result["success"] else result["error"]
+            print(f"  [{result['index']}] {result['name']}: {status}")
+        print(f"  Summary: {summary}")
+        
+        # Only the broken file should fail
+        if summary == {"total": 5, "succeeded": 4, "failed": 1}:
+            print("✓ Batch analysis successful!")
+            return True
+        print("✗ Unexpected batch summary")
+        return False
+    
+    except requests.exceptions.Timeout:
+        print("✗ Request timed out (>120s)")
+        return False
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        return False
+
 def main():
     print("=" * 60)
     print("TensorFlow Chessbot API Test")
@@ -112,6 +164,7 @@ def main():
     response = input("Do you want to test image analysis? (y/n): ")
     if response.lower() == 'y':
         test_analyze_with_sample()
+        test_analyze_batch()
     
     print()
     print("=" * 60)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Test script for the concurrent reddit chessbot (chessbot.runStream)
+Feeds a local fake PRAW submission stream through the worker pool and the
+rate-limited reply queue, using a predictor that only sleeps, and checks
+that every chessboard submission gets exactly one reply, also with the
+SQLite reply index backfilled from the bot's comment history
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+import threading
+
+import chessbot
+from bot_workers import getRatelimitDelay
+from cfb_helpers import ReplyIndex
+from predictor_pool import PredictorPool
+
+FEN = '1111k111/11111111/11111111/11111111/11111111/11111111/11111111/1111K111'
+
+class FakeCommentListing(object):
+    def __init__(self):
+        self.comments = []
+        self.pages = 0
+
+    def new(self, limit=None):
+        """Newest first in pages of 100 like a PRAW ListingGenerator"""
+        comments = self.comments[::-1][:limit]
+        for start in range(0, len(comments), 100):
+            self.pages += 1
+            for comment in comments[start:start + 100]:
+                yield comment
+
+class FakeAuthor(object):
+    def __init__(self, name):
+        self.name = name
+        self.comments = FakeCommentListing()
+
+class FakeComment(object):
+    def __init__(self, author, submission_id=None):
+        self.author = author
+        self.link_id = 't3_%s' % submission_id
+        self.created_utc = time.time()
+
+class RatelimitItem(object):
+    error_type = 'RATELIMIT'
+    message = "Looks like you've been doing that a lot. Take a break for 1 second"
+
+class FakeRatelimit(Exception):
+    """Shaped like praw's RedditAPIException"""
+    def __init__(self):
+        super().__init__('RATELIMIT')
+        self.items = [RatelimitItem()]
+
+class FakeSubmission(object):
+    def __init__(self, id, url, title='White to play', comments=(), ratelimits=0):
+        self.id = id
+        self.url = url
+        self.title = title
+        self._comments = list(comments)
+        self.comment_scans = 0 # Comment tree fetches
+        self.ratelimits = ratelimits # Replies failing with RATELIMIT first
+        self.replies = []
+        self.reply_times = []
+
+    @property
+    def comments(self):
+        self.comment_scans += 1
+        return self._comments
+
+    def reply(self, text):
+        if self.ratelimits > 0:
+            self.ratelimits -= 1
+            raise FakeRatelimit()
+        self.replies.append(text)
+        self.reply_times.append(time.time())
+
+class FakeSubredditStream(object):
+    def __init__(self, submissions, delay):
+        self._submissions = submissions
+        self.delay = delay
+
+    def submissions(self):
+        for submission in self._submissions:
+            time.sleep(self.delay)
+            yield submission
+
+class FakeSubreddit(object):
+    def __init__(self, submissions, delay=0.001):
+        self.stream = FakeSubredditStream(submissions, delay)
+
+class FakePredictor(object):
+    """Sleeps like a download plus inference, tracks concurrency"""
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def makePrediction(self, url, prefilter=False):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+        if 'noboard' in url:
+            return None, None, None
+        return FEN, 0.99, 'http://example.com/visualize'
+
+def make_submissions(n, me):
+    """Mix of chessboard images, other links, failed boards and a post
+    already answered by the bot"""
+    submissions = []
+    for i in range(n):
+        kind = i % 5
+        if kind == 0:
+            submissions.append(FakeSubmission('s%d' % i, 'https://example.com/page.html'))
+        elif kind == 1:
+            submissions.append(FakeSubmission('s%d' % i, 'https://example.com/noboard%d.png' % i))
+        else:
+            submissions.append(FakeSubmission('s%d' % i, 'https://i.imgur.com/%d.png' % i))
+    submissions[2]._comments.append(FakeComment(me, submissions[2].id))
+    submissions[3].ratelimits = 1
+    # Streams may yield a submission again after reconnecting
+    submissions.append(submissions[4])
+    return submissions
+
+def run(me, workers, n, latency, reply_interval, index=None, submissions=None):
+    submissions = submissions or make_submissions(n, me)
+    predictor = FakePredictor(latency)
+    # Every pool slot is the same fake, tracking concurrency across the pool
+    predictors = PredictorPool(size=workers, name='chessbot', factory=lambda: predictor)
+    args = argparse.Namespace(dry=False, workers=workers, reply_interval=reply_interval)
+    start = time.time()
+    chessbot.runStream(FakeSubreddit(submissions), me, predictors, args, index)
+    return submissions, predictor, time.time() - start
+
+def check_replies(submissions, me, reply_interval):
+    """Return list of problems found in the replies"""
+    problems = []
+    for submission in set(submissions):
+        expected = (chessbot.isPotentialChessboardTopic(submission)
+                    and 'noboard' not in submission.url
+                    and not any(c.author == me for c in submission._comments))
+        if len(submission.replies) != int(expected):
+            problems.append('%s got %d replies, expected %d' % (
+                submission.id, len(submission.replies), int(expected)))
+        if submission.ratelimits:
+            problems.append('%s rate limit not retried' % submission.id)
+    times = sorted(t for s in set(submissions) for t in s.reply_times)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    if gaps and min(gaps) < reply_interval * 0.95:
+        problems.append('replies %.3fs apart, interval is %.3fs' % (
+            min(gaps), reply_interval))
+    return problems
+
+def check_ratelimit_delay():
+    """RATELIMIT messages are parsed to a wait in seconds"""
+    print("Testing rate limit parsing...")
+    cases = [(FakeRatelimit(), 1), (ValueError('boom'), None)]
+    item = RatelimitItem()
+    item.message = 'you are doing that too much. try again in 9 minutes.'
+    error = FakeRatelimit()
+    error.items = [item]
+    cases.append((error, 600))
+    ok = True
+    for error, expected in cases:
+        delay = getRatelimitDelay(error)
+        if delay != expected:
+            print(f"✗ {error!r}: got {delay}, expected {expected}")
+            ok = False
+    if ok:
+        print("✓ Rate limit delays parsed")
+    return ok
+
+def check_stream(workers, n, latency, reply_interval, baseline_s=None):
+    print(f"\nTesting fake stream with {workers} workers...")
+    me = FakeAuthor('ChessFenBot')
+    submissions, predictor, elapsed = run(me, workers, n, latency, reply_interval)
+    problems = check_replies(submissions, me, reply_interval)
+    for problem in problems:
+        print(f"✗ {problem}")
+    print(f"  {n} submissions in {elapsed:.2f}s, "
+          f"max concurrent predictions {predictor.max_active}")
+    if baseline_s is not None:
+        print(f"  Speedup over 1 worker: {baseline_s / elapsed:.1f}x")
+    if not problems:
+        print("✓ Every chessboard submission replied to exactly once")
+    return not problems, elapsed
+
+def check_reply_index(n, latency, reply_interval, workers):
+    """Backfilled index answers every lookup without fetching comments, and
+    persists replies so a restarted bot does nothing twice"""
+    print("\nTesting reply index...")
+    me = FakeAuthor('ChessFenBot')
+    submissions = make_submissions(n, me)
+    # Bot history: the comment on submissions[2] plus older unrelated ones
+    me.comments.comments = [FakeComment(me, 'old%d' % i) for i in range(250)]
+    me.comments.comments.append(FakeComment(me, submissions[2].id))
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'replied.db')
+        index = ReplyIndex(path)
+        count = index.backfill(me)
+        print(f"  Backfilled {count} comments in {me.comments.pages} pages")
+        run(me, workers, n, latency, reply_interval, index, submissions)
+        index.close()
+
+        problems = check_replies(submissions, me, reply_interval)
+        scans = sum(s.comment_scans for s in set(submissions))
+        if scans:
+            problems.append('%d comment tree fetches with a warm index' % scans)
+
+        # Restart on the same stream, replies and no-fen are both remembered
+        index = ReplyIndex(path)
+        _, predictor, _ = run(me, workers, n, latency, reply_interval, index, submissions)
+        index.close()
+        if predictor.max_active:
+            problems.append('restarted bot predicted already processed submissions')
+        problems += check_replies(submissions, me, reply_interval)
+
+    for problem in problems:
+        print(f"✗ {problem}")
+        ok = False
+    if ok:
+        print("✓ No comment scans, no repeated work after restart")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Test the concurrent chessbot on a fake stream')
+    parser.add_argument('--submissions', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='seconds per fake prediction')
+    parser.add_argument('--reply-interval', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Chessbot Worker Pool Test")
+    print("=" * 50)
+
+    results = [check_ratelimit_delay()]
+    ok, baseline_s = check_stream(1, args.submissions, args.latency, args.reply_interval)
+    results.append(ok)
+    ok, _ = check_stream(args.workers, args.submissions, args.latency,
+                        args.reply_interval, baseline_s)
+    results.append(ok)
+    results.append(check_reply_index(args.submissions, args.latency,
+                                    args.reply_interval, args.workers))
+
+    print("\n" + "=" * 50)
+    if all(results):
+        print("✓ All tests passed!")
+        return 0
+    print("✗ Some tests failed")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
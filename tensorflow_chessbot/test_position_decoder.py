@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test script for the legal-position decoder (position_decoder.py)
+Builds tile probabilities with impossible argmax positions (extra and
+missing kings, pawns on the back rank, too many pawns) and checks the
+decoded positions are legal, scored best first, and match a brute force
+search when only a few tiles are uncertain
+"""
+
+import sys
+import time
+import itertools
+
+import numpy as np
+
+from position_decoder import getLegalPredictions, getBackRankMask, isLegalPosition
+from helper_functions import getPredictionFromLabels
+
+# Start position in A1-H8 tile order, label indices of ' KQRBNPkqrbnp'
+START = np.array([3, 5, 4, 2, 1, 4, 5, 3] + [6] * 8 + [0] * 32 +
+                 [12] * 8 + [9, 11, 10, 8, 7, 10, 11, 9])
+
+def certain_probabilities(labels, certainty=0.98):
+    probabilities = np.full([64, 13], (1 - certainty) / 12)
+    probabilities[np.arange(64), labels] = certainty
+    return probabilities
+
+def check(name, ok, detail=''):
+    print(f"{'✓' if ok else '✗'} {name}{': ' + detail if detail else ''}")
+    return ok
+
+def check_violations():
+    """Impossible argmax positions decode to the cheapest legal fix"""
+    print("Testing impossible argmax positions...")
+    results = []
+
+    # Third king on e4 and a fourth on g4, less likely empty, a third white
+    # knight would be a promoted piece with all 8 pawns on the board
+    labels = START.copy()
+    labels[[28, 30]] = 1
+    probabilities = certain_probabilities(labels)
+    probabilities[28, 0] = 0.2
+    probabilities[30, [0, 5]] = [0.2, 0.3]
+    decoded, _ = getLegalPredictions(probabilities)[0]
+    results.append(check('Extra white kings removed', decoded[28] == 0 and decoded[30] == 0
+                         and decoded[4] == 1))
+
+    # Black king occluded, most likely found on its square anyway
+    labels = START.copy()
+    labels[60] = 0
+    probabilities = certain_probabilities(labels)
+    probabilities[60, 7] = 0.01
+    probabilities[59, 7] = 0.001
+    decoded, _ = getLegalPredictions(probabilities)[0]
+    results.append(check('Missing black king restored', decoded[60] == 7))
+
+    # Rook on a1 mistaken for a pawn
+    labels = START.copy()
+    labels[0] = 6
+    decoded, _ = getLegalPredictions(certain_probabilities(labels))[0]
+    results.append(check('No pawn on the back rank', decoded[0] != 6))
+
+    # Same on a board with white on the left, ranks 1 and 8 are image columns
+    labels = np.zeros(64, dtype=int)
+    labels[[0, 63, 9]] = [1, 7, 6]
+    probabilities = certain_probabilities(labels)
+    decoded, _ = getLegalPredictions(probabilities, sideways=True)[0]
+    results.append(check('Sideways back ranks', decoded[9] == 6 and
+                         getLegalPredictions(probabilities)[0][0][9] == 6))
+    labels[8] = 6
+    decoded, _ = getLegalPredictions(certain_probabilities(labels), sideways=True)[0]
+    results.append(check('No pawn on a sideways back rank', decoded[8] != 6))
+
+    # Nine white pawns
+    labels = START.copy()
+    labels[20] = 6
+    probabilities = certain_probabilities(labels)
+    probabilities[20, 0] = 0.1
+    decoded, _ = getLegalPredictions(probabilities)[0]
+    results.append(check('At most 8 pawns', (decoded == 6).sum() == 8
+                         and isLegalPosition(decoded)))
+
+    # FEN and certainties follow the decoded labels
+    fen, tile_certainties = getPredictionFromLabels(probabilities, decoded)
+    results.append(check('FEN of decoded position', fen.count('P') == 8 and
+                         np.isclose(tile_certainties.min(), 0.1)))
+    return all(results)
+
+def brute_force(probabilities, labels, tiles, k, sideways=False):
+    """Log probabilities of the k best legal positions changing only tiles"""
+    log_prob = np.log(np.clip(probabilities, 1e-12, 1.0))
+    scores = []
+    for combination in itertools.product(range(13), repeat=len(tiles)):
+        candidate = labels.copy()
+        candidate[tiles] = combination
+        if isLegalPosition(candidate, sideways):
+            scores.append(log_prob[np.arange(64), candidate].sum())
+    return sorted(scores, reverse=True)[:k]
+
+def check_top_k(trials):
+    """Top-k scores match a brute force search over the uncertain tiles"""
+    print("\nTesting top-k against brute force...")
+    rng = np.random.default_rng(0)
+    mismatches = 0
+    for _ in range(trials):
+        probabilities = certain_probabilities(START, 1.0)
+        tiles = rng.choice(64, 4, replace=False)
+        for tile in tiles:
+            probabilities[tile] = rng.dirichlet(np.full(13, 0.5))
+        expected = brute_force(probabilities, START, tiles, 3)
+        decoded = getLegalPredictions(probabilities, k=3, max_cost=20, max_labels=13)
+        scores = [score for _, score in decoded]
+        if not np.allclose(scores, expected) or not all(isLegalPosition(l) for l, _ in decoded):
+            mismatches += 1
+    return check('Top-3 legal positions exact', mismatches == 0,
+                 f"{trials - mismatches}/{trials} boards")
+
+def check_speed(repeats):
+    """The common legal case is a single pass, uncertain boards stay fast"""
+    print("\nTesting decoding time...")
+    probabilities = certain_probabilities(START)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        getLegalPredictions(probabilities)
+    legal_ms = (time.perf_counter() - start) / repeats * 1000
+
+    # Network-like confusions, the true label and two others share each
+    # uncertain tile
+    rng = np.random.default_rng(1)
+    for tile in rng.choice(64, 8, replace=False):
+        labels = [START[tile]] + list(rng.choice(13, 2, replace=False))
+        probabilities[tile] = 0.001
+        probabilities[tile, labels] = rng.dirichlet(np.ones(3))
+    start = time.perf_counter()
+    for _ in range(repeats // 10):
+        getLegalPredictions(probabilities, k=5)
+    top_k_ms = (time.perf_counter() - start) / (repeats // 10) * 1000
+    return check('Decoding time', legal_ms < 1 and top_k_ms < 20,
+                 f"{legal_ms:.3f} ms legal argmax, {top_k_ms:.2f} ms top-5 with 8 uncertain tiles")
+
+def main():
+    print("=" * 50)
+    print("Legal Position Decoder Test")
+    print("=" * 50)
+
+    results = [check_violations(), check_top_k(30), check_speed(1000)]
+
+    print("\n" + "=" * 50)
+    if all(results):
+        print("✓ All tests passed!")
+        return 0
+    print("✗ Some tests failed")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
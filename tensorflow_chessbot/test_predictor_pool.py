@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for the predictor session pool (predictor_pool)
+Hammers a pool of fake predictors from many threads and checks that a
+predictor is never used by two threads at once, that every predictor is
+checked back in (also when a request raises), that checkouts time out and
+that throughput scales with the pool size. With a model available the same
+is run on real TensorFlow sessions, comparing FENs with a serial run
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from predictor_pool import PredictorPool, PoolTimeout
+
+class FakePredictor(object):
+    """Sleeps like a session run, records overlapping use of one instance"""
+    def __init__(self, latency, tracker):
+        self.latency = latency
+        self.tracker = tracker
+        self.busy = False
+        self.stats = {'tiles': 0}
+        self.closed = False
+
+    def getPrediction(self, tiles, img=None, corners=None):
+        if self.busy:
+            self.tracker.overlaps += 1
+        self.busy = True
+        self.tracker.enter()
+        time.sleep(self.latency)
+        self.tracker.leave()
+        self.busy = False
+        self.stats['tiles'] += 64
+        return tiles, None
+
+    def close(self):
+        self.closed = True
+
+class ConcurrencyTracker(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.overlaps = 0
+
+    def enter(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def leave(self):
+        with self.lock:
+            self.active -= 1
+
+def make_pool(name, size, latency, tracker):
+    return PredictorPool(size=size, name=name,
+                         factory=lambda: FakePredictor(latency, tracker))
+
+def run_requests(pool, threads, requests, timeout=None):
+    """Run requests predictions from threads threads, return seconds taken"""
+    def request(i):
+        with pool.predictor(timeout) as predictor:
+            fen, _ = predictor.getPrediction(i)
+        return fen == i
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(request, range(requests)))
+    elapsed = time.time() - start
+    if not all(results):
+        raise AssertionError("Prediction returned for another request")
+    return elapsed
+
+def check_exclusive_checkout(size, threads, requests, latency):
+    """Every predictor is used by one thread at a time and checked back in"""
+    print(f"\nTesting {threads} threads on a pool of {size}, {requests} requests...")
+    tracker = ConcurrencyTracker()
+    pool = make_pool('stress', size, latency, tracker)
+    run_requests(pool, threads, requests)
+
+    problems = []
+    if tracker.overlaps:
+        problems.append(f"{tracker.overlaps} overlapping uses of one predictor")
+    if tracker.max_active > size:
+        problems.append(f"{tracker.max_active} concurrent runs on a pool of {size}")
+    if pool.available.qsize() != size:
+        problems.append(f"{size - pool.available.qsize()} predictors not checked in")
+    if pool.getStats()['tiles'] != requests * 64:
+        problems.append(f"pool stats count {pool.getStats()['tiles'] // 64} requests")
+    in_use = metrics.PREDICTOR_POOL_IN_USE.labels(pool='stress').value
+    if in_use != 0:
+        problems.append(f"in use gauge is {in_use} after all requests")
+    waits = metrics.PREDICTOR_POOL_WAIT.labels(pool='stress')
+    if sum(waits.counts) != requests:
+        problems.append(f"{sum(waits.counts)} wait times recorded for {requests} requests")
+
+    pool.close()
+    if not all(predictor.closed for predictor in pool.predictors):
+        problems.append("close() left predictors open")
+
+    for problem in problems:
+        print(f"✗ {problem}")
+    if problems:
+        return False
+    print(f"✓ No shared use, at most {tracker.max_active} concurrent runs, "
+          f"mean wait {waits.sum / requests * 1000:.1f} ms")
+    return True
+
+def check_throughput_scaling(size, threads, requests, latency):
+    """A pool of size sessions serves concurrent requests about size times
+    faster than a single session"""
+    print(f"\nTesting throughput of a pool of {size} against a pool of 1...")
+    single_s = run_requests(make_pool('single', 1, latency, ConcurrencyTracker()),
+                            threads, requests)
+    pooled_s = run_requests(make_pool('pooled', size, latency, ConcurrencyTracker()),
+                            threads, requests)
+    speedup = single_s / pooled_s
+    print(f"  1 session: {requests / single_s:.1f} req/s, "
+          f"{size} sessions: {requests / pooled_s:.1f} req/s ({speedup:.2f}x)")
+    if speedup < 0.75 * min(size, threads):
+        print(f"✗ Expected close to {min(size, threads)}x")
+        return False
+    print("✓ Throughput scales with the pool size")
+    return True
+
+def check_timeout_and_errors(latency):
+    """Checkouts give up after their timeout, failing requests check in"""
+    print("\nTesting checkout timeout and check in on errors...")
+    pool = make_pool('timeout', 1, latency, ConcurrencyTracker())
+    ok = True
+
+    predictor = pool.checkout()
+    start = time.time()
+    try:
+        pool.checkout(timeout=0.05)
+        print("✗ Checkout of an empty pool did not time out")
+        ok = False
+    except PoolTimeout:
+        waited = time.time() - start
+        if not 0.04 <= waited < 0.5:
+            print(f"✗ Timed out after {waited:.3f}s, expected 0.05s")
+            ok = False
+    pool.checkin(predictor)
+    if metrics.PREDICTOR_POOL_TIMEOUTS.labels(pool='timeout').value != 1:
+        print("✗ Timeout not counted")
+        ok = False
+
+    try:
+        with pool.predictor() as predictor:
+            raise RuntimeError("request failed")
+    except RuntimeError:
+        pass
+    if pool.available.qsize() != 1:
+        print("✗ Predictor not checked in after an exception")
+        ok = False
+
+    try:
+        pool.checkin(FakePredictor(latency, ConcurrencyTracker()))
+        print("✗ Checked in a predictor of another pool")
+        ok = False
+    except ValueError:
+        pass
+
+    if ok:
+        print("✓ Timeouts, errors and foreign predictors handled")
+    return ok
+
+def check_real_model(model_path, size, threads, requests):
+    """Concurrent predictions on real sessions match a serial run"""
+    print(f"\nTesting {threads} threads on {size} TensorFlow sessions...")
+    import chessboard_finder
+    import helper_image_loading
+    img = helper_image_loading.loadImageFromPath(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'example_input.png'))
+    tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img)
+
+    pool = PredictorPool(model_path, size, name='model')
+    with pool.predictor() as predictor:
+        expected = predictor.getPrediction(tiles, img, corners)[0]
+
+    def request(i):
+        with pool.predictor() as predictor:
+            return predictor.getPrediction(tiles, img, corners)[0]
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        fens = list(executor.map(request, range(requests)))
+    elapsed = time.time() - start
+    pool.close()
+
+    mismatches = sum(fen != expected for fen in fens)
+    print(f"  {requests / elapsed:.1f} boards/s, {pool.intra_op_threads} "
+          f"intra-op threads per session")
+    if mismatches:
+        print(f"✗ {mismatches} of {requests} FENs differ from the serial prediction")
+        return False
+    print("✓ Concurrent FENs match the serial prediction")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress test the predictor session pool')
+    parser.add_argument('--size', type=int, default=4, help='predictor sessions')
+    parser.add_argument('--threads', type=int, default=16, help='request threads')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='seconds per fake prediction')
+    parser.add_argument('--model', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'saved_models/frozen_graph.pb'))
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Predictor Pool Test")
+    print("=" * 50)
+
+    results = [
+        check_exclusive_checkout(args.size, args.threads, args.requests, args.latency),
+        check_throughput_scaling(args.size, args.threads, args.requests // 2, args.latency),
+        check_timeout_and_errors(args.latency),
+    ]
+    if os.path.exists(args.model):
+        results.append(check_real_model(args.model, args.size, args.threads,
+                                       args.requests // 4))
+    else:
+        print(f"\nModel not found at {args.model}, skipping TensorFlow sessions test")
+
+    print("\n" + "=" * 50)
+    if all(results):
+        print("✓ All tests passed!")
+        return 0
+    print("✗ Some tests failed")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test script for the pre-download gate of helper_image_loading.loadImageFromURL
+Serves images and non-images from a local HTTP stand-in and checks that
+oversize and non-image urls are skipped from HEAD headers or the first
+bytes of the image header, without the client pulling the whole body
+"""
+
+import io
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.request import urlopen
+
+import numpy as np
+import PIL.Image
+
+import helper_image_loading
+
+CHUNK_BYTES = 16 * 1024
+
+def png_bytes(width, height, noise=False):
+    if noise:
+        arr = np.random.default_rng(0).integers(0, 256, size=(height, width), dtype=np.uint8)
+    else:
+        arr = np.full((height, width), 128, dtype=np.uint8)
+    buf = io.BytesIO()
+    PIL.Image.fromarray(arr).save(buf, 'PNG')
+    return buf.getvalue()
+
+# path: (content type, body, HEAD supported, Content-Length sent)
+ROUTES = {
+    '/board.png': ('image/png', open('example_input.png', 'rb').read(), True, True),
+    '/page.html': ('text/html', b'<html>' + b'x' * 500000 + b'</html>', True, True),
+    # Reported length above the limit, body never needed
+    '/huge.jpg': ('image/jpeg', png_bytes(2000, 2000, noise=True), True, True),
+    # Small enough in bytes but too large in pixels, only visible in the header
+    '/wide.png': ('image/png', png_bytes(13000, 400, noise=True), True, True),
+    # No HEAD support nor Content-Length, generic type, not an image
+    '/nohead.bin': ('application/octet-stream', b'not an image' * 100, False, False),
+    # No HEAD support, valid image
+    '/nohead.png': ('image/png', png_bytes(800, 600), False, False),
+}
+
+class Counter(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.received = {}
+
+    def add(self, path, method):
+        with self.lock:
+            self.requests.setdefault(path, []).append(method)
+
+    def receive(self, url, size):
+        with self.lock:
+            self.received[url] = self.received.get(url, 0) + size
+
+COUNTER = Counter()
+
+class CountingResponse(object):
+    """Response wrapper counting body bytes the client reads, loopback socket
+    buffers absorb megabytes so bytes written by the server tell nothing"""
+    def __init__(self, con, url):
+        self.con = con
+        self.url = url
+        self.headers = con.headers
+
+    def read(self, size=-1):
+        data = self.con.read(size)
+        COUNTER.receive(self.url, len(data))
+        return data
+
+    def close(self):
+        self.con.close()
+
+def counting_urlopen(req, *args, **kwargs):
+    return CountingResponse(urlopen(req, *args, **kwargs), req.full_url)
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send_headers(self, route):
+        content_type, body, _, send_length = route
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        if send_length:
+            length = 50 * 1024 * 1024 if self.path == '/huge.jpg' else len(body)
+            self.send_header('Content-Length', str(length))
+        self.end_headers()
+
+    def do_HEAD(self):
+        route = ROUTES.get(self.path)
+        COUNTER.add(self.path, 'HEAD')
+        if route is None or not route[2]:
+            self.send_error(405 if route else 404)
+            return
+        self.send_headers(route)
+
+    def do_GET(self):
+        route = ROUTES.get(self.path)
+        COUNTER.add(self.path, 'GET')
+        if route is None:
+            self.send_error(404)
+            return
+        self.send_headers(route)
+        body = route[1]
+        try:
+            # Stream in chunks so an early close stops the transfer
+            for start in range(0, len(body), CHUNK_BYTES):
+                self.wfile.write(body[start:start + CHUNK_BYTES])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def check(name, ok, detail=''):
+    print(f"{'✓' if ok else '✗'} {name}{': ' + detail if detail else ''}")
+    return ok
+
+def main():
+    print("=" * 50)
+    print("URL Pre-download Gate Test")
+    print("=" * 50)
+
+    server = StandInServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    max_bytes = 8 * 1024 * 1024
+    helper_image_loading.urlopen = counting_urlopen
+
+    def load(path):
+        img, _ = helper_image_loading.loadImageFromURL(base + path, max_size_bytes=max_bytes)
+        return img
+
+    results = []
+    img = load('/board.png')
+    results.append(check('Image loaded', img is not None,
+                         f"{img.size if img else None}"))
+
+    results.append(check('Non-image skipped from HEAD', load('/page.html') is None
+                         and COUNTER.requests['/page.html'] == ['HEAD']))
+
+    results.append(check('Oversize Content-Length skipped from HEAD',
+                         load('/huge.jpg') is None
+                         and COUNTER.requests['/huge.jpg'] == ['HEAD']))
+
+    wide_size = len(ROUTES['/wide.png'][1])
+    wide_img = load('/wide.png')
+    received = COUNTER.received.get(base + '/wide.png', 0)
+    results.append(check('Oversize dimensions skipped from image header',
+                         wide_img is None
+                         and received <= helper_image_loading.URL_HEADER_BYTES,
+                         f"{received} of {wide_size} bytes read"))
+
+    results.append(check('Non-image without HEAD skipped from content',
+                         load('/nohead.bin') is None))
+
+    img = load('/nohead.png')
+    results.append(check('Image without HEAD support loaded', img is not None
+                         and COUNTER.requests['/nohead.png'] == ['HEAD', 'GET']))
+
+    results.append(check('Missing url fails cleanly', load('/missing.png') is None))
+
+    server.shutdown()
+    print("\n" + "=" * 50)
+    if all(results):
+        print("✓ All tests passed!")
+        return 0
+    print("✗ Some tests failed")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
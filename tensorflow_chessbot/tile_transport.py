@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Shared-memory transport of chessboard tiles from detection worker processes
+# to the inference process.
+#
+# Returning a 32x32x64 float32 tile stack (256 KB) from a worker through a
+# process pool or queue pickles and copies it through a pipe for every board.
+# Tiles are cut from uint8 pixels, so they are stored losslessly as uint8
+# (64 KB) in the fixed slots of a multiprocessing.shared_memory ring and only
+# slot indices cross process boundaries, ex. in the result of a process pool
+# task or through a queue of the caller:
+#
+#   ring = TileRing(slots=64)      # inference process, before the workers
+#   ...                            # workers get ring at process start
+#   slot = ring.acquire(timeout)   # worker, blocks while every slot is taken
+#   ring.write(slot, tiles)        # then send slot to the inference process
+#   ...
+#   tiles = ring.view(slot)        # inference process, uint8 tiles, no copy
+#   ...
+#   ring.release(slot)             # slot recycled for the workers
+#
+# Free slots are handed out in ring order, a slot belongs to whoever acquired
+# it until it is released, every acquired slot must be released exactly once.
+# With all slots taken acquire blocks the workers (backpressure) instead of
+# queueing more boards.
+#
+# Free slot indices travel through a pipe written directly by the releasing
+# process (SimpleQueue, no feeder thread per message), a semaphore counting
+# the free slots provides the acquire timeout.
+import sys
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+TILES_SHAPE = (32, 32, 64)
+SLOT_BYTES = 32 * 32 * 64
+
+class SlotTimeout(Exception):
+  """No slot of the ring was released within the acquire timeout"""
+
+class TileRing(object):
+  """Fixed slots of uint8 tiles in shared memory with a queue of free slot
+  indices. Pass it to worker processes at process start (Process args or
+  pool initializer), it attaches to the same memory"""
+  def __init__(self, slots=64, context=None):
+    context = context or multiprocessing.get_context()
+    self.slots = slots
+    self.shm = shared_memory.SharedMemory(create=True, size=slots * SLOT_BYTES)
+    self.owner = True
+    self.free = context.SimpleQueue()
+    self.free_count = context.Semaphore(slots)
+    for slot in range(slots):
+      self.free.put(slot)
+    self.tiles = self.getTileArray()
+
+  def getTileArray(self):
+    """slots x 32x32x64 uint8 array on the shared memory"""
+    return np.ndarray((self.slots,) + TILES_SHAPE, dtype=np.uint8,
+                      buffer=self.shm.buf)
+
+  def __getstate__(self):
+    return {'name': self.shm.name, 'slots': self.slots,
+            'free': self.free, 'free_count': self.free_count}
+
+  def __setstate__(self, state):
+    self.slots = state['slots']
+    if sys.version_info >= (3, 13):
+      # Only the creating process may unlink the memory
+      self.shm = shared_memory.SharedMemory(state['name'], track=False)
+    else:
+      self.shm = shared_memory.SharedMemory(state['name'])
+    self.owner = False
+    self.free = state['free']
+    self.free_count = state['free_count']
+    self.tiles = self.getTileArray()
+
+  def acquire(self, timeout=None):
+    """Index of a free slot, waiting up to timeout seconds (None waits
+    forever) for one to be released. Raises SlotTimeout"""
+    if not self.free_count.acquire(timeout=timeout):
+      raise SlotTimeout('No free tile slot of %d after %gs' % (self.slots, timeout))
+    return self.free.get()
+
+  def write(self, slot, tiles):
+    """Store 32x32x64 tiles with values 0-1 (or uint8) in an acquired slot"""
+    if tiles.dtype == np.uint8:
+      self.tiles[slot] = tiles
+    else:
+      # Tiles are uint8 pixels / 255, rounding restores the exact pixels
+      np.rint(np.multiply(tiles, 255, out=np.empty(TILES_SHAPE, np.float32)),
+              out=self.tiles[slot], casting='unsafe')
+
+  def view(self, slot):
+    """32x32x64 uint8 tiles of a slot, a view on the shared memory that is
+    only valid until the slot is released"""
+    return self.tiles[slot]
+
+  def read(self, slot, out=None):
+    """32x32x64 float32 tiles normalized 0-1 of a slot, as the predictor
+    takes them, converted straight from shared memory into out if given"""
+    if out is None:
+      out = np.empty(TILES_SHAPE, dtype=np.float32)
+    return np.multiply(self.tiles[slot], np.float32(1 / 255.0), out=out)
+
+  def release(self, slot):
+    """Recycle a slot once its tiles are no longer needed"""
+    self.free.put(slot)
+    self.free_count.release()
+
+  def close(self):
+    """Detach from the shared memory, the creating process also frees it"""
+    self.tiles = None
+    self.free.close()
+    self.shm.close()
+    if self.owner:
+      self.shm.unlink()
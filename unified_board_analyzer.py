@@ -21,6 +21,8 @@ sys.path.insert(0, str(Path(__file__).parent / 'tensorflow_chessbot'))
 from tensorflow_chessbot import ChessboardPredictor
 from helper_image_loading import loadImageGrayscale
 import chessboard_finder
+import perspective_finder
+import pipeline_timing
 import chess
 import chess.svg
 import PIL.Image
@@ -29,8 +31,18 @@ import PIL.Image
 class UnifiedBoardAnalyzer:
     """Analizador para tableros virtuales y reales"""
     
-    def __init__(self):
-        """Inicializar predictor de tensorflow_chessbot"""
+    def __init__(self, perspective=True, budget_ms=500):
+        """
+        Inicializar predictor de tensorflow_chessbot
+
+        Args:
+            perspective: Usar el detector con perspectiva (fotos de tableros
+                         físicos) cuando falla el detector ortogonal
+            budget_ms: Presupuesto de latencia por imagen del detector con
+                       perspectiva, se avisa cuando se supera
+        """
+        self.perspective = perspective
+        self.budget_ms = budget_ms
         logger.info("🔄 Cargando modelo tensorflow_chessbot...")
         try:
             frozen_graph_path = str(Path(__file__).parent / 'tensorflow_chessbot' / 'saved_models' / 'frozen_graph.pb')
@@ -68,10 +80,20 @@ class UnifiedBoardAnalyzer:
                 logger.error(f"   ❌ No se pudo leer la imagen")
                 return None
             
-            # Intentar encontrar tablero
-            tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img)
+            # Intentar encontrar tablero con el detector ortogonal rápido y,
+            # si falla, con el detector con perspectiva (fotos en ángulo)
+            with pipeline_timing.collect() as stage_ms:
+                tiles, corners = chessboard_finder.findGrayscaleTilesInImage(img)
+                method = 'orthogonal'
+                if tiles is None and self.perspective:
+                    logger.info(f"   🔄 Intentando detector con perspectiva...")
+                    tiles, corners = perspective_finder.findPerspectiveTilesInImage(
+                        img, budget_ms=self.budget_ms)
+                    method = 'perspective'
+            logger.info("   ⏱️  Etapas: " + ", ".join(
+                f"{name} {ms:.1f}ms" for name, ms in stage_ms.items()))
             
-            if tiles is None or len(tiles) != 64:
+            if tiles is None:
                 logger.warning(f"   ⚠️  No se detectó tablero completo en orientación original")
                 
                 if auto_rotate:
@@ -80,12 +102,13 @@ class UnifiedBoardAnalyzer:
                         logger.info(f"   🔄 Intentando rotación {angle}°...")
                         rotated = self._rotate_image(img, angle)
                         tiles, corners = chessboard_finder.findGrayscaleTilesInImage(rotated)
-                        if tiles is not None and len(tiles) == 64:
+                        if tiles is not None:
                             img = rotated
+                            method = 'orthogonal'
                             logger.info(f"   ✅ Tablero detectado con rotación {angle}°")
                             break
                     
-                    if tiles is None or len(tiles) != 64:
+                    if tiles is None:
                         logger.error(f"   ❌ No se pudo detectar el tablero en ninguna orientación")
                         return {
                             'filename': image_path.name,
@@ -93,14 +116,17 @@ class UnifiedBoardAnalyzer:
                             'status': 'failed'
                         }
             
-            # Predecir piezas
-            predictions = self.predictor.getPrediction(tiles)
-            
-            # Convertir a FEN
-            fen = self._predictions_to_fen(predictions)
+            # Predecir piezas, la aumentación de casillas inciertas recorta
+            # el tablero alineado con los ejes, solo para el detector ortogonal
+            if method == 'orthogonal':
+                fen, tile_certainties = self.predictor.getPrediction(tiles, img, corners)
+                corners = self._box_to_quad(corners)
+            else:
+                fen, tile_certainties = self.predictor.getPrediction(tiles)
+            fen = f"{fen} w - - 0 1"
             
             # Calcular certeza
-            certainties = [pred.max() for pred in predictions]
+            certainties = list(tile_certainties.flatten())
             certainty = np.mean(certainties) * 100
             
             logger.info(f"   ✅ FEN detectado: {fen}")
@@ -120,6 +146,8 @@ class UnifiedBoardAnalyzer:
                 'filename': image_path.name,
                 'fen': fen,
                 'certainty': certainty,
+                'method': method,
+                'timings_ms': stage_ms,
                 'status': 'success'
             }
             
@@ -143,35 +171,10 @@ class UnifiedBoardAnalyzer:
             return img.transpose(PIL.Image.ROTATE_90)
         return img
     
-    def _predictions_to_fen(self, predictions):
-        """Convertir predicciones a FEN"""
-        piece_chars = '_KQRBNP__kqrbnp'
-        
-        fen_rows = []
-        for row in range(8):
-            fen_row = ''
-            empty_count = 0
-            
-            for col in range(8):
-                idx = row * 8 + col
-                pred = predictions[idx]
-                piece_idx = np.argmax(pred)
-                piece_char = piece_chars[piece_idx]
-                
-                if piece_char == '_':
-                    empty_count += 1
-                else:
-                    if empty_count > 0:
-                        fen_row += str(empty_count)
-                        empty_count = 0
-                    fen_row += piece_char
-            
-            if empty_count > 0:
-                fen_row += str(empty_count)
-            
-            fen_rows.append(fen_row)
-        
-        return '/'.join(fen_rows) + ' w - - 0 1'
+    def _box_to_quad(self, corners):
+        """Esquinas [x0, y0, x1, y1] del detector ortogonal como 4x2"""
+        x0, y0, x1, y1 = corners
+        return np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
     
     def _save_results(self, img, tiles, corners, fen, certainties, output_path, base_name):
         """Guardar resultados visuales"""
@@ -276,6 +279,10 @@ def main():
                        help='Directorio de salida')
     parser.add_argument('--no-rotate', action='store_true',
                        help='No intentar rotaciones automáticas')
+    parser.add_argument('--no-perspective', action='store_true',
+                       help='No usar el detector con perspectiva para fotos')
+    parser.add_argument('--budget-ms', type=float, default=500,
+                       help='Presupuesto de latencia por imagen del detector con perspectiva')
     
     args = parser.parse_args()
     
@@ -285,7 +292,8 @@ def main():
     print("="*60 + "\n")
     
     try:
-        analyzer = UnifiedBoardAnalyzer()
+        analyzer = UnifiedBoardAnalyzer(perspective=not args.no_perspective,
+                                        budget_ms=args.budget_ms)
         
         results = []
         for image_path in args.images:
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Línea de tiempo de posiciones (FEN) a partir de un video o de una carpeta
+de capturas secuenciales
+
+Un hilo productor decodifica fotogramas (cada --stride fotogramas) hacia una
+cola acotada; el consumidor detecta el tablero e infiere las piezas con
+ChessboardTracker, que reutiliza las esquinas y solo re-evalúa las casillas
+que cambiaron. Las posiciones consecutivas idénticas se descartan.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from pathlib import Path
+import cv2
+import PIL.Image
+
+# Añadir el path del tensorflow_chessbot
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tensorflow_chessbot'))
+
+from chessboard_tracker import ChessboardTracker
+from helper_functions import shortenFEN
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+END_OF_STREAM = None
+
+
+def iter_video_frames(video_path, stride=1):
+    """Generar (índice, tiempo en s, imagen gris) de un video cada stride fotogramas"""
+    capture = cv2.VideoCapture(str(video_path))
+    if not capture.isOpened():
+        raise IOError(f"No se pudo abrir el video: {video_path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    index = 0
+    try:
+        while True:
+            # grab() avanza sin convertir el fotograma, solo se recuperan los usados
+            if not capture.grab():
+                break
+            if index % stride == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield index, index / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_directory_frames(directory, stride=1, fps=1.0):
+    """Generar (índice, tiempo en s, imagen gris) de capturas ordenadas por nombre"""
+    paths = sorted(p for p in Path(directory).iterdir()
+                   if p.suffix.lower() in IMAGE_EXTENSIONS)
+    for index, path in enumerate(paths):
+        if index % stride == 0:
+            gray = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+            if gray is not None:
+                yield index, index / fps, gray
+
+
+def _put(frame_queue, item, stop_event):
+    """Encolar item esperando mientras la cola esté llena; False si se detuvo"""
+    while not stop_event.is_set():
+        try:
+            frame_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(frames, frame_queue, stop_event, errors):
+    """Hilo productor: decodificar fotogramas hacia la cola acotada"""
+    try:
+        for item in frames:
+            # Bloquea cuando la cola está llena (contrapresión hacia el decodificador)
+            if not _put(frame_queue, item, stop_event):
+                return
+    except Exception as e:
+        errors.append(e)
+    finally:
+        _put(frame_queue, END_OF_STREAM, stop_event)
+
+
+def process_stream(frames, tracker, queue_size=8, detection_only=False):
+    """
+    Procesar fotogramas con un productor y un consumidor unidos por una cola acotada
+
+    Args:
+        frames: Iterable de (índice, tiempo en s, imagen gris uint8)
+        tracker: ChessboardTracker (con predictor salvo en detection_only)
+        queue_size: Máximo de fotogramas decodificados en espera
+        detection_only: Solo detectar el tablero, sin inferencia
+
+    Yields:
+        dict por cada posición nueva: frame, timestamp, fen, certainty, corners
+    """
+    frame_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    errors = []
+    producer = threading.Thread(target=_produce,
+                                args=(frames, frame_queue, stop_event, errors),
+                                daemon=True)
+    producer.start()
+
+    last_fen = None
+    try:
+        while True:
+            item = frame_queue.get()
+            if item is END_OF_STREAM:
+                if errors:
+                    raise errors[0]
+                break
+            index, timestamp, gray = item
+            img = PIL.Image.fromarray(gray)
+
+            if detection_only:
+                tiles, corners = tracker.findTiles(img)
+                fen = None if corners is None else 'detected'
+                certainty = None
+            else:
+                fen, tile_certainties, corners = tracker.update(img)
+                certainty = None if fen is None else float(tile_certainties.min())
+
+            # Descartar posiciones consecutivas idénticas
+            if fen == last_fen:
+                continue
+            last_fen = fen
+            yield {
+                'frame': index,
+                'timestamp': round(timestamp, 3),
+                'fen': None if fen is None or detection_only else shortenFEN(fen),
+                'certainty': certainty,
+                'corners': None if corners is None else [int(c) for c in corners],
+            }
+    finally:
+        stop_event.set()
+        producer.join()
+
+
+def format_timestamp(seconds):
+    """Formatear segundos como HH:MM:SS.mmm"""
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Generar línea de tiempo FEN desde un video o carpeta de capturas'
+    )
+    parser.add_argument('source', help='Archivo de video o carpeta de capturas')
+    parser.add_argument('--stride', type=int, default=1,
+                       help='Procesar uno de cada N fotogramas')
+    parser.add_argument('--fps', type=float, default=1.0,
+                       help='Fotogramas por segundo de una carpeta de capturas')
+    parser.add_argument('--queue-size', type=int, default=8,
+                       help='Tamaño máximo de la cola de fotogramas decodificados')
+    parser.add_argument('--coarse', action='store_true',
+                       help='Detección coarse-to-fine para fotogramas grandes')
+    parser.add_argument('--detection-only', action='store_true',
+                       help='Solo detectar el tablero, sin cargar el modelo')
+    parser.add_argument('--model', '-m',
+                       default='tensorflow_chessbot/saved_models/frozen_graph.pb',
+                       help='Ruta al modelo congelado (.pb)')
+    parser.add_argument('--output', '-o', help='Guardar línea de tiempo en JSON')
+    args = parser.parse_args()
+
+    predictor = None
+    if not args.detection_only:
+        from tensorflow_chessbot import ChessboardPredictor
+        predictor = ChessboardPredictor(args.model)
+    tracker = ChessboardTracker(predictor, coarse_to_fine=args.coarse)
+
+    if os.path.isdir(args.source):
+        frames = iter_directory_frames(args.source, args.stride, args.fps)
+    else:
+        frames = iter_video_frames(args.source, args.stride)
+
+    timeline = []
+    start = time.perf_counter()
+    for entry in process_stream(frames, tracker, args.queue_size, args.detection_only):
+        timeline.append(entry)
+        fen = entry['fen'] or ('(tablero)' if entry['corners'] else '(sin tablero)')
+        print(f"{format_timestamp(entry['timestamp'])}  #{entry['frame']:<6d} {fen}")
+    elapsed = time.perf_counter() - start
+
+    frames_done = tracker.stats['frames']
+    print(f"\n✅ {frames_done} fotogramas en {elapsed:.2f}s "
+          f"({frames_done / elapsed if elapsed else 0:.1f} fps), "
+          f"{len(timeline)} posiciones")
+    print(f"   Detecciones completas: {tracker.stats['detections']}, "
+          f"esquinas reutilizadas: {tracker.stats['reused_corners']}, "
+          f"casillas omitidas: {tracker.stats['tiles_skipped']}")
+
+    if predictor is not None:
+        predictor.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'source': args.source, 'stride': args.stride,
+                       'timeline': timeline, 'stats': tracker.stats}, f, indent=2)
+        print(f"💾 Línea de tiempo guardada en: {args.output}")
+
+
+if __name__ == '__main__':
+    main()